@@ -24,6 +24,17 @@ chatbot_ai_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..',
 if chatbot_ai_path not in sys.path:
     sys.path.insert(0, chatbot_ai_path)
 
+# Shared service utilities live at the repository root
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from service_utils.logs import setup_logging
+from service_utils.tracing import init_app as init_tracing, phase
+
+# Structured, non-blocking logging (LOG_LEVEL, LOG_LEVELS, LOG_FORMAT, LOG_SAMPLE_RATE)
+setup_logging('ai_chatbot')
+
 from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
 from datetime import datetime
@@ -43,6 +54,9 @@ except Exception as e:
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "*"}})
 
+# Request IDs from upstream hops and a Server-Timing breakdown of each request
+init_tracing(app, 'ai_chatbot')
+
 # Initialize the AI workflow
 workflow = Workflow() if AI_AVAILABLE else None
 
@@ -112,7 +126,8 @@ def chat():
                         response_text += chunk
                 return response_text
 
-            full_response = loop.run_until_complete(get_full_response())
+            with phase('generate'):
+                full_response = loop.run_until_complete(get_full_response())
             loop.close()
 
         except Exception as model_error:
@@ -11,6 +11,17 @@ if sys.platform == 'win32':
         sys.stderr = codecs.getwriter('utf-8')(sys.stderr.buffer, 'strict')
     os.environ['PYTHONIOENCODING'] = 'utf-8'
 
+# Shared service utilities live at the repository root
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from service_utils.logs import setup_logging
+from service_utils.tracing import init_app as init_tracing, phase
+
+# Structured, non-blocking logging (LOG_LEVEL, LOG_LEVELS, LOG_FORMAT, LOG_SAMPLE_RATE)
+setup_logging('ai_assessment')
+
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import pickle
@@ -21,6 +32,9 @@ app = Flask(__name__)
 # CORS Configuration for LAN Access
 CORS(app, resources={r"/*": {"origins": "*"}})
 
+# Request IDs from upstream hops and a Server-Timing breakdown of each request
+init_tracing(app, 'ai_assessment')
+
 # Load the trained model (if exists)
 MODEL_PATH = 'stroke_model.pkl'
 model = None
@@ -197,7 +211,8 @@ def predict():
                 }), 400
         
         # Calculate risk
-        risk_level, risk_percentage = calculate_risk_rule_based(data)
+        with phase('predict'):
+            risk_level, risk_percentage = calculate_risk_rule_based(data)
         
         # Get recommendations
         recommendations = get_recommendations(risk_level, data)
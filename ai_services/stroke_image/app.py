@@ -24,6 +24,17 @@ stroke_image_ai_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '
 if stroke_image_ai_path not in sys.path:
     sys.path.insert(0, stroke_image_ai_path)
 
+# Shared service utilities live at the repository root
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from service_utils.logs import setup_logging
+from service_utils.tracing import init_app as init_tracing, phase
+
+# Structured, non-blocking logging (LOG_LEVEL, LOG_LEVELS, LOG_FORMAT, LOG_SAMPLE_RATE)
+setup_logging('ai_image')
+
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from datetime import datetime
@@ -34,6 +45,9 @@ import io
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "*"}})
 
+# Request IDs from upstream hops and a Server-Timing breakdown of each request
+init_tracing(app, 'ai_image')
+
 # Load the REAL AI model
 model = None
 MODEL_LOADED = False
@@ -157,7 +171,9 @@ def analyze():
             }), 503
 
         # Check if image file is present
-        if 'image' not in request.files:
+        with phase('parse'):
+            has_image = 'image' in request.files
+        if not has_image:
             return jsonify({
                 'error': 'No image file provided',
                 'message': 'Please provide an image file in the request'
@@ -173,7 +189,8 @@ def analyze():
 
         # Preprocess image for the model
         try:
-            preprocessed_image = preprocess_image(image_file)
+            with phase('preprocess'):
+                preprocessed_image = preprocess_image(image_file)
         except Exception as preprocess_error:
             return jsonify({
                 'error': 'Image preprocessing failed',
@@ -182,7 +199,8 @@ def analyze():
 
         # Run inference with the TRAINED MODEL
         try:
-            prediction = model.predict(preprocessed_image, verbose=0)
+            with phase('predict'):
+                prediction = model.predict(preprocessed_image, verbose=0)
             prediction_value = prediction[0][0]  # Get scalar value
 
         except Exception as model_error:
@@ -2,11 +2,23 @@ from flask import Flask, request, jsonify, send_from_directory
 from flask_cors import CORS
 from dotenv import load_dotenv
 import os
+import sys
 from datetime import datetime
 
-# Load environment variables
+# Load environment variables - before any module that reads its settings at import
 load_dotenv()
 
+# Shared service utilities live at the repository root
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from service_utils.logs import setup_logging
+from service_utils.tracing import init_app as init_tracing
+
+# Structured, non-blocking logging (LOG_LEVEL, LOG_LEVELS, LOG_FORMAT, LOG_SAMPLE_RATE)
+setup_logging('main')
+
 # Import blueprints
 from routes.auth import auth_bp
 from routes.users import users_bp
@@ -21,6 +33,9 @@ from routes.ai import ai_bp
 app = Flask(__name__)
 app.url_map.strict_slashes = False  # Allow URLs with or without trailing slashes
 
+# Request IDs from the gateway and a Server-Timing breakdown of each request
+init_tracing(app, 'main')
+
 # CORS Configuration for LAN Access
 CORS(app, resources={
     r"/*": {
@@ -1,11 +1,14 @@
 from flask import Blueprint, request, jsonify, current_app
 from werkzeug.utils import secure_filename
 from utils.auth import auth_required
+from service_utils.tracing import call_timeout, include_timing, phase, trace_headers
 from datetime import datetime
 import requests
 import os
+import logging
 
 ai_bp = Blueprint('ai', __name__)
+logger = logging.getLogger(__name__)
 
 # AI Services URLs
 AI_CHATBOT_URL = os.getenv('AI_CHATBOT_URL', 'http://localhost:5001')
@@ -42,20 +45,23 @@ def chat():
 
         # Forward to AI service (REQUIRED - no fallback)
         try:
-            response = requests.post(
-                f'{AI_CHATBOT_URL}/chat',
-                json={
-                    'message': message,
-                    'history': conversation_history
-                },
-                timeout=60
-            )
+            with phase('ai'):
+                response = requests.post(
+                    f'{AI_CHATBOT_URL}/chat',
+                    json={
+                        'message': message,
+                        'history': conversation_history
+                    },
+                    headers=trace_headers(),
+                    timeout=call_timeout(60)
+                )
+            include_timing(response.headers)
 
             # Return the response from the AI model (could be success or error)
             return jsonify(response.json()), response.status_code
 
-        except requests.exceptions.ConnectionError as e:
-            print(f'AI Chatbot service connection error: {e}')
+        except requests.exceptions.ConnectionError:
+            logger.warning('AI Chatbot service connection error', exc_info=True)
             return jsonify({
                 'error': {
                     'message': 'AI service unavailable',
@@ -64,8 +70,8 @@ def chat():
                 }
             }), 503
 
-        except requests.exceptions.Timeout as e:
-            print(f'AI Chatbot service timeout: {e}')
+        except requests.exceptions.Timeout:
+            logger.warning('AI Chatbot service timeout', exc_info=True)
             return jsonify({
                 'error': {
                     'message': 'AI service timeout',
@@ -75,7 +81,7 @@ def chat():
             }), 504
 
         except Exception as e:
-            print(f'AI Chatbot service error: {e}')
+            logger.exception('AI Chatbot service error')
             return jsonify({
                 'error': {
                     'message': 'AI service error',
@@ -85,7 +91,7 @@ def chat():
             }), 500
 
     except Exception as e:
-        print(f'Chat endpoint error: {e}')
+        logger.exception('Chat endpoint error')
         return jsonify({
             'error': {
                 'message': 'Failed to process chat message',
@@ -128,16 +134,19 @@ def stroke_assessment():
         
         # Try to connect to AI service
         try:
-            response = requests.post(
-                f'{AI_STROKE_QA_URL}/predict',
-                json=assessment_data,
-                timeout=30
-            )
+            with phase('ai'):
+                response = requests.post(
+                    f'{AI_STROKE_QA_URL}/predict',
+                    json=assessment_data,
+                    headers=trace_headers(),
+                    timeout=call_timeout(30)
+                )
+            include_timing(response.headers)
             
             if response.status_code == 200:
                 return jsonify(response.json())
-        except Exception as e:
-            print(f'AI Stroke QA service error: {e}')
+        except Exception:
+            logger.exception('AI Stroke QA service error')
         
         # Mock risk calculation when AI service is not available
         risk_score = 0
@@ -194,8 +203,8 @@ def stroke_assessment():
             'note': 'This is a mock assessment. AI service integration pending.'
         })
     
-    except Exception as e:
-        print(f'Stroke assessment error: {e}')
+    except Exception:
+        logger.exception('Stroke assessment error')
         return jsonify({
             'error': {
                 'message': 'Failed to assess stroke risk',
@@ -213,7 +222,9 @@ def scan_image():
     NO fallback responses. If the AI service fails, it returns an error.
     """
     try:
-        if 'image' not in request.files:
+        with phase('parse'):
+            has_image = 'image' in request.files
+        if not has_image:
             return jsonify({
                 'error': {
                     'message': 'Image file is required',
@@ -246,7 +257,8 @@ def scan_image():
 
         upload_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'scans', unique_filename)
         os.makedirs(os.path.dirname(upload_path), exist_ok=True)
-        file.save(upload_path)
+        with phase('file-save'):
+            file.save(upload_path)
 
         image_url = f"/uploads/scans/{unique_filename}"
 
@@ -254,11 +266,14 @@ def scan_image():
         try:
             with open(upload_path, 'rb') as img_file:
                 files = {'image': (filename, img_file, file.content_type)}
-                response = requests.post(
-                    f'{AI_STROKE_IMAGE_URL}/analyze',
-                    files=files,
-                    timeout=60
-                )
+                with phase('ai'):
+                    response = requests.post(
+                        f'{AI_STROKE_IMAGE_URL}/analyze',
+                        files=files,
+                        headers=trace_headers(),
+                        timeout=call_timeout(60)
+                    )
+                include_timing(response.headers)
 
                 # Return the response from the AI model (could be success or error)
                 if response.status_code == 200:
@@ -270,8 +285,8 @@ def scan_image():
                     # Return AI service error
                     return jsonify(response.json()), response.status_code
 
-        except requests.exceptions.ConnectionError as e:
-            print(f'AI Stroke Image service connection error: {e}')
+        except requests.exceptions.ConnectionError:
+            logger.warning('AI Stroke Image service connection error', exc_info=True)
             return jsonify({
                 'error': {
                     'message': 'AI image analysis service unavailable',
@@ -280,8 +295,8 @@ def scan_image():
                 }
             }), 503
 
-        except requests.exceptions.Timeout as e:
-            print(f'AI Stroke Image service timeout: {e}')
+        except requests.exceptions.Timeout:
+            logger.warning('AI Stroke Image service timeout', exc_info=True)
             return jsonify({
                 'error': {
                     'message': 'AI service timeout',
@@ -291,7 +306,7 @@ def scan_image():
             }), 504
 
         except Exception as e:
-            print(f'AI Stroke Image service error: {e}')
+            logger.exception('AI Stroke Image service error')
             return jsonify({
                 'error': {
                     'message': 'AI service error',
@@ -301,7 +316,7 @@ def scan_image():
             }), 500
 
     except Exception as e:
-        print(f'Scan image endpoint error: {e}')
+        logger.exception('Scan image endpoint error')
         return jsonify({
             'error': {
                 'message': 'Failed to process image',
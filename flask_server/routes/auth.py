@@ -1,10 +1,12 @@
 from flask import Blueprint, request, jsonify
 from werkzeug.security import generate_password_hash, check_password_hash
-from utils.database import get_users, save_users, get_next_id
+from utils.database import find_one, insert, transaction
 from utils.auth import generate_token
 from datetime import datetime
+import logging
 
 auth_bp = Blueprint('auth', __name__)
+logger = logging.getLogger(__name__)
 
 @auth_bp.route('/register', methods=['POST'])
 def register():
@@ -25,31 +27,29 @@ def register():
                 }
             }), 400
         
-        users = get_users()
-        
-        # Check if user already exists
-        if any(u['email'] == email for u in users):
-            return jsonify({
-                'error': {
-                    'message': 'User with this email already exists',
-                    'status': 400
-                }
-            }), 400
-        
-        # Create new user
-        new_user = {
-            'id': get_next_id(users),
-            'email': email,
-            'password': generate_password_hash(password),
-            'name': name,
-            'phone': data.get('phone', ''),
-            'role': data.get('role', 'user'),
-            'isActive': True,
-            'createdAt': datetime.now().isoformat()
-        }
-        
-        users.append(new_user)
-        save_users(users)
+        # Hashed up front - the check and insert below hold the users lock
+        password_hash = generate_password_hash(password)
+        
+        with transaction('users'):
+            # Check if user already exists
+            if find_one('users', email=email):
+                return jsonify({
+                    'error': {
+                        'message': 'User with this email already exists',
+                        'status': 400
+                    }
+                }), 400
+            
+            # Create new user (insert assigns the id)
+            new_user = insert('users', {
+                'email': email,
+                'password': password_hash,
+                'name': name,
+                'phone': data.get('phone', ''),
+                'role': data.get('role', 'user'),
+                'isActive': True,
+                'createdAt': datetime.now().isoformat()
+            })
         
         # Generate token
         token = generate_token(new_user)
@@ -62,8 +62,8 @@ def register():
             'user': user_response
         }), 201
         
-    except Exception as e:
-        print(f'Register error: {e}')
+    except Exception:
+        logger.exception('Register error')
         return jsonify({
             'error': {
                 'message': 'Registration failed',
@@ -89,8 +89,7 @@ def login():
                 }
             }), 400
         
-        users = get_users()
-        user = next((u for u in users if u['email'] == email), None)
+        user = find_one('users', email=email)
         
         if not user:
             return jsonify({
@@ -129,8 +128,8 @@ def login():
             'user': user_response
         })
         
-    except Exception as e:
-        print(f'Login error: {e}')
+    except Exception:
+        logger.exception('Login error')
         return jsonify({
             'error': {
                 'message': 'Login failed',
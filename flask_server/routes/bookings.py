@@ -1,25 +1,23 @@
 from flask import Blueprint, request, jsonify
-from utils.database import get_db, save_db, get_next_id
+from utils.database import find, find_one, insert, update, delete, transaction
 from utils.auth import auth_required
 from datetime import datetime
+import logging
 
 bookings_bp = Blueprint('bookings', __name__)
+logger = logging.getLogger(__name__)
 
 @bookings_bp.route('/', methods=['GET'])
 @auth_required
 def get_bookings():
     """Get user bookings"""
     try:
-        db = get_db()
-        bookings = db.get('bookings', [])
-        doctors = db.get('doctors', [])
-        
-        # Filter bookings for current user
-        user_bookings = [b for b in bookings if b.get('userId') == request.user['id']]
+        # Bookings of the current user (copies - stored documents are read-only)
+        user_bookings = [b.copy() for b in find('bookings', userId=request.user['id'])]
         
         # Add doctor info to each booking
         for booking in user_bookings:
-            doctor = next((d for d in doctors if d.get('id') == booking.get('doctorId')), None)
+            doctor = find_one('doctors', id=booking.get('doctorId'))
             if doctor:
                 booking['doctor'] = {
                     'name': doctor.get('name'),
@@ -27,8 +25,8 @@ def get_bookings():
                 }
         
         return jsonify({'bookings': user_bookings})
-    except Exception as e:
-        print(f'Get bookings error: {e}')
+    except Exception:
+        logger.exception('Get bookings error')
         return jsonify({
             'error': {
                 'message': 'Failed to retrieve bookings',
@@ -55,12 +53,8 @@ def create_booking():
                 }
             }), 400
         
-        db = get_db()
-        bookings = db.get('bookings', [])
-        
-        # Create new booking
-        new_booking = {
-            'id': get_next_id(bookings),
+        # Create new booking (insert assigns the id)
+        new_booking = insert('bookings', {
             'userId': request.user['id'],
             'doctorId': doctor_id,
             'date': date,
@@ -68,15 +62,11 @@ def create_booking():
             'status': 'upcoming',
             'notes': data.get('notes', ''),
             'createdAt': datetime.now().isoformat()
-        }
-        
-        bookings.append(new_booking)
-        db['bookings'] = bookings
-        save_db(db)
+        })
         
         return jsonify({'booking': new_booking}), 201
-    except Exception as e:
-        print(f'Create booking error: {e}')
+    except Exception:
+        logger.exception('Create booking error')
         return jsonify({
             'error': {
                 'message': 'Failed to create booking',
@@ -100,38 +90,36 @@ def update_booking_status(booking_id):
                 }
             }), 400
         
-        db = get_db()
-        bookings = db.get('bookings', [])
-        
-        # Find booking
-        booking = next((b for b in bookings if b.get('id') == booking_id), None)
-        
-        if not booking:
-            return jsonify({
-                'error': {
-                    'message': 'Booking not found',
-                    'status': 404
-                }
-            }), 404
-        
-        # Check if user owns this booking
-        if booking.get('userId') != request.user['id']:
-            return jsonify({
-                'error': {
-                    'message': 'Unauthorized to update this booking',
-                    'status': 403
-                }
-            }), 403
-        
-        # Update status
-        booking['status'] = new_status
-        booking['updatedAt'] = datetime.now().isoformat()
-        
-        save_db(db)
+        with transaction('bookings'):
+            # Find booking
+            booking = find_one('bookings', id=booking_id)
+            
+            if not booking:
+                return jsonify({
+                    'error': {
+                        'message': 'Booking not found',
+                        'status': 404
+                    }
+                }), 404
+            
+            # Check if user owns this booking
+            if booking.get('userId') != request.user['id']:
+                return jsonify({
+                    'error': {
+                        'message': 'Unauthorized to update this booking',
+                        'status': 403
+                    }
+                }), 403
+            
+            # Update status
+            booking = update('bookings', booking_id, {
+                'status': new_status,
+                'updatedAt': datetime.now().isoformat()
+            })
         
         return jsonify({'booking': booking})
-    except Exception as e:
-        print(f'Update booking error: {e}')
+    except Exception:
+        logger.exception('Update booking error')
         return jsonify({
             'error': {
                 'message': 'Failed to update booking',
@@ -144,37 +132,33 @@ def update_booking_status(booking_id):
 def delete_booking(booking_id):
     """Delete a booking (admin only - for cleanup)"""
     try:
-        db = get_db()
-        bookings = db.get('bookings', [])
-        
-        # Find booking
-        booking = next((b for b in bookings if b.get('id') == booking_id), None)
-        
-        if not booking:
-            return jsonify({
-                'error': {
-                    'message': 'Booking not found',
-                    'status': 404
-                }
-            }), 404
-        
-        # Check if user owns this booking
-        if booking.get('userId') != request.user['id']:
-            return jsonify({
-                'error': {
-                    'message': 'Unauthorized to delete this booking',
-                    'status': 403
-                }
-            }), 403
-        
-        # Remove booking
-        bookings = [b for b in bookings if b.get('id') != booking_id]
-        db['bookings'] = bookings
-        save_db(db)
+        with transaction('bookings'):
+            # Find booking
+            booking = find_one('bookings', id=booking_id)
+            
+            if not booking:
+                return jsonify({
+                    'error': {
+                        'message': 'Booking not found',
+                        'status': 404
+                    }
+                }), 404
+            
+            # Check if user owns this booking
+            if booking.get('userId') != request.user['id']:
+                return jsonify({
+                    'error': {
+                        'message': 'Unauthorized to delete this booking',
+                        'status': 403
+                    }
+                }), 403
+            
+            # Remove booking
+            delete('bookings', id=booking_id)
         
         return jsonify({'message': 'Booking deleted successfully'})
-    except Exception as e:
-        print(f'Delete booking error: {e}')
+    except Exception:
+        logger.exception('Delete booking error')
         return jsonify({
             'error': {
                 'message': 'Failed to delete booking',
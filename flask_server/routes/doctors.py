@@ -1,27 +1,26 @@
 from flask import Blueprint, request, jsonify
-from utils.database import get_db, save_db, get_next_id
+from utils.database import all_documents, find_one, next_id, insert, update, delete, transaction
 from datetime import datetime
+import logging
 
 doctors_bp = Blueprint('doctors', __name__)
+logger = logging.getLogger(__name__)
 
 @doctors_bp.route('/', methods=['GET'])
 def get_doctors():
     """Get all doctors"""
     try:
-        db = get_db()
-        doctors = db.get('doctors', [])
-        
         # Add placeholder images if needed
         doctors_with_images = []
-        for doctor in doctors:
+        for doctor in all_documents('doctors'):
             doctor_copy = doctor.copy()
             if not doctor_copy.get('image', '').startswith('http'):
                 doctor_copy['image'] = f"https://i.pravatar.cc/150?u={doctor_copy.get('id', 0)}"
             doctors_with_images.append(doctor_copy)
         
         return jsonify(doctors_with_images), 200
-    except Exception as e:
-        print(f'Get doctors error: {e}')
+    except Exception:
+        logger.exception('Get doctors error')
         return jsonify({
             'error': {
                 'message': 'Failed to retrieve doctors',
@@ -33,9 +32,7 @@ def get_doctors():
 def get_doctor(doctor_id):
     """Get doctor by ID"""
     try:
-        db = get_db()
-        doctors = db.get('doctors', [])
-        doctor = next((d for d in doctors if d.get('id') == doctor_id), None)
+        doctor = find_one('doctors', id=doctor_id)
         
         if not doctor:
             return jsonify({
@@ -51,8 +48,8 @@ def get_doctor(doctor_id):
             doctor_copy['image'] = f"https://i.pravatar.cc/150?u={doctor_id}"
         
         return jsonify(doctor_copy), 200
-    except Exception as e:
-        print(f'Get doctor error: {e}')
+    except Exception:
+        logger.exception('Get doctor error')
         return jsonify({
             'error': {
                 'message': 'Failed to retrieve doctor',
@@ -77,33 +74,28 @@ def create_doctor():
                     }
                 }), 400
         
-        db = get_db()
-        doctors = db.get('doctors', [])
-        
-        # Create new doctor
-        new_doctor = {
-            'id': get_next_id(doctors),
-            'name': data['name'],
-            'specialty': data['specialty'],
-            'experience': data['experience'],
-            'rating': data.get('rating', 0.0),
-            'reviews': data.get('reviews', 0),
-            'distance': data.get('distance', '0 km'),
-            'available': data.get('available', True),
-            'nextAvailable': data.get('nextAvailable', 'Not set'),
-            'image': data.get('image', f"https://i.pravatar.cc/150?u={get_next_id(doctors)}"),
-            'phone': data.get('phone', ''),
-            'email': data.get('email', ''),
-            'createdAt': datetime.now().isoformat()
-        }
-        
-        doctors.append(new_doctor)
-        db['doctors'] = doctors
-        save_db(db)
+        with transaction('doctors'):
+            # Create new doctor
+            doctor_id = next_id('doctors')
+            new_doctor = insert('doctors', {
+                'id': doctor_id,
+                'name': data['name'],
+                'specialty': data['specialty'],
+                'experience': data['experience'],
+                'rating': data.get('rating', 0.0),
+                'reviews': data.get('reviews', 0),
+                'distance': data.get('distance', '0 km'),
+                'available': data.get('available', True),
+                'nextAvailable': data.get('nextAvailable', 'Not set'),
+                'image': data.get('image', f"https://i.pravatar.cc/150?u={doctor_id}"),
+                'phone': data.get('phone', ''),
+                'email': data.get('email', ''),
+                'createdAt': datetime.now().isoformat()
+            })
         
         return jsonify(new_doctor), 201
-    except Exception as e:
-        print(f'Create doctor error: {e}')
+    except Exception:
+        logger.exception('Create doctor error')
         return jsonify({
             'error': {
                 'message': 'Failed to create doctor',
@@ -117,11 +109,17 @@ def update_doctor(doctor_id):
     try:
         data = request.get_json()
         
-        db = get_db()
-        doctors = db.get('doctors', [])
-        doctor_index = next((i for i, d in enumerate(doctors) if d.get('id') == doctor_id), None)
+        # Update doctor fields
+        updatable_fields = ['name', 'specialty', 'experience', 'rating', 'reviews', 
+                           'distance', 'available', 'nextAvailable', 'image', 'phone', 'email']
+        
+        changes = {field: data[field] for field in updatable_fields if field in data}
+        changes['updatedAt'] = datetime.now().isoformat()
         
-        if doctor_index is None:
+        # Merged into the stored doctor in one step, so concurrent updates are not lost
+        doctor = update('doctors', doctor_id, changes)
+        
+        if not doctor:
             return jsonify({
                 'error': {
                     'message': 'Doctor not found',
@@ -129,24 +127,9 @@ def update_doctor(doctor_id):
                 }
             }), 404
         
-        # Update doctor fields
-        doctor = doctors[doctor_index]
-        updatable_fields = ['name', 'specialty', 'experience', 'rating', 'reviews', 
-                           'distance', 'available', 'nextAvailable', 'image', 'phone', 'email']
-        
-        for field in updatable_fields:
-            if field in data:
-                doctor[field] = data[field]
-        
-        doctor['updatedAt'] = datetime.now().isoformat()
-        
-        doctors[doctor_index] = doctor
-        db['doctors'] = doctors
-        save_db(db)
-        
         return jsonify(doctor), 200
-    except Exception as e:
-        print(f'Update doctor error: {e}')
+    except Exception:
+        logger.exception('Update doctor error')
         return jsonify({
             'error': {
                 'message': 'Failed to update doctor',
@@ -158,28 +141,25 @@ def update_doctor(doctor_id):
 def delete_doctor(doctor_id):
     """Delete doctor by ID"""
     try:
-        db = get_db()
-        doctors = db.get('doctors', [])
-        doctor_index = next((i for i, d in enumerate(doctors) if d.get('id') == doctor_id), None)
-        
-        if doctor_index is None:
-            return jsonify({
-                'error': {
-                    'message': 'Doctor not found',
-                    'status': 404
-                }
-            }), 404
-        
-        deleted_doctor = doctors.pop(doctor_index)
-        db['doctors'] = doctors
-        save_db(db)
+        with transaction('doctors'):
+            deleted_doctor = find_one('doctors', id=doctor_id)
+            
+            if not deleted_doctor:
+                return jsonify({
+                    'error': {
+                        'message': 'Doctor not found',
+                        'status': 404
+                    }
+                }), 404
+            
+            delete('doctors', id=doctor_id)
         
         return jsonify({
             'message': 'Doctor deleted successfully',
             'doctor': deleted_doctor
         }), 200
-    except Exception as e:
-        print(f'Delete doctor error: {e}')
+    except Exception:
+        logger.exception('Delete doctor error')
         return jsonify({
             'error': {
                 'message': 'Failed to delete doctor',
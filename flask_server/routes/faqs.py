@@ -1,7 +1,9 @@
 from flask import Blueprint, jsonify
 from utils.database import get_faqs
+import logging
 
 faqs_bp = Blueprint('faqs', __name__)
+logger = logging.getLogger(__name__)
 
 @faqs_bp.route('/', methods=['GET'])
 def get_all_faqs():
@@ -9,8 +11,8 @@ def get_all_faqs():
     try:
         faqs = get_faqs()
         return jsonify({'faqs': faqs})
-    except Exception as e:
-        print(f'Get FAQs error: {e}')
+    except Exception:
+        logger.exception('Get FAQs error')
         return jsonify({
             'error': {
                 'message': 'Failed to retrieve FAQs',
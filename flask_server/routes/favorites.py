@@ -1,25 +1,23 @@
 from flask import Blueprint, request, jsonify
-from utils.database import get_db, save_db, get_next_id
+from utils.database import find, find_one, insert, delete, transaction
 from utils.auth import auth_required
 from datetime import datetime
+import logging
 
 favorites_bp = Blueprint('favorites', __name__)
+logger = logging.getLogger(__name__)
 
 @favorites_bp.route('/', methods=['GET'])
 @auth_required
 def get_favorites():
     """Get user's favorite doctors"""
     try:
-        db = get_db()
-        favorites = db.get('favorites', [])
-        doctors = db.get('doctors', [])
-        
-        # Filter favorites for current user
-        user_favorites = [f for f in favorites if f.get('userId') == request.user['id']]
+        # Favorites of the current user (copies - stored documents are read-only)
+        user_favorites = [f.copy() for f in find('favorites', userId=request.user['id'])]
         
         # Add doctor info to each favorite
         for favorite in user_favorites:
-            doctor = next((d for d in doctors if d.get('id') == favorite.get('doctorId')), None)
+            doctor = find_one('doctors', id=favorite.get('doctorId'))
             if doctor:
                 favorite['doctor'] = {
                     'name': doctor.get('name'),
@@ -28,8 +26,8 @@ def get_favorites():
                 }
         
         return jsonify({'favorites': user_favorites})
-    except Exception as e:
-        print(f'Get favorites error: {e}')
+    except Exception:
+        logger.exception('Get favorites error')
         return jsonify({
             'error': {
                 'message': 'Failed to retrieve favorites',
@@ -53,37 +51,28 @@ def add_favorite():
                 }
             }), 400
         
-        db = get_db()
-        favorites = db.get('favorites', [])
-        
-        # Check if already in favorites
-        existing = next((f for f in favorites 
-                        if f.get('userId') == request.user['id'] 
-                        and f.get('doctorId') == doctor_id), None)
-        
-        if existing:
-            return jsonify({
-                'error': {
-                    'message': 'Doctor already in favorites',
-                    'status': 400
-                }
-            }), 400
-        
-        # Create new favorite
-        new_favorite = {
-            'id': get_next_id(favorites),
-            'userId': request.user['id'],
-            'doctorId': doctor_id,
-            'createdAt': datetime.now().isoformat()
-        }
-        
-        favorites.append(new_favorite)
-        db['favorites'] = favorites
-        save_db(db)
+        with transaction('favorites'):
+            # Check if already in favorites
+            existing = find_one('favorites', userId=request.user['id'], doctorId=doctor_id)
+            
+            if existing:
+                return jsonify({
+                    'error': {
+                        'message': 'Doctor already in favorites',
+                        'status': 400
+                    }
+                }), 400
+            
+            # Create new favorite (insert assigns the id)
+            new_favorite = insert('favorites', {
+                'userId': request.user['id'],
+                'doctorId': doctor_id,
+                'createdAt': datetime.now().isoformat()
+            })
         
         return jsonify({'favorite': new_favorite}), 201
-    except Exception as e:
-        print(f'Add favorite error: {e}')
+    except Exception:
+        logger.exception('Add favorite error')
         return jsonify({
             'error': {
                 'message': 'Failed to add favorite',
@@ -96,16 +85,10 @@ def add_favorite():
 def remove_favorite(doctor_id):
     """Remove doctor from favorites"""
     try:
-        db = get_db()
-        favorites = db.get('favorites', [])
-        
         # Find and remove favorite
-        initial_count = len(favorites)
-        favorites = [f for f in favorites 
-                    if not (f.get('userId') == request.user['id'] 
-                           and f.get('doctorId') == doctor_id)]
+        removed = delete('favorites', userId=request.user['id'], doctorId=doctor_id)
         
-        if len(favorites) == initial_count:
+        if not removed:
             return jsonify({
                 'error': {
                     'message': 'Favorite not found',
@@ -113,12 +96,9 @@ def remove_favorite(doctor_id):
                 }
             }), 404
         
-        db['favorites'] = favorites
-        save_db(db)
-        
         return jsonify({'message': 'Favorite removed successfully'})
-    except Exception as e:
-        print(f'Remove favorite error: {e}')
+    except Exception:
+        logger.exception('Remove favorite error')
         return jsonify({
             'error': {
                 'message': 'Failed to remove favorite',
@@ -1,11 +1,14 @@
 from flask import Blueprint, request, jsonify, current_app
 from werkzeug.utils import secure_filename
-from utils.database import get_db, save_db, get_next_id
+from utils.database import find, find_one, insert, delete, transaction
 from utils.auth import auth_required
+from service_utils.tracing import call_timeout, include_timing, phase, trace_headers
 from datetime import datetime
 import os
+import logging
 
 scans_bp = Blueprint('scans', __name__)
+logger = logging.getLogger(__name__)
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 
@@ -17,21 +20,15 @@ def allowed_file(filename):
 def get_scans():
     """Get user's scans"""
     try:
-        db = get_db()
-        scans = db.get('scans', [])
-        
-        # Filter scans for current user
-        user_scans = [s for s in scans if s.get('userId') == request.user['id']]
-        
-        # Sort by date (newest first)
-        user_scans.sort(key=lambda x: x.get('createdAt', ''), reverse=True)
+        # Scans of the current user, newest first
+        user_scans = find('scans', order_by='-createdAt', userId=request.user['id'])
         
         return jsonify({
             'scans': user_scans,
             'total': len(user_scans)
         })
-    except Exception as e:
-        print(f'Get scans error: {e}')
+    except Exception:
+        logger.exception('Get scans error')
         return jsonify({
             'error': {
                 'message': 'Failed to retrieve scans',
@@ -47,25 +44,25 @@ def upload_scan():
     from io import BytesIO
 
     try:
-        # Debug logging
-        print(f'[DEBUG] Content-Type: {request.content_type}')
-        print(f'[DEBUG] request.files: {request.files}')
-        print(f'[DEBUG] request.form: {request.form}')
-        print(f'[DEBUG] request.data length: {len(request.data)}')
-        print(f'[DEBUG] request.headers: {dict(request.headers)}')
-        
+        # The multipart body is parsed on first access
+        with phase('parse'):
+            uploads = request.files
+        logger.debug('Scan upload received', extra={
+            'content_type': request.content_type,
+            'content_length': request.content_length,
+            'file_keys': list(uploads.keys())
+        })
+
         # Check for file with both possible names (scan or image)
         file = None
-        if 'scan' in request.files:
-            file = request.files['scan']
-            print(f'[DEBUG] File found with key: scan')
-        elif 'image' in request.files:
-            file = request.files['image']
-            print(f'[DEBUG] File found with key: image')
+        if 'scan' in uploads:
+            file = uploads['scan']
+        elif 'image' in uploads:
+            file = uploads['image']
         else:
             # List all available keys for debugging
-            available_keys = list(request.files.keys())
-            print(f'[DEBUG] Available file keys: {available_keys}')
+            available_keys = list(uploads.keys())
+            logger.warning('Scan upload without an image file', extra={'file_keys': available_keys})
             return jsonify({
                 'error': {
                     'message': 'No image file provided',
@@ -100,7 +97,8 @@ def upload_scan():
 
         upload_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'scans', unique_filename)
         os.makedirs(os.path.dirname(upload_path), exist_ok=True)
-        file.save(upload_path)
+        with phase('file-save'):
+            file.save(upload_path)
 
         image_url = f"/uploads/scans/{unique_filename}"
 
@@ -114,11 +112,14 @@ def upload_scan():
             # Read the saved file and send it to AI service
             with open(upload_path, 'rb') as img_file:
                 files = {'image': (unique_filename, img_file, 'image/jpeg')}
-                ai_response = requests.post(
-                    'http://localhost:5003/analyze',
-                    files=files,
-                    timeout=30
-                )
+                with phase('ai'):
+                    ai_response = requests.post(
+                        'http://localhost:5003/analyze',
+                        files=files,
+                        headers=trace_headers(),
+                        timeout=call_timeout(30)
+                    )
+                include_timing(ai_response.headers)
 
                 if ai_response.status_code == 200:
                     ai_result = ai_response.json()
@@ -126,24 +127,23 @@ def upload_scan():
                     confidence = ai_result.get('confidence', 0.0)
                     findings = ai_result.get('findings', [])
                 else:
-                    print(f'AI service error: {ai_response.status_code} - {ai_response.text}')
+                    logger.warning('AI image analysis failed', extra={
+                        'status': ai_response.status_code,
+                        'body': ai_response.text[:200]
+                    })
                     # Use fallback values
                     result = 'analysis_failed'
                     confidence = 0.0
                     findings = ['فشل تحليل الصورة بواسطة نموذج الذكاء الاصطناعي', 'يرجى المحاولة مرة أخرى']
-        except Exception as ai_error:
-            print(f'AI service connection error: {ai_error}')
+        except Exception:
+            logger.warning('AI image analysis service error', exc_info=True)
             # Use fallback values
             result = 'analysis_failed'
             confidence = 0.0
             findings = ['تعذر الاتصال بخدمة التحليل', 'يرجى التأكد من تشغيل جميع الخدمات']
 
-        # Save to database
-        db = get_db()
-        scans = db.get('scans', [])
-
+        # Save to database (insert assigns the id)
         new_scan = {
-            'id': get_next_id(scans),
             'userId': request.user['id'],
             'imageUrl': image_url,
             'result': result,
@@ -154,15 +154,12 @@ def upload_scan():
             'source': ai_result.get('source') if ai_result else 'fallback'
         }
 
-        scans.append(new_scan)
-        db['scans'] = scans
-        save_db(db)
+        with phase('db-write'):
+            new_scan = insert('scans', new_scan)
 
         return jsonify(new_scan), 201
-    except Exception as e:
-        print(f'Upload scan error: {e}')
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        logger.exception('Upload scan error')
         return jsonify({
             'error': {
                 'message': 'Failed to upload scan',
@@ -175,46 +172,42 @@ def upload_scan():
 def delete_scan(scan_id):
     """Delete a scan"""
     try:
-        db = get_db()
-        scans = db.get('scans', [])
-        
-        # Find scan
-        scan = next((s for s in scans if s.get('id') == scan_id), None)
-        
-        if not scan:
-            return jsonify({
-                'error': {
-                    'message': 'Scan not found',
-                    'status': 404
-                }
-            }), 404
-        
-        # Check if user owns this scan
-        if scan.get('userId') != request.user['id']:
-            return jsonify({
-                'error': {
-                    'message': 'Unauthorized to delete this scan',
-                    'status': 403
-                }
-            }), 403
-        
-        # Delete file if exists
-        if scan.get('imageUrl'):
-            file_path = os.path.join(
-                current_app.config['UPLOAD_FOLDER'],
-                scan['imageUrl'].replace('/uploads/', '')
-            )
-            if os.path.exists(file_path):
-                os.remove(file_path)
-        
-        # Remove from database
-        scans = [s for s in scans if s.get('id') != scan_id]
-        db['scans'] = scans
-        save_db(db)
+        with transaction('scans'):
+            # Find scan
+            scan = find_one('scans', id=scan_id)
+            
+            if not scan:
+                return jsonify({
+                    'error': {
+                        'message': 'Scan not found',
+                        'status': 404
+                    }
+                }), 404
+            
+            # Check if user owns this scan
+            if scan.get('userId') != request.user['id']:
+                return jsonify({
+                    'error': {
+                        'message': 'Unauthorized to delete this scan',
+                        'status': 403
+                    }
+                }), 403
+            
+            # Delete file if exists
+            if scan.get('imageUrl'):
+                file_path = os.path.join(
+                    current_app.config['UPLOAD_FOLDER'],
+                    scan['imageUrl'].replace('/uploads/', '')
+                )
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+            
+            # Remove from database
+            delete('scans', id=scan_id)
         
         return jsonify({'message': 'Scan deleted successfully'})
-    except Exception as e:
-        print(f'Delete scan error: {e}')
+    except Exception:
+        logger.exception('Delete scan error')
         return jsonify({
             'error': {
                 'message': 'Failed to delete scan',
@@ -1,8 +1,10 @@
 from flask import Blueprint, request, jsonify
-from utils.database import get_users, save_users
+from utils.database import all_documents, find_one, update
 from utils.auth import auth_required, admin_required
+import logging
 
 users_bp = Blueprint('users', __name__)
+logger = logging.getLogger(__name__)
 
 @users_bp.route('/', methods=['GET'])
 @auth_required
@@ -10,12 +12,11 @@ users_bp = Blueprint('users', __name__)
 def get_all_users():
     """Get all users (admin only)"""
     try:
-        users = get_users()
         # Remove passwords from response
-        users_response = [{k: v for k, v in user.items() if k != 'password'} for user in users]
+        users_response = [{k: v for k, v in user.items() if k != 'password'} for user in all_documents('users')]
         return jsonify(users_response)
-    except Exception as e:
-        print(f'Get users error: {e}')
+    except Exception:
+        logger.exception('Get users error')
         return jsonify({
             'error': {
                 'message': 'Failed to retrieve users',
@@ -28,8 +29,7 @@ def get_all_users():
 def get_current_user():
     """Get current user profile"""
     try:
-        users = get_users()
-        user = next((u for u in users if u['id'] == request.user['id']), None)
+        user = find_one('users', id=request.user['id'])
         
         if not user:
             return jsonify({
@@ -42,8 +42,8 @@ def get_current_user():
         # Return user without password
         user_response = {k: v for k, v in user.items() if k != 'password'}
         return jsonify(user_response)
-    except Exception as e:
-        print(f'Get user profile error: {e}')
+    except Exception:
+        logger.exception('Get user profile error')
         return jsonify({
             'error': {
                 'message': 'Failed to retrieve user profile',
@@ -66,10 +66,13 @@ def update_user(user_id):
             }), 403
         
         data = request.get_json()
-        users = get_users()
         
-        # Find user
-        user = next((u for u in users if u['id'] == user_id), None)
+        # Update allowed fields
+        allowed_fields = ['name', 'phone', 'email']
+        changes = {field: data[field] for field in allowed_fields if field in data}
+        
+        # Save updated user (merged into the stored one in one step)
+        user = update('users', user_id, changes)
         
         if not user:
             return jsonify({
@@ -79,22 +82,11 @@ def update_user(user_id):
                 }
             }), 404
         
-        # Update allowed fields
-        allowed_fields = ['name', 'phone', 'email']
-        for field in allowed_fields:
-            if field in data:
-                user[field] = data[field]
-        
-        # Save updated users
-        save_users(users)
-        
         # Return updated user without password
         user_response = {k: v for k, v in user.items() if k != 'password'}
         return jsonify(user_response)
-    except Exception as e:
-        print(f'Update user error: {e}')
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        logger.exception('Update user error')
         return jsonify({
             'error': {
                 'message': 'Failed to update user profile',
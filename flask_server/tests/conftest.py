@@ -0,0 +1,55 @@
+import json
+import os
+import sys
+
+import pytest
+
+# Tests import the server's packages the way app.py does (from flask_server/)
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SERVER_DIR not in sys.path:
+    sys.path.insert(0, SERVER_DIR)
+# Shared service utilities live at the repository root
+ROOT_DIR = os.path.dirname(SERVER_DIR)
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+
+SAMPLE_DATA = {
+    'users.json': [
+        {'id': 1, 'email': 'sara@example.com', 'name': 'Sara'},
+        {'id': 2, 'email': 'omar@example.com', 'name': 'Omar'}
+    ],
+    'faqs.json': [
+        {'id': 1, 'question': 'What is a stroke?', 'answer': '...'}
+    ],
+    'db.json': {
+        'doctors': [
+            {'id': 1, 'name': 'Dr. Hassan', 'specialty': 'Neurology', 'rating': 4.8},
+            {'id': 2, 'name': 'Dr. Mona', 'specialty': 'Cardiology', 'rating': 4.5},
+            {'id': 3, 'name': 'Dr. Ali', 'specialty': 'Neurology', 'rating': 4.9}
+        ],
+        'bookings': [
+            {'id': 1, 'userId': 1, 'doctorId': 1, 'date': '2024-05-02', 'status': 'pending'},
+            {'id': 2, 'userId': 2, 'doctorId': 3, 'date': '2024-05-01', 'status': 'pending'},
+            {'id': 3, 'userId': 1, 'doctorId': 3, 'date': '2024-05-03', 'status': 'completed'}
+        ],
+        'favorites': [
+            {'id': 1, 'userId': 1, 'doctorId': 3}
+        ],
+        'scans': [
+            {'id': 1, 'userId': 2, 'createdAt': '2024-04-30T10:00:00', 'result': 'normal'}
+        ],
+        'reviews': [
+            {'id': 1, 'doctorId': 1, 'stars': 5}
+        ]
+    }
+}
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    """Data directory holding a copy of SAMPLE_DATA"""
+    for filename, data in SAMPLE_DATA.items():
+        with open(tmp_path / filename, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+    return str(tmp_path)
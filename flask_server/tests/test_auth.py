@@ -0,0 +1,84 @@
+import time
+
+import jwt
+import pytest
+from flask import Flask, jsonify, request
+
+from service_utils.identity import IDENTITY_HEADER, sign_identity, verify_identity
+from utils import auth
+
+JWT_SECRET = 'jwt-test-secret'
+IDENTITY_SECRET = 'identity-test-secret'
+CLAIMS = {'id': 1, 'email': 'sara@example.com', 'role': 'user'}
+
+
+def bearer(claims=CLAIMS, secret=JWT_SECRET, expires_in=3600):
+    token = jwt.encode(dict(claims, exp=int(time.time()) + expires_in), secret, algorithm='HS256')
+    return {'Authorization': f'Bearer {token}'}
+
+
+def identity(claims=CLAIMS):
+    return {IDENTITY_HEADER: sign_identity(dict(claims, exp=int(time.time()) + 3600), secret=IDENTITY_SECRET)}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # The server trusts the gateway's header with this secret (GATEWAY_IDENTITY_SECRET)
+    monkeypatch.setattr(auth, 'verify_identity', lambda value: verify_identity(value, secret=IDENTITY_SECRET))
+
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = JWT_SECRET
+
+    @app.route('/me')
+    @auth.auth_required
+    def me():
+        return jsonify({'id': request.user['id'], 'role': request.user['role']})
+
+    return app.test_client()
+
+
+def test_valid_token(client):
+    response = client.get('/me', headers=bearer())
+    assert response.status_code == 200
+    assert response.get_json() == {'id': 1, 'role': 'user'}
+
+
+def test_missing_token(client):
+    response = client.get('/me', headers=identity())
+    assert response.status_code == 401
+    assert response.get_json()['error']['message'] == 'No token provided'
+
+
+def test_identity_header_is_trusted_without_decoding_the_token(client):
+    # The gateway vouches for the claims, so the token is not decoded again
+    headers = dict(bearer(secret='not-the-server-secret'), **identity({**CLAIMS, 'role': 'admin'}))
+    response = client.get('/me', headers=headers)
+    assert response.status_code == 200
+    assert response.get_json() == {'id': 1, 'role': 'admin'}
+
+
+def test_invalid_identity_header_falls_back_to_the_token(client):
+    forged = identity({**CLAIMS, 'id': 2})[IDENTITY_HEADER][:-4] + 'AAAA'
+    response = client.get('/me', headers=dict(bearer(), **{IDENTITY_HEADER: forged}))
+    assert response.status_code == 200
+    assert response.get_json()['id'] == 1
+
+
+def test_invalid_identity_header_and_bad_token(client):
+    forged = identity()[IDENTITY_HEADER][:-4] + 'AAAA'
+    response = client.get('/me', headers=dict(bearer(secret='wrong'), **{IDENTITY_HEADER: forged}))
+    assert response.status_code == 401
+
+
+def test_expired_token(client):
+    response = client.get('/me', headers=bearer(expires_in=-10))
+    assert response.status_code == 401
+    assert response.get_json()['error']['message'] == 'Invalid or expired token'
+
+
+def test_header_ignored_without_identity_secret(client, monkeypatch):
+    monkeypatch.setattr(auth, 'verify_identity', lambda value: verify_identity(value, secret=''))
+    headers = dict(bearer(secret='not-the-server-secret'), **identity())
+    assert client.get('/me', headers=headers).status_code == 401
+    headers = dict(bearer(claims={**CLAIMS, 'id': 3}), **identity())
+    assert client.get('/me', headers=headers).get_json()['id'] == 3
@@ -0,0 +1,56 @@
+import json
+
+from utils.journal import Journal, write_atomic
+
+
+def entry(doc_id):
+    return {'op': 'insert', 'collection': 'favorites', 'doc': {'id': doc_id}}
+
+
+def test_append_and_read(tmp_path):
+    journal = Journal(str(tmp_path / 'db.json.journal'), sync=False)
+    assert journal.stat() == (None, 0)
+    assert journal.read() == ([], 0, 0)
+
+    inode, before, after = journal.append(entry(1))
+    assert before == 0 and (inode, after) == journal.stat()
+    _, _, end = journal.append(entry(2))
+
+    assert journal.read() == ([entry(1), entry(2)], end, end)
+    assert journal.read(after) == ([entry(2)], end, end)
+
+
+def test_torn_final_entry_is_skipped(tmp_path):
+    path = tmp_path / 'db.json.journal'
+    journal = Journal(str(path), sync=False)
+    _, _, complete = journal.append(entry(1))
+    with open(path, 'ab') as f:
+        f.write(json.dumps(entry(2)).encode('utf-8')[:-5])
+    torn = path.stat().st_size
+
+    assert journal.read() == ([entry(1)], complete, torn)
+
+    # The next entry starts on a fresh line, leaving the torn one unreadable
+    journal.append(entry(3), after_torn=True)
+    entries, offset, end = journal.read()
+    assert entries == [entry(1), entry(3)]
+    assert offset == end == path.stat().st_size
+
+
+def test_replace_keeps_tail(tmp_path):
+    journal = Journal(str(tmp_path / 'db.json.journal'), sync=False)
+    _, _, first = journal.append(entry(1))
+    journal.append(entry(2))
+
+    journal.replace(journal.tail(first))
+    assert journal.read()[0] == [entry(2)]
+    journal.replace()
+    assert journal.read() == ([], 0, 0)
+
+
+def test_write_atomic_leaves_no_temporary_file(tmp_path):
+    path = tmp_path / 'users.json'
+    write_atomic(str(path), b'[]', sync=False)
+    write_atomic(str(path), b'[{"id": 1}]', sync=False)
+    assert path.read_bytes() == b'[{"id": 1}]'
+    assert [p.name for p in tmp_path.iterdir()] == ['users.json']
@@ -0,0 +1,177 @@
+import json
+import multiprocessing
+import os
+import threading
+
+import pytest
+
+from utils import json_storage
+from utils.journal import Journal
+from utils.json_storage import JsonStorage
+
+
+def make_changes(storage):
+    storage.insert('favorites', {'userId': 2, 'doctorId': 1})
+    storage.update('bookings', 2, {'status': 'completed'})
+    storage.delete('favorites', userId=1, doctorId=3)
+    storage.insert('users', {'email': 'laila@example.com', 'name': 'Laila'})
+
+
+def snapshot(data_dir, filename):
+    with open(os.path.join(data_dir, filename), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def journal_of(data_dir, filename):
+    return Journal(os.path.join(data_dir, filename + '.journal'), sync=False)
+
+
+def test_writes_go_to_the_journal(data_dir):
+    storage = JsonStorage(data_dir, sync=False)
+    before = snapshot(data_dir, 'db.json')
+    make_changes(storage)
+
+    assert snapshot(data_dir, 'db.json') == before
+    assert len(journal_of(data_dir, 'db.json').read()[0]) == 3
+    assert storage.find('favorites') == [{'id': 2, 'userId': 2, 'doctorId': 1}]
+    assert storage.find_one('bookings', id=2)['status'] == 'completed'
+    assert storage.find_one('users', email='laila@example.com')['id'] == 3
+
+
+def test_replay_matches_the_writer(data_dir):
+    storage = JsonStorage(data_dir, sync=False)
+    make_changes(storage)
+
+    reopened = JsonStorage(data_dir, sync=False)
+    for filename in ('users.json', 'db.json'):
+        assert reopened.load(filename) == storage.load(filename)
+
+
+def test_replay_after_torn_final_entry(data_dir):
+    storage = JsonStorage(data_dir, sync=False)
+    make_changes(storage)
+    expected = storage.load('db.json')
+    # A crash mid-append leaves half a line behind
+    with open(os.path.join(data_dir, 'db.json.journal'), 'ab') as f:
+        f.write(b'{"op":"insert","collection":"favorites","doc":{"id":9')
+
+    reopened = JsonStorage(data_dir, sync=False)
+    assert reopened.load('db.json') == expected
+
+    # Writes after it are kept, the torn entry never is
+    reopened.insert('favorites', {'userId': 1, 'doctorId': 2})
+    again = JsonStorage(data_dir, sync=False)
+    assert [doc['id'] for doc in again.find('favorites')] == [2, 3]
+    assert again.load('db.json') == reopened.load('db.json')
+
+
+def test_compaction_folds_the_journal(data_dir):
+    storage = JsonStorage(data_dir, sync=False)
+    make_changes(storage)
+    expected = storage.load('db.json')
+
+    assert storage.compact('db.json')
+    assert snapshot(data_dir, 'db.json') == expected
+    assert journal_of(data_dir, 'db.json').stat()[1] == 0
+    assert JsonStorage(data_dir, sync=False).load('db.json') == expected
+    assert not storage.compact('db.json')
+
+
+def test_compaction_keeps_writes_made_while_serializing(data_dir, monkeypatch):
+    storage = JsonStorage(data_dir, sync=False)
+    make_changes(storage)
+    encode = json_storage._encode
+
+    def encode_during_write(data):
+        # Another thread writes between compaction's two lock sections
+        writer = threading.Thread(target=storage.insert, args=('favorites', {'userId': 1, 'doctorId': 2}))
+        writer.start()
+        writer.join()
+        return encode(data)
+
+    monkeypatch.setattr(json_storage, '_encode', encode_during_write)
+    assert storage.compact('db.json')
+    monkeypatch.setattr(json_storage, '_encode', encode)
+
+    # The snapshot predates the write; the journal still holds it
+    assert [doc['id'] for doc in snapshot(data_dir, 'db.json')['favorites']] == [2]
+    assert journal_of(data_dir, 'db.json').read()[0] == [
+        {'op': 'insert', 'collection': 'favorites', 'doc': {'id': 3, 'userId': 1, 'doctorId': 2}}
+    ]
+    for reader in (storage, JsonStorage(data_dir, sync=False)):
+        assert [doc['id'] for doc in reader.find('favorites')] == [2, 3]
+
+    # Compacting again folds it in too
+    assert storage.compact('db.json')
+    assert [doc['id'] for doc in snapshot(data_dir, 'db.json')['favorites']] == [2, 3]
+
+
+def test_crash_between_snapshot_and_journal_replace(data_dir, monkeypatch):
+    storage = JsonStorage(data_dir, sync=False)
+    make_changes(storage)
+    expected = storage.load('db.json')
+
+    def crash(self, content=b''):
+        raise RuntimeError('crashed before the journal was replaced')
+
+    monkeypatch.setattr(Journal, 'replace', crash)
+    with pytest.raises(RuntimeError):
+        storage.compact('db.json')
+    monkeypatch.undo()
+
+    # The new snapshot already holds the entries the old journal replays on top
+    assert snapshot(data_dir, 'db.json') == expected
+    assert len(journal_of(data_dir, 'db.json').read()[0]) == 3
+    reopened = JsonStorage(data_dir, sync=False)
+    assert reopened.load('db.json') == expected
+
+    assert reopened.compact('db.json')
+    assert JsonStorage(data_dir, sync=False).load('db.json') == expected
+
+
+def test_save_supersedes_the_journal(data_dir):
+    storage = JsonStorage(data_dir, sync=False)
+    make_changes(storage)
+    users = storage.load('users.json')
+    users.append({'id': 9, 'email': 'nour@example.com'})
+
+    storage.save('users.json', users)
+    assert journal_of(data_dir, 'users.json').stat()[1] == 0
+    assert JsonStorage(data_dir, sync=False).load('users.json') == users
+
+
+def test_views_are_read_only(data_dir):
+    storage = JsonStorage(data_dir, sync=False)
+    with pytest.raises(TypeError):
+        storage.find_one('users', id=1)['name'] = 'Changed'
+    copy = storage.load('users.json')
+    copy[0]['name'] = 'Changed'
+    assert storage.find_one('users', id=1)['name'] == 'Sara'
+
+
+def write_elsewhere(data_dir, compact):
+    storage = JsonStorage(data_dir, sync=False)
+    storage.insert('favorites', {'userId': 2, 'doctorId': 2})
+    storage.update('doctors', 1, {'rating': 5.0})
+    if compact:
+        storage.compact('db.json')
+
+
+def run_process(target, *args):
+    process = multiprocessing.get_context('spawn').Process(target=target, args=args)
+    process.start()
+    process.join(60)
+    assert process.exitcode == 0
+
+
+@pytest.mark.parametrize('compact', [False, True], ids=['journal', 'compacted'])
+def test_reader_sees_other_process_writes(data_dir, compact):
+    storage = JsonStorage(data_dir, sync=False)
+    assert [doc['id'] for doc in storage.find('favorites')] == [1]
+
+    run_process(write_elsewhere, data_dir, compact)
+
+    assert [doc['id'] for doc in storage.find('favorites')] == [1, 2]
+    assert storage.find_one('doctors', id=1)['rating'] == 5.0
+    # A cached view is reused until the files change again
+    assert storage.read('db.json') is storage.read('db.json')
@@ -0,0 +1,65 @@
+import pytest
+
+from utils.json_storage import JsonStorage
+from utils.migrate import migrate
+from utils.sqlite_storage import SqliteStorage
+
+QUERIES = [
+    ('users', {}),
+    ('users', {'email': 'omar@example.com'}),
+    ('faqs', {}),
+    ('doctors', {'specialty': 'Neurology'}),
+    ('bookings', {'userId': 1}),
+    ('bookings', {'userId': 1, 'status': 'completed'}),
+    ('bookings', {'status': 'cancelled'}),
+    ('favorites', {'userId': 1, 'doctorId': 3}),
+    ('scans', {'userId': 2}),
+    ('reviews', {'doctorId': 1})
+]
+
+
+@pytest.fixture
+def migrated(data_dir, tmp_path):
+    source = JsonStorage(data_dir)
+    target = SqliteStorage(str(tmp_path / 'neuroaid.sqlite3'))
+    copied = migrate(source, target)
+    return source, target, copied
+
+
+def test_copies_every_collection(migrated):
+    _, _, copied = migrated
+    assert copied == {
+        'users': 2, 'faqs': 1, 'doctors': 3, 'bookings': 3, 'favorites': 1, 'scans': 1, 'reviews': 1
+    }
+
+
+@pytest.mark.parametrize('collection, fields', QUERIES)
+def test_find_matches_json_backend(migrated, collection, fields):
+    source, target, _ = migrated
+    assert target.find(collection, **fields) == source.find(collection, **fields)
+    assert target.find_one(collection, **fields) == source.find_one(collection, **fields)
+
+
+@pytest.mark.parametrize('order_by', ['date', '-date', 'doctorId'])
+def test_order_matches_json_backend(migrated, order_by):
+    source, target, _ = migrated
+    assert target.find('bookings', order_by=order_by) == source.find('bookings', order_by=order_by)
+
+
+def test_whole_files_match(migrated):
+    source, target, _ = migrated
+    for filename in ('users.json', 'faqs.json', 'db.json'):
+        assert target.load(filename) == source.load(filename)
+    assert target.next_id('bookings') == source.next_id('bookings') == 4
+
+
+def test_keeps_filled_collections_unless_forced(migrated):
+    source, target, _ = migrated
+    target.update('users', 1, {'name': 'Sara A.'})
+
+    copied = migrate(source, target)
+    assert set(copied.values()) == {None}
+    assert target.find_one('users', id=1)['name'] == 'Sara A.'
+
+    migrate(source, target, force=True)
+    assert target.find_one('users', id=1)['name'] == 'Sara'
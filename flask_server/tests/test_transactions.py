@@ -0,0 +1,102 @@
+import multiprocessing
+import os
+import time
+
+import pytest
+
+from utils.json_storage import JsonStorage
+from utils.migrate import migrate
+from utils.sqlite_storage import SqliteStorage
+
+PROCESSES = 4
+ROUNDS = 25
+
+
+def open_storage(backend, location):
+    if backend == 'json':
+        return JsonStorage(location, sync=False)
+    return SqliteStorage(location)
+
+
+@pytest.fixture(params=['json', 'sqlite'])
+def backend(request, data_dir):
+    """(backend name, data directory or database path) filled with the sample data"""
+    if request.param == 'json':
+        return 'json', data_dir
+    path = os.path.join(data_dir, 'neuroaid.sqlite3')
+    migrate(JsonStorage(data_dir), SqliteStorage(path))
+    return 'sqlite', path
+
+
+def run_processes(target, *args, count=PROCESSES):
+    context = multiprocessing.get_context('spawn')
+    start = context.Event()
+    processes = [context.Process(target=target, args=(start, number) + args) for number in range(count)]
+    for process in processes:
+        process.start()
+    start.set()
+    deadline = time.monotonic() + 60
+    for process in processes:
+        process.join(max(deadline - time.monotonic(), 0))
+    hung = [process for process in processes if process.is_alive()]
+    for process in hung:
+        process.terminate()
+    assert not hung, 'deadlocked'
+    assert [process.exitcode for process in processes] == [0] * count
+
+
+def count_visits(start, number, backend, location):
+    storage = open_storage(backend, location)
+    start.wait()
+    for _ in range(ROUNDS):
+        with storage.transaction('doctors'):
+            doctor = storage.find_one('doctors', id=1)
+            # Give the others every chance to read the same value
+            time.sleep(0.001)
+            storage.update('doctors', 1, {'visits': doctor.get('visits', 0) + 1})
+
+
+def register_users(start, number, backend, location):
+    storage = open_storage(backend, location)
+    start.wait()
+    for i in range(ROUNDS):
+        email = f'user{i}@example.com'
+        with storage.transaction('users'):
+            if storage.find_one('users', email=email) is None:
+                time.sleep(0.001)
+                storage.insert('users', {'email': email, 'registeredBy': number})
+
+
+def book_and_rate(start, number, backend, location):
+    storage = open_storage(backend, location)
+    # Half the processes name the collections the other way round
+    collections = ('doctors', 'bookings') if number % 2 else ('bookings', 'doctors')
+    start.wait()
+    for _ in range(ROUNDS):
+        with storage.transaction(*collections):
+            doctor = storage.find_one('doctors', id=2)
+            time.sleep(0.001)
+            storage.insert('bookings', {'userId': 1, 'doctorId': 2, 'status': 'pending'})
+            storage.update('doctors', 2, {'bookings': doctor.get('bookings', 0) + 1})
+
+
+def test_read_check_write_loses_no_update(backend):
+    run_processes(count_visits, *backend)
+    assert open_storage(*backend).find_one('doctors', id=1)['visits'] == PROCESSES * ROUNDS
+
+
+def test_check_then_insert_keeps_documents_unique(backend):
+    run_processes(register_users, *backend)
+    users = open_storage(*backend).all('users')
+    emails = [user['email'] for user in users]
+    assert len(emails) == len(set(emails)) == 2 + ROUNDS
+    assert len({user['id'] for user in users}) == len(users)
+
+
+def test_transactions_over_several_collections_do_not_deadlock(backend):
+    run_processes(book_and_rate, *backend)
+    storage = open_storage(*backend)
+    bookings = storage.find('bookings', doctorId=2)
+    assert len(bookings) == PROCESSES * ROUNDS
+    assert len({booking['id'] for booking in bookings}) == len(bookings)
+    assert storage.find_one('doctors', id=2)['bookings'] == PROCESSES * ROUNDS
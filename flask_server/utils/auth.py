@@ -3,6 +3,8 @@ from functools import wraps
 from flask import request, jsonify, current_app
 from datetime import datetime, timedelta
 
+from service_utils.identity import IDENTITY_HEADER, verify_identity
+
 def generate_token(user_data):
     """Generate JWT token"""
     payload = {
@@ -48,8 +50,11 @@ def auth_required(f):
                 }
             }), 401
         
-        token = auth_header[7:]  # Remove 'Bearer ' prefix
-        payload = verify_token(token)
+        # The gateway already verified the token and vouches for its claims
+        payload = verify_identity(request.headers.get(IDENTITY_HEADER))
+        if payload is None:
+            token = auth_header[7:]  # Remove 'Bearer ' prefix
+            payload = verify_token(token)
         
         if not payload:
             return jsonify({
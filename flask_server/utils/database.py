@@ -1,34 +1,92 @@
-import json
 import os
-from datetime import datetime
+
+from utils.json_storage import JsonStorage
+from utils.sqlite_storage import SqliteStorage
+from utils.storage import next_id_of
 
 # Point to the backend/data directory (one level up from flask_server)
 DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data')
 
+# Storage backend: 'json' (data/*.json files) or 'sqlite' (one SQLite database)
+DB_BACKEND = os.getenv('DB_BACKEND', 'json').lower()
+DB_SQLITE_PATH = os.getenv('DB_SQLITE_PATH', os.path.join(DATA_DIR, 'neuroaid.sqlite3'))
+
+def create_storage(backend=DB_BACKEND):
+    """Storage backend selected by DB_BACKEND"""
+    if backend == 'json':
+        return JsonStorage(DATA_DIR)
+    if backend == 'sqlite':
+        return SqliteStorage(DB_SQLITE_PATH)
+    raise ValueError(f"Unknown DB_BACKEND {backend!r} (expected 'json' or 'sqlite')")
+
+storage = create_storage()
+
+# Collection API - documents returned may be shared, copy them before modifying
+
+def all_documents(collection):
+    """All documents of a collection"""
+    return storage.all(collection)
+
+def find(collection, order_by=None, **fields):
+    """Documents whose fields equal the given values ('-field' order_by sorts descending)"""
+    return storage.find(collection, order_by=order_by, **fields)
+
+def find_one(collection, **fields):
+    """First document whose fields equal the given values, or None"""
+    return storage.find_one(collection, **fields)
+
+def next_id(collection):
+    """Next free id of a collection"""
+    return storage.next_id(collection)
+
+def insert(collection, doc):
+    """Add a document (an id is assigned when it has none) and return it"""
+    return storage.insert(collection, doc)
+
+def update(collection, doc_id, changes):
+    """Apply changes to the document with the given id; returns it, or None if not found"""
+    return storage.update(collection, doc_id, changes)
+
+def delete(collection, **fields):
+    """Remove the documents whose fields equal the given values; returns how many"""
+    return storage.delete(collection, **fields)
+
+def transaction(*collections):
+    """
+    Context manager that keeps other writers (threads or processes) off
+    the given collections, for a check followed by a write:
+
+        with transaction('users'):
+            if not find_one('users', email=email):
+                insert('users', {...})
+
+    Each insert/update/delete on its own is already atomic.
+    """
+    return storage.transaction(*collections)
+
+# Whole-file API - a load followed by a save replaces the file, so it
+# can overwrite concurrent writes; routes use the collection API instead
+
+def read_json_file(filename):
+    """Read-only view of a JSON file from the data directory (shared - do not modify)"""
+    return storage.read(filename)
+
 def load_json_file(filename):
-    """Load JSON file from data directory"""
-    filepath = os.path.join(DATA_DIR, filename)
-    if not os.path.exists(filepath):
-        return [] if filename != 'db.json' else {}
-    
-    try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except:
-        return [] if filename != 'db.json' else {}
+    """Load JSON file from data directory (a private copy the caller may modify)"""
+    return storage.load(filename)
 
 def save_json_file(filename, data):
     """Save data to JSON file"""
-    os.makedirs(DATA_DIR, exist_ok=True)
-    filepath = os.path.join(DATA_DIR, filename)
-    
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    storage.save(filename, data)
 
 def get_users():
     """Get all users"""
     return load_json_file('users.json')
 
+def read_users():
+    """Get all users as a read-only view (for requests that do not modify them)"""
+    return read_json_file('users.json')
+
 def save_users(users):
     """Save users to file"""
     save_json_file('users.json', users)
@@ -37,16 +95,18 @@ def get_db():
     """Get main database"""
     return load_json_file('db.json')
 
+def read_db():
+    """Get main database as a read-only view (for requests that do not modify it)"""
+    return read_json_file('db.json')
+
 def save_db(db):
     """Save main database"""
     save_json_file('db.json', db)
 
 def get_faqs():
-    """Get FAQs"""
-    return load_json_file('faqs.json')
+    """Get FAQs (read-only)"""
+    return read_json_file('faqs.json')
 
 def get_next_id(items):
     """Get next ID for a list of items"""
-    if not items:
-        return 1
-    return max(item.get('id', 0) for item in items) + 1
+    return next_id_of(items)
@@ -0,0 +1,130 @@
+"""
+Append-only journal of changes to a JSON data file.
+
+The JSON backend records each insert/update/delete as one line of JSON
+appended to <data file>.journal instead of rewriting the data file, so a
+write costs the size of the change rather than the size of the data:
+
+    {"op": "insert", "collection": "favorites", "doc": {"id": 3, ...}}
+    {"op": "update", "collection": "bookings", "id": 1, "changes": {"status": "completed"}}
+    {"op": "delete", "collection": "favorites", "fields": {"userId": 1, "doctorId": 3}}
+
+The data file is the snapshot the journal applies to; compaction writes a
+new snapshot with every entry folded in and drops those entries. A line
+cut short by a crash has no trailing newline and is ignored.
+"""
+
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+def fsync_directory(path):
+    """Make a rename inside a directory durable (not possible on Windows)"""
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_atomic(filepath, content, sync=True):
+    """Replace a file with new bytes so readers see either the old or the new file, never a torn one"""
+    tmp_path = f'{filepath}.{os.getpid()}.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+            f.flush()
+            if sync:
+                os.fsync(f.fileno())
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    if sync:
+        fsync_directory(os.path.dirname(os.path.abspath(filepath)))
+
+
+class Journal:
+    """The journal file of one data file"""
+
+    def __init__(self, path, sync=True):
+        self.path = path
+        self.sync = sync
+
+    def stat(self):
+        """(inode, size) of the journal, or (None, 0) when there is none"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None, 0
+        return stat.st_ino, stat.st_size
+
+    def read(self, offset=0):
+        """
+        Entries from a byte offset on
+
+        Returns:
+            (entries, offset after the last complete line, bytes read in total)
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                chunk = f.read()
+        except OSError:
+            return [], offset, offset
+
+        complete = chunk.rfind(b'\n') + 1
+        entries = []
+        for line in chunk[:complete].splitlines():
+            if not line.strip():
+                continue
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                logger.warning('Skipping unreadable journal entry in %s', self.path)
+        return entries, offset + complete, offset + len(chunk)
+
+    def tail(self, offset):
+        """Raw bytes from a byte offset on"""
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                return f.read()
+        except OSError:
+            return b''
+
+    def append(self, entry, after_torn=False):
+        """
+        Append one entry (durably, unless sync is off)
+
+        after_torn starts the entry on a fresh line when the journal ends
+        in a line cut short by a crash.
+
+        Returns:
+            (journal inode, size before, size after) the write
+        """
+        line = json.dumps(entry, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+        if after_torn:
+            line = b'\n' + line
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, 'O_BINARY', 0), 0o644)
+        try:
+            # One write() call, so entries appended concurrently do not interleave
+            os.write(fd, line)
+            if self.sync:
+                os.fsync(fd)
+            stat = os.fstat(fd)
+        finally:
+            os.close(fd)
+        return stat.st_ino, stat.st_size - len(line), stat.st_size
+
+    def replace(self, content=b''):
+        """Atomically replace the journal (with the entries not yet compacted)"""
+        write_atomic(self.path, content, self.sync)
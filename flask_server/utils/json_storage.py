@@ -0,0 +1,372 @@
+"""
+JSON file storage backend (the original data/*.json layout).
+
+Each data file is a snapshot plus an append-only journal of the changes
+made since (utils/journal.py). A write appends one journal entry instead
+of rewriting the file, so its cost no longer grows with the data. A
+background thread folds the journal into a new snapshot (written to a
+temporary file and renamed over the old one) once it grows past
+DB_JOURNAL_COMPACT_BYTES, every DB_JOURNAL_COMPACT_INTERVAL seconds, and
+at exit.
+
+The current contents of each file are kept in memory as a read-only view
+shared by all readers. A view is revalidated against the snapshot's
+signature (mtime, size, inode) and the journal's size, so changes made
+by other processes are still picked up: new journal entries are applied
+on top, a new snapshot is read again.
+
+Writers take file locks (utils/filelock.py), so threads and processes
+can write the same files: one lock per collection, held across a
+transaction() block so a check followed by a write cannot lose an
+update, and one per data file, held while appending to or compacting its
+journal. Readers take no locks.
+"""
+
+import atexit
+import json
+import logging
+import os
+import threading
+from contextlib import ExitStack, contextmanager
+
+from utils.filelock import FileLock
+from utils.journal import Journal, write_atomic
+from utils.storage import (
+    collection_file, empty_file, freeze, thaw, matches, next_id_of, sort_documents, FrozenDict, FrozenList
+)
+
+logger = logging.getLogger(__name__)
+
+# fsync each journal entry before the write returns
+JOURNAL_SYNC = os.getenv('DB_JOURNAL_FSYNC', 'true').lower() in ('1', 'true', 'yes')
+# Journal size that triggers a compaction right away (bytes)
+COMPACT_BYTES = int(os.getenv('DB_JOURNAL_COMPACT_BYTES', 1024 * 1024))
+# Any journal entries are compacted after this long (seconds)
+COMPACT_INTERVAL = float(os.getenv('DB_JOURNAL_COMPACT_INTERVAL', 60))
+
+
+def _signature(filepath):
+    try:
+        stat = os.stat(filepath)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+def _encode(data):
+    return json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+
+
+def _index_of(docs, doc_id):
+    if doc_id is None:
+        return None
+    return next((i for i, doc in enumerate(docs) if doc.get('id') == doc_id), None)
+
+
+def apply_entry(docs, entry, wrap=freeze):
+    """
+    Apply a journal entry to a collection's documents, in place
+
+    Entries are idempotent, so replaying one that a snapshot already
+    contains (after a crash mid-compaction) changes nothing.
+
+    Returns:
+        the inserted or updated document (None if not found), or the number of documents deleted
+    """
+    op = entry['op']
+    if op == 'insert':
+        doc = wrap(entry['doc'])
+        index = _index_of(docs, doc.get('id'))
+        if index is None:
+            docs.append(doc)
+        else:
+            docs[index] = doc
+        return doc
+    if op == 'update':
+        index = _index_of(docs, entry['id'])
+        if index is None:
+            return None
+        doc = docs[index] = wrap({**docs[index], **entry['changes']})
+        return doc
+    if op == 'delete':
+        kept = [doc for doc in docs if not matches(doc, entry['fields'])]
+        removed = len(docs) - len(kept)
+        docs[:] = kept
+        return removed
+    raise ValueError(f'Unknown journal operation {op!r}')
+
+
+def _replay(data, entries):
+    """Apply journal entries to freshly parsed data"""
+    for entry in entries:
+        key = collection_file(entry['collection'])[1]
+        docs = data if key is None else data.setdefault(key, [])
+        apply_entry(docs, entry, wrap=dict)
+    return data
+
+
+def _with_entries(view, entries):
+    """New read-only view with journal entries applied (copying only the collections they touch)"""
+    if isinstance(view, list):
+        docs = list(view)
+        for entry in entries:
+            apply_entry(docs, entry)
+        return FrozenList(docs)
+
+    changed = {}
+    for entry in entries:
+        key = collection_file(entry['collection'])[1]
+        if key not in changed:
+            changed[key] = list(view.get(key) or ())
+        apply_entry(changed[key], entry)
+    return FrozenDict(view, **{key: FrozenList(docs) for key, docs in changed.items()})
+
+
+class _DataFile:
+    """What this process has seen of a data file (replaced, never modified)"""
+
+    __slots__ = ('snapshot', 'journal', 'offset', 'size', 'view')
+
+    def __init__(self, snapshot, journal, offset, size, view):
+        self.snapshot = snapshot  # Snapshot signature
+        self.journal = journal  # Journal inode
+        self.offset = offset  # End of the last complete journal entry applied
+        self.size = size  # Journal bytes seen (more than offset after a torn write)
+        self.view = view  # Read-only contents
+
+
+class JsonStorage:
+    """Collections kept in JSON files (snapshot plus journal) under a data directory"""
+
+    def __init__(self, data_dir, sync=JOURNAL_SYNC):
+        self.data_dir = data_dir
+        self.sync = sync
+        # filename -> _DataFile
+        self._files = {}
+        # Serializes catching up with the files within this process
+        self._lock = threading.RLock()
+        # lock name -> FileLock
+        self._file_locks = {}
+        self._compact_wanted = threading.Event()
+        self._compactor = None
+
+    def _path(self, filename):
+        return os.path.join(self.data_dir, filename)
+
+    def _journal(self, filename):
+        return Journal(self._path(filename) + '.journal', self.sync)
+
+    def _file_lock(self, name):
+        lock = self._file_locks.get(name)
+        if lock is None:
+            with self._lock:
+                lock = self._file_locks.get(name)
+                if lock is None:
+                    lock_dir = os.path.join(self.data_dir, '.locks')
+                    os.makedirs(lock_dir, exist_ok=True)
+                    lock = self._file_locks[name] = FileLock(os.path.join(lock_dir, f'{name}.lock'))
+        return lock
+
+    def _collection_lock(self, collection):
+        """Held by writers of a collection (and across a transaction)"""
+        return self._file_lock(collection)
+
+    def _journal_lock(self, filename):
+        """Held while a data file's journal is appended to, compacted or replaced"""
+        return self._file_lock(filename)
+
+    @contextmanager
+    def transaction(self, *collections):
+        """
+        Keep other writers off some collections for the duration of a block
+
+        Reads inside the block see every write committed before it, and no
+        other thread or process writes those collections until it ends.
+        Writers of other collections are not held up, so only write the
+        collections named. Each write is journaled as it is made; there is
+        no rollback.
+        """
+        with ExitStack() as stack:
+            # Always taken in the same order, so two transactions cannot deadlock
+            for collection in sorted(set(collections)):
+                stack.enter_context(self._collection_lock(collection))
+            yield self
+
+    def _current(self, filename):
+        """State of a data file, catching up with changes made since it was last seen"""
+        journal = self._journal(filename)
+        snapshot = _signature(self._path(filename))
+        inode, size = journal.stat()
+        state = self._files.get(filename)
+        if state is not None and (state.snapshot, state.journal, state.size) == (snapshot, inode, size):
+            return state
+
+        with self._lock:
+            snapshot = _signature(self._path(filename))
+            inode, size = journal.stat()
+            state = self._files.get(filename)
+            if state is not None and (state.snapshot, state.journal, state.size) == (snapshot, inode, size):
+                return state
+
+            if state is not None and (state.snapshot, state.journal) == (snapshot, inode) and size >= state.offset:
+                # Only new journal entries: apply them on top
+                entries, offset, end = journal.read(state.offset)
+                state = _DataFile(snapshot, inode, offset, end, _with_entries(state.view, entries))
+                self._files[filename] = state
+                return state
+
+            return self._load(filename, journal, snapshot, inode)
+
+    def _load(self, filename, journal, snapshot, inode):
+        """Read a data file's snapshot and replay its journal"""
+        data = empty_file(filename)
+        cacheable = True
+        if snapshot is not None:
+            try:
+                with open(self._path(filename), 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                logger.warning('Could not read %s, treating it as empty', filename)
+                data, cacheable = empty_file(filename), False
+
+        entries, offset, end = journal.read()
+        state = _DataFile(snapshot, inode, offset, end, freeze(_replay(data, entries)))
+        if cacheable:
+            self._files[filename] = state
+        return state
+
+    def read(self, filename):
+        """Read-only view of a data file"""
+        return self._current(filename).view
+
+    def load(self, filename):
+        """Private copy of a data file that the caller may modify"""
+        return thaw(self._current(filename).view)
+
+    def save(self, filename, data):
+        """Replace a data file (its journal entries are superseded)"""
+        os.makedirs(self.data_dir, exist_ok=True)
+        filepath = self._path(filename)
+        journal = self._journal(filename)
+
+        with self._journal_lock(filename):
+            write_atomic(filepath, _encode(data), self.sync)
+            journal.replace()
+            inode, _ = journal.stat()
+            self._files[filename] = _DataFile(_signature(filepath), inode, 0, 0, freeze(data))
+
+    def all(self, collection):
+        filename, key = collection_file(collection)
+        data = self.read(filename)
+        if key is not None:
+            data = data.get(key) or FrozenList()
+        return data
+
+    def find(self, collection, order_by=None, **fields):
+        return sort_documents([doc for doc in self.all(collection) if matches(doc, fields)], order_by)
+
+    def find_one(self, collection, **fields):
+        return next((doc for doc in self.all(collection) if matches(doc, fields)), None)
+
+    def next_id(self, collection):
+        return next_id_of(self.all(collection))
+
+    def insert(self, collection, doc):
+        def entry(docs):
+            new_doc = doc if 'id' in doc else {'id': next_id_of(docs), **doc}
+            return {'op': 'insert', 'collection': collection, 'doc': new_doc}
+        return self._write(collection, entry)
+
+    def update(self, collection, doc_id, changes):
+        return self._write(collection, lambda docs: {
+            'op': 'update', 'collection': collection, 'id': doc_id, 'changes': changes
+        })
+
+    def delete(self, collection, **fields):
+        return self._write(collection, lambda docs: {
+            'op': 'delete', 'collection': collection, 'fields': fields
+        })
+
+    def _write(self, collection, make_entry):
+        """
+        Apply a change to a collection and append it to the journal
+
+        make_entry(docs) builds the journal entry from the current
+        documents. A change with a falsy result (nothing found) is not
+        journaled.
+        """
+        filename, key = collection_file(collection)
+        journal = self._journal(filename)
+
+        with self._collection_lock(collection), self._journal_lock(filename):
+            # Up to date: nobody else can append while the lock is held
+            state = self._current(filename)
+            docs = list(state.view if key is None else state.view.get(key) or ())
+            entry = make_entry(docs)
+            result = apply_entry(docs, entry)
+            if not result:
+                return result
+
+            inode, _, after = journal.append(entry, after_torn=state.size > state.offset)
+            view = FrozenList(docs) if key is None else FrozenDict(state.view, **{key: FrozenList(docs)})
+            self._files[filename] = _DataFile(state.snapshot, inode, after, after, view)
+
+        self._start_compactor()
+        if after >= COMPACT_BYTES:
+            self._compact_wanted.set()
+        return result
+
+    def compact(self, filename, min_bytes=1):
+        """
+        Fold a data file's journal into a new snapshot
+
+        Returns:
+            True if the snapshot was rewritten
+        """
+        filepath = self._path(filename)
+        journal = self._journal(filename)
+
+        with self._journal_lock(filename):
+            state = self._current(filename)
+        if state.offset < min_bytes:
+            return False
+
+        # Serialized without holding the lock - writers keep appending meanwhile
+        content = _encode(state.view)
+
+        with self._journal_lock(filename):
+            current = self._current(filename)
+            if (current.snapshot, current.journal) != (state.snapshot, state.journal):
+                return False  # Saved or compacted meanwhile
+            write_atomic(filepath, content, self.sync)
+            # Keep the entries appended since the view was taken
+            journal.replace(journal.tail(state.offset))
+            inode, _ = journal.stat()
+            self._files[filename] = _DataFile(
+                _signature(filepath), inode,
+                current.offset - state.offset, current.size - state.offset, current.view
+            )
+        return True
+
+    def compact_all(self, min_bytes=1):
+        for filename in list(self._files):
+            try:
+                self.compact(filename, min_bytes)
+            except Exception:
+                logger.exception('Compacting %s failed', filename)
+
+    def _start_compactor(self):
+        if self._compactor is not None:
+            return
+        with self._lock:
+            if self._compactor is None:
+                self._compactor = threading.Thread(target=self._compact_loop, name='journal-compactor', daemon=True)
+                self._compactor.start()
+                # Leave up-to-date snapshots behind on a clean shutdown
+                atexit.register(self.compact_all)
+
+    def _compact_loop(self):
+        while True:
+            urgent = self._compact_wanted.wait(COMPACT_INTERVAL)
+            self._compact_wanted.clear()
+            self.compact_all(COMPACT_BYTES if urgent else 1)
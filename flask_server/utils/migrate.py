@@ -0,0 +1,71 @@
+"""
+One-shot migration of the data/*.json files into the SQLite backend.
+
+    cd flask_server
+    python -m utils.migrate [--force] [--data-dir DIR] [--sqlite PATH]
+
+Copies users.json, faqs.json and every collection in db.json into the
+database at DB_SQLITE_PATH, keeping document order. Collections that
+already hold documents are left alone unless --force is given, in which
+case they are replaced. The JSON files are not modified; set
+DB_BACKEND=sqlite afterwards to serve from the database.
+"""
+
+import argparse
+import sys
+
+from dotenv import load_dotenv
+
+# DB_SQLITE_PATH may be set in .env, as for app.py
+load_dotenv()
+
+from utils.database import DATA_DIR, DB_SQLITE_PATH
+from utils.json_storage import JsonStorage
+from utils.sqlite_storage import SqliteStorage
+from utils.storage import DATA_FILES, file_collections
+
+
+def migrate(source, target, force=False):
+    """
+    Copy every collection of a JsonStorage into a SqliteStorage
+
+    Returns:
+        {collection: documents copied, or None when skipped}
+    """
+    copied = {}
+    for filename in DATA_FILES:
+        data = source.load(filename)
+        if filename == 'db.json':
+            keys = [key for key, value in data.items() if isinstance(value, list)]
+            collections = {name: data.get(name, []) for name in file_collections(filename, keys)}
+        else:
+            collections = {name: data for name in file_collections(filename)}
+
+        for name, docs in collections.items():
+            if target.find_one(name) is not None and not force:
+                copied[name] = None
+                continue
+            target.replace(name, docs)
+            copied[name] = len(docs)
+    return copied
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Copy the data/*.json files into the SQLite database')
+    parser.add_argument('--data-dir', default=DATA_DIR, help='directory holding the JSON files')
+    parser.add_argument('--sqlite', default=DB_SQLITE_PATH, help='SQLite database to fill')
+    parser.add_argument('--force', action='store_true', help='replace collections that already hold documents')
+    args = parser.parse_args(argv)
+
+    copied = migrate(JsonStorage(args.data_dir), SqliteStorage(args.sqlite), force=args.force)
+    for name, count in copied.items():
+        if count is None:
+            print(f'{name}: skipped (not empty, use --force to replace)')
+        else:
+            print(f'{name}: {count} documents')
+    print(f'Migrated into {args.sqlite}')
+    return 0 if all(count is not None for count in copied.values()) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
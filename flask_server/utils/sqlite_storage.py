@@ -0,0 +1,206 @@
+"""
+SQLite storage backend.
+
+Every collection is a table of JSON documents:
+
+    CREATE TABLE doctors (seq INTEGER PRIMARY KEY, id INTEGER, doc TEXT NOT NULL)
+
+seq keeps insertion order (documents come back in the order the JSON
+files kept them), id is indexed for lookups by id, and the fields in
+storage.INDEXES get expression indexes on json_extract(doc, '$.field'),
+so finding a user by email or a user's bookings no longer scans the
+whole collection.
+
+The database runs in WAL mode, so readers never wait for a writer. Each
+thread keeps its own connection, whose statement cache reuses the
+prepared statements; writes run in short BEGIN IMMEDIATE transactions.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from utils.storage import INDEXES, check_name, file_collections
+
+# How long a writer waits for another writer's lock (seconds)
+BUSY_TIMEOUT = float(os.getenv('DB_SQLITE_BUSY_TIMEOUT', 10))
+
+
+def _field(name):
+    """SQL expression of a document field (matches the expression indexes)"""
+    return 'id' if name == 'id' else f"json_extract(doc, '$.{check_name(name)}')"
+
+
+def _where(fields):
+    clauses, params = [], []
+    for name, value in fields.items():
+        if value is None:
+            clauses.append(f'{_field(name)} IS NULL')
+        else:
+            clauses.append(f'{_field(name)} = ?')
+            params.append(value)
+    return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+
+def _encode(doc):
+    return json.dumps(doc, ensure_ascii=False)
+
+
+class SqliteStorage:
+    """Collections kept in an SQLite database, one table per collection"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._tables = set()
+        self._schema_lock = threading.Lock()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            # Autocommit mode: transactions are opened explicitly by _transaction
+            connection = sqlite3.connect(
+                self.path, timeout=BUSY_TIMEOUT, isolation_level=None,
+                check_same_thread=False, cached_statements=256
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            # Durable at each checkpoint rather than each commit - safe in WAL mode
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def _table(self, collection):
+        """Quoted table name of a collection, creating the table and its indexes on first use"""
+        check_name(collection)
+        if collection not in self._tables:
+            with self._schema_lock:
+                if collection not in self._tables:
+                    connection = self._connection()
+                    connection.execute(
+                        f'CREATE TABLE IF NOT EXISTS "{collection}" '
+                        '(seq INTEGER PRIMARY KEY, id INTEGER, doc TEXT NOT NULL)'
+                    )
+                    connection.execute(f'CREATE INDEX IF NOT EXISTS "{collection}_id" ON "{collection}" (id)')
+                    for fields in INDEXES.get(collection, ()):
+                        connection.execute(
+                            f'CREATE INDEX IF NOT EXISTS "{collection}_{"_".join(fields)}" '
+                            f'ON "{collection}" ({", ".join(_field(name) for name in fields)})'
+                        )
+                    self._tables.add(collection)
+        return f'"{collection}"'
+
+    @contextmanager
+    def _transaction(self):
+        connection = self._connection()
+        if connection.in_transaction:
+            # Part of an enclosing transaction(), which commits or rolls back
+            yield connection
+            return
+        # Take the write lock up front so two writers cannot both read, then fail to commit
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    @contextmanager
+    def transaction(self, *collections):
+        """
+        Run a block of reads and writes as one SQLite transaction
+
+        SQLite has one writer at a time, so this holds the database's write
+        lock: the block sees every committed write, none of its writes is
+        kept if it raises, and other writers wait until it ends. Readers
+        are never blocked (WAL).
+        """
+        for collection in collections:
+            self._table(collection)
+        with self._transaction():
+            yield self
+
+    def collections(self):
+        """Names of all collection tables"""
+        rows = self._connection().execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+        )
+        return [name for (name,) in rows]
+
+    def all(self, collection):
+        return self.find(collection)
+
+    def find(self, collection, order_by=None, **fields):
+        table = self._table(collection)
+        where, params = _where(fields)
+        order = 'seq'
+        if order_by:
+            order = f"{_field(order_by.lstrip('-'))} {'DESC' if order_by.startswith('-') else 'ASC'}, seq"
+        rows = self._connection().execute(f'SELECT doc FROM {table}{where} ORDER BY {order}', params)
+        return [json.loads(doc) for (doc,) in rows]
+
+    def find_one(self, collection, **fields):
+        table = self._table(collection)
+        where, params = _where(fields)
+        row = self._connection().execute(f'SELECT doc FROM {table}{where} ORDER BY seq LIMIT 1', params).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def next_id(self, collection):
+        table = self._table(collection)
+        return self._connection().execute(f'SELECT COALESCE(MAX(id), 0) + 1 FROM {table}').fetchone()[0]
+
+    def insert(self, collection, doc):
+        table = self._table(collection)
+        with self._transaction() as connection:
+            if 'id' not in doc:
+                new_id = connection.execute(f'SELECT COALESCE(MAX(id), 0) + 1 FROM {table}').fetchone()[0]
+                doc = {'id': new_id, **doc}
+            connection.execute(f'INSERT INTO {table} (id, doc) VALUES (?, ?)', (doc.get('id'), _encode(doc)))
+        return doc
+
+    def update(self, collection, doc_id, changes):
+        table = self._table(collection)
+        with self._transaction() as connection:
+            row = connection.execute(f'SELECT seq, doc FROM {table} WHERE id = ? ORDER BY seq LIMIT 1', (doc_id,)).fetchone()
+            if row is None:
+                return None
+            doc = json.loads(row[1])
+            doc.update(changes)
+            connection.execute(f'UPDATE {table} SET id = ?, doc = ? WHERE seq = ?', (doc.get('id'), _encode(doc), row[0]))
+        return doc
+
+    def delete(self, collection, **fields):
+        table = self._table(collection)
+        where, params = _where(fields)
+        with self._transaction() as connection:
+            return connection.execute(f'DELETE FROM {table}{where}', params).rowcount
+
+    def replace(self, collection, docs):
+        """Replace every document of a collection (used by save and the migrator)"""
+        table = self._table(collection)
+        with self._transaction() as connection:
+            connection.execute(f'DELETE FROM {table}')
+            connection.executemany(
+                f'INSERT INTO {table} (id, doc) VALUES (?, ?)',
+                ((doc.get('id'), _encode(doc)) for doc in docs)
+            )
+
+    def read(self, filename):
+        """A data file's contents, assembled from its collections"""
+        if filename != 'db.json':
+            return self.all(file_collections(filename)[0])
+        return {name: self.all(name) for name in file_collections('db.json', self.collections())}
+
+    load = read
+
+    def save(self, filename, data):
+        """Replace a data file's collections"""
+        if filename != 'db.json':
+            self.replace(file_collections(filename)[0], data)
+            return
+        for name, docs in data.items():
+            if isinstance(docs, list):
+                self.replace(name, docs)
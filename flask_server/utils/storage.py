@@ -0,0 +1,127 @@
+"""
+Shared pieces of the storage backends behind utils.database.
+
+The data is a set of named collections of JSON documents, each with an
+integer 'id'. Two backends store them and implement the same methods
+(all, find, find_one, next_id, insert, update, delete, plus read/load/save
+of a whole data file for the older get_db()/save_db() style API):
+
+- JsonStorage (utils/json_storage.py): the original data/*.json files,
+  each with an append-only journal of the changes since it was written
+- SqliteStorage (utils/sqlite_storage.py): one SQLite database, one table
+  per collection, indexed on the fields the routes look documents up by
+
+Documents handed out by all/find/find_one may be shared between requests
+and must not be modified - copy them first.
+"""
+
+import re
+
+# collection -> (data file, key inside the file or None when the file is just that list)
+# Other collections live under their own key in db.json
+COLLECTIONS = {
+    'users': ('users.json', None),
+    'faqs': ('faqs.json', None),
+    'doctors': ('db.json', 'doctors'),
+    'bookings': ('db.json', 'bookings'),
+    'favorites': ('db.json', 'favorites'),
+    'scans': ('db.json', 'scans')
+}
+DATA_FILES = ('users.json', 'db.json', 'faqs.json')
+
+# Fields documents are looked up by, per collection (composite indexes as tuples)
+INDEXES = {
+    'users': [('email',)],
+    'bookings': [('userId',)],
+    'favorites': [('userId', 'doctorId')],
+    'scans': [('userId', 'createdAt')]
+}
+
+_NAME = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def check_name(name):
+    """Collection and field names end up in SQL, so only plain identifiers are allowed"""
+    if not _NAME.match(name):
+        raise ValueError(f'Invalid collection or field name: {name!r}')
+    return name
+
+
+def collection_file(collection):
+    """(data file, key) a collection is kept under in the JSON layout"""
+    return COLLECTIONS.get(collection, ('db.json', check_name(collection)))
+
+
+def file_collections(filename, keys=()):
+    """Collections kept in a data file (db.json also holds any other keys given)"""
+    names = [name for name, (file, _) in COLLECTIONS.items() if file == filename]
+    if filename == 'db.json':
+        names += [key for key in keys if key not in COLLECTIONS]
+    return names
+
+
+def empty_file(filename):
+    return {} if filename == 'db.json' else []
+
+
+class FrozenDict(dict):
+    """Read-only dict shared through a cache (copy() returns a plain dict)"""
+
+    __slots__ = ()
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError('Stored documents are read-only; copy them before modifying')
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+
+class FrozenList(list):
+    """Read-only list shared through a cache (copy() returns a plain list)"""
+
+    __slots__ = ()
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError('Stored documents are read-only; copy them before modifying')
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
+    append = extend = insert = pop = remove = clear = sort = reverse = _read_only
+
+    def copy(self):
+        return list(self)
+
+
+def freeze(value):
+    """Read-only copy of parsed JSON data"""
+    if isinstance(value, dict):
+        return FrozenDict((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return FrozenList(freeze(item) for item in value)
+    return value
+
+
+def thaw(value):
+    """Plain, modifiable copy of frozen data"""
+    if isinstance(value, dict):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [thaw(item) for item in value]
+    return value
+
+
+def matches(doc, fields):
+    return all(doc.get(name) == value for name, value in fields.items())
+
+
+def sort_documents(docs, order_by):
+    """Sort by a field ('-field' for descending); documents without it sort as ''"""
+    if not order_by:
+        return docs
+    field = order_by.lstrip('-')
+    return sorted(docs, key=lambda doc: doc.get(field, ''), reverse=order_by.startswith('-'))
+
+
+def next_id_of(docs):
+    if not docs:
+        return 1
+    return max(doc.get('id', 0) for doc in docs) + 1
@@ -7,6 +7,7 @@ Provides routing, logging, and proxying capabilities.
 
 import sys
 import os
+import socket
 
 # Fix Windows encoding issues - MUST BE FIRST
 if sys.platform == 'win32':
@@ -18,23 +19,51 @@ if sys.platform == 'win32':
         sys.stderr = codecs.getwriter('utf-8')(sys.stderr.buffer, 'strict')
     os.environ['PYTHONIOENCODING'] = 'utf-8'
 
+# GATEWAY_MODE=async serves the same routes from the asyncio engine -
+# hand over before any of the Flask engine's state below is built
+if __name__ == '__main__' and os.environ.get('GATEWAY_MODE', 'sync').lower() == 'async':
+    from gateway_async import main
+    sys.exit(main())
+
 from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
 import requests
+import threading
 import time
 from datetime import datetime
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
 from werkzeug.exceptions import HTTPException
 
+from gateway_utils.auth import auth_stats, identity_headers, token_rejection
+from gateway_utils.balancer import get_balancer
+from gateway_utils.batch import BATCH_WORKERS, BatchError, batch_error, batch_result, parse_batch
+from gateway_utils.breaker import CircuitOpenError, get_breaker
+from gateway_utils.bulkhead import AdmissionController, BulkheadRejected
+from gateway_utils.channel import CHANNEL_PATH
+from gateway_utils.cache import ResponseCache, resource_prefix
+from gateway_utils.coalesce import SingleFlight
+from gateway_utils.compress import compress_stream, start_compression
+from gateway_utils.health import HealthMonitor
+from gateway_utils.hedge import HEDGE_WORKERS, get_hedge_policy, hedge_stats, hedging_enabled
+from gateway_utils.http import STREAM_PROXY, STREAM_CHUNK_SIZE, filter_headers
+from gateway_utils.logs import log_request, log_response, print_banner
+from gateway_utils.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, count_stream, metrics, route_label
+from gateway_utils.pool import get_session, retire_pool
+from gateway_utils.ratelimit import RateLimiter, client_key
+from gateway_utils.registry import RegistryError, ServiceRegistry, admin_denied
+from gateway_utils.services import SERVICES
+from gateway_utils.sse import is_event_stream, relay_events
+from gateway_utils.timeouts import get_timeout_policy, timeout_stats, upstream_route
+from service_utils.identity import IDENTITY_HEADER
+from service_utils.logs import setup_logging
+from service_utils.tracing import DEADLINE_HEADER, REQUEST_ID_HEADER, current_trace, include_timing, init_app as init_tracing, phase, trace_headers
+
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout)
-    ]
-)
-logger = logging.getLogger(__name__)
+# The gateway writes its own access log - skip werkzeug's duplicate lines
+setup_logging('gateway', levels={'werkzeug': 'WARNING'})
+logger = logging.getLogger('gateway')
 
 # Create Flask app
 app = Flask(__name__)
@@ -45,72 +74,221 @@ CORS(app, resources={
     r"/*": {
         "origins": "*",  # Allow all origins for local network usage
         "methods": ["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization", "Accept"],
-        "expose_headers": ["Content-Type", "Authorization"],
+        "allow_headers": ["Content-Type", "Authorization", "Accept", "X-Request-Timeout-Ms"],
+        "expose_headers": ["Content-Type", "Authorization", "X-Request-ID", "Server-Timing"],
         "supports_credentials": True,
         "max_age": 3600
     }
 })
 
-# Service configuration
-# Using localhost since all services run on the same machine as the gateway
-# The gateway itself listens on 0.0.0.0 for LAN access
-SERVICES = {
-    'main': {
-        'name': 'Main Flask Server',
-        'url': 'http://127.0.0.1:5000',
-        'prefix': '/api/main'
-    },
-    'ai_chatbot': {
-        'name': 'AI Chatbot Service',
-        'url': 'http://127.0.0.1:5001',
-        'prefix': '/api/ai/chat'
-    },
-    'ai_assessment': {
-        'name': 'Stroke Assessment Service',
-        'url': 'http://127.0.0.1:5002',
-        'prefix': '/api/ai/assessment'
-    },
-    'ai_image': {
-        'name': 'Stroke Image Analysis Service',
-        'url': 'http://127.0.0.1:5003',
-        'prefix': '/api/ai/image'
-    }
-}
+# Request IDs and the Server-Timing breakdown of every hop
+init_tracing(app, 'gateway')
+
+# Cached, concurrently refreshed backend health for /health
+health_monitor = HealthMonitor(SERVICES)
+
+# Response cache for read-mostly GET endpoints
+response_cache = ResponseCache()
 
-# Color codes for terminal output
-class Colors:
-    HEADER = '\033[95m'
-    OKBLUE = '\033[94m'
-    OKCYAN = '\033[96m'
-    OKGREEN = '\033[92m'
-    WARNING = '\033[93m'
-    FAIL = '\033[91m'
-    ENDC = '\033[0m'
-    BOLD = '\033[1m'
-    UNDERLINE = '\033[4m'
+# Identical concurrent cache misses share one upstream request
+inflight = SingleFlight()
 
+# Per-client token buckets for each route prefix
+rate_limiter = RateLimiter()
 
-def log_request(method, path, service_name=None):
-    """Log incoming request"""
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    logger.info(f"{Colors.OKCYAN}[GATEWAY]{Colors.ENDC} {timestamp} - Incoming Request: {Colors.BOLD}{method}{Colors.ENDC} {path}")
-    if service_name:
-        logger.info(f"{Colors.OKBLUE}[GATEWAY]{Colors.ENDC} Routing to: {Colors.OKGREEN}{service_name}{Colors.ENDC}")
+# Per-route-class concurrency limits with priority queueing
+admission = AdmissionController()
 
+# Threads that race hedged reads against each other
+hedge_executor = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix='hedge')
 
-def log_response(status_code, time_taken):
-    """Log outgoing response"""
-    color = Colors.OKGREEN if 200 <= status_code < 300 else Colors.WARNING if 300 <= status_code < 400 else Colors.FAIL
-    logger.info(f"{Colors.HEADER}[GATEWAY]{Colors.ENDC} Response: {color}{status_code}{Colors.ENDC} - Time: {Colors.BOLD}{time_taken:.2f}ms{Colors.ENDC}\n")
+# Threads that run the sub-requests of /api/batch
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix='batch')
 
+# SERVICES follows the registry file without a restart (watched once start_registry() runs)
+registry = ServiceRegistry(SERVICES, retire_pool)
 
-def proxy_request(service_url, path, method, headers, data=None, files=None):
+
+def start_registry():
+    """Apply the registry file and watch it for changes (sync engine only)"""
+    registry.check_file()
+    registry.watch()
+
+
+def send_upstream(service, path, method, timeout=30, tried=None, adaptive=True, **kwargs):
+    """
+    Send a request to the least-loaded healthy replica of a service
+
+    Args:
+        service: SERVICES entry of the target service
+        path: Upstream request path
+        method: HTTP method
+        timeout: Connect/read timeout in seconds - the most the call may
+            wait; shortened to the route's adaptive timeout and the
+            client's remaining budget
+        tried: Optional list of replica URLs to avoid; the chosen one is appended
+        adaptive: False for streams, whose reads may idle longer than any
+            response time seen so far
+        **kwargs: Passed through to requests (headers, params, data, json, files)
+
+    Returns:
+        (response, finish) - the streamed upstream response and a callback
+        that closes it and releases the replica; finish may be called more
+        than once but must be called at least once
+
+    Raises:
+        CircuitOpenError when the service's circuit breaker is open
+        requests exceptions when the backend cannot be reached or the
+        client's deadline has already passed
+    """
+    upstream = (('upstream', service['key']),)
+    trace = current_trace()
+    policy = get_timeout_policy(service)
+    route = upstream_route(method, path)
+    limit = policy.timeout(route, timeout) if adaptive else timeout
+    remaining = trace.remaining() if trace is not None else None
+    if remaining is not None and remaining <= 0:
+        metrics.inc('gateway_upstream_errors_total', upstream + (('kind', 'deadline'),))
+        raise requests.exceptions.Timeout('The request deadline has passed')
+    call_timeout = limit if remaining is None else min(limit, remaining)
+
+    breaker = get_breaker(service)
+    try:
+        breaker.allow()
+    except CircuitOpenError:
+        metrics.inc('gateway_upstream_errors_total', upstream + (('kind', 'circuit_open'),))
+        raise
+    # Carry the request ID, the time the gateway will wait and the verified
+    # caller identity to the backend, replacing any the client sent
+    headers = {
+        key: value for key, value in (kwargs.get('headers') or {}).items()
+        if key.lower() not in ('x-request-id', DEADLINE_HEADER.lower(), IDENTITY_HEADER.lower())
+    }
+    authorization = next((value for key, value in headers.items() if key.lower() == 'authorization'), None)
+    kwargs['headers'] = {
+        **headers, **trace_headers(), **identity_headers(authorization),
+        DEADLINE_HEADER: str(max(int(call_timeout * 1000), 1))
+    }
+    if tried is None:
+        lease = get_balancer(service).acquire()
+    else:
+        lease = get_balancer(service).acquire(exclude=tried)
+        tried.append(lease.url)
+    start = time.monotonic()
+    try:
+        response = get_session(service, lease.url).request(
+            method,
+            f"{lease.url}{path}",
+            stream=True,
+            timeout=call_timeout,
+            **kwargs
+        )
+    except Exception as e:
+        # Connection errors and timeouts count against the replica and the service
+        lease.release(ok=False)
+        breaker.record(False, time.monotonic() - start)
+        metrics.inc('gateway_upstream_errors_total', upstream + (('kind', upstream_error_kind(e)),))
+        if trace is not None:
+            trace.add('upstream', time.monotonic() - start)
+        if adaptive and isinstance(e, requests.exceptions.Timeout) and call_timeout == limit:
+            # Only the route's own timeout says anything about its latency
+            policy.timed_out(route, limit)
+        raise
+
+    # Time to response headers - streamed bodies may legitimately run long
+    latency = time.monotonic() - start
+    if trace is not None:
+        trace.add('upstream', latency)
+    if adaptive:
+        policy.record(route, latency)
+    ok = response.status_code < 500
+    metrics.observe('gateway_upstream_duration_seconds', upstream, latency)
+    metrics.inc('gateway_upstream_requests_total', upstream + (('status', str(response.status_code)),))
+    recorded = False
+
+    def finish(failed=False):
+        nonlocal recorded
+        response.close()
+        lease.release(ok and not failed)
+        if not recorded:
+            recorded = True
+            breaker.record(ok and not failed, latency)
+
+    return response, finish
+
+
+def send_upstream_hedged(service, path, method, timeout=30, route=None, **kwargs):
+    """
+    send_upstream for idempotent reads that may be hedged
+
+    The request is sent from the calling thread right away. When it has
+    not answered within the route's p95 and the hedge budget allows, a
+    hedge thread sends the same request to a second replica. The first
+    request's response is used when it succeeds (the hedge's is released
+    as soon as it arrives); when it fails, the hedge already in flight
+    answers instead. Requests that can't be hedged go straight to
+    send_upstream. route (the resource the latency is tracked under)
+    defaults to that of the current request.
+    """
+    if not hedging_enabled(service, method, kwargs.get('data')):
+        return send_upstream(service, path, method, timeout, **kwargs)
+
+    policy = get_hedge_policy(service)
+    route = route or resource_prefix(request.path)
+    delay = policy.delay(route)
+    tried = []
+
+    def attempt():
+        start = time.monotonic()
+        result = send_upstream(service, path, method, timeout, tried=tried, **kwargs)
+        policy.record(route, time.monotonic() - start)
+        return result
+
+    if delay is None:
+        # Not enough samples yet to know what slow means for this route
+        return attempt()
+
+    primary_done = threading.Event()
+
+    def hedge_after_delay():
+        if primary_done.wait(delay) or not get_balancer(service).has_alternative(tried) or not policy.spend():
+            return None
+        return attempt()
+
+    # Runs in its own copy of the context, so it keeps the trace; a busy
+    # executor only delays the hedge, never the first request
+    hedge = hedge_executor.submit(copy_context().run, hedge_after_delay)
+    try:
+        result = attempt()
+    except Exception:
+        primary_done.set()
+        if hedge.cancel() or hedge.exception() is not None or hedge.result() is None:
+            # No hedge answered - report the original request's error
+            raise
+        policy.won()
+        metrics.inc('gateway_upstream_hedges_total', (('upstream', service['key']), ('winner', 'hedge')))
+        return hedge.result()
+
+    primary_done.set()
+    if not hedge.cancel():
+        hedge.add_done_callback(lambda future: release_hedge_loser(future, service))
+    return result
+
+
+def release_hedge_loser(future, service):
+    """Close the response of a hedge that was not used"""
+    if future.exception() is None and future.result() is not None:
+        metrics.inc('gateway_upstream_hedges_total', (('upstream', service['key']), ('winner', 'primary')))
+        _, finish = future.result()
+        finish()
+
+
+def proxy_request(service, path, method, headers, data=None, files=None):
     """
     Forward request to the target service
     
     Args:
-        service_url: Base URL of the service
+        service: SERVICES entry of the target service
         path: Request path
         method: HTTP method
         headers: Request headers
@@ -120,9 +298,6 @@ def proxy_request(service_url, path, method, headers, data=None, files=None):
     Returns:
         Response from the target service
     """
-    # Build target URL
-    target_url = f"{service_url}{path}"
-
     # Filter headers (remove host-specific headers)
     # When sending files, also remove Content-Type to let requests set it correctly
     excluded_headers = ['host', 'connection', 'content-length']
@@ -134,62 +309,36 @@ def proxy_request(service_url, path, method, headers, data=None, files=None):
         if key.lower() not in excluded_headers
     }
 
+    if method not in ['GET', 'POST', 'PUT', 'DELETE', 'PATCH']:
+        return jsonify({'error': f'Method {method} not supported'}), 405
+
+    kwargs = {'headers': filtered_headers}
+    if method == 'GET':
+        kwargs['params'] = request.args
+    elif method == 'POST' and files:
+        # Let requests library handle Content-Type for multipart
+        kwargs['data'] = data
+        kwargs['files'] = files
+    elif method != 'DELETE':
+        kwargs['json'] = data
+
     try:
-        # Forward the request
-        if method == 'GET':
-            response = requests.get(
-                target_url,
-                headers=filtered_headers,
-                params=request.args,
-                timeout=30
-            )
-        elif method == 'POST':
-            if files:
-                # Let requests library handle Content-Type for multipart
-                response = requests.post(
-                    target_url,
-                    headers=filtered_headers,
-                    data=data,
-                    files=files,
-                    timeout=30
-                )
-            else:
-                response = requests.post(
-                    target_url,
-                    headers=filtered_headers,
-                    json=data,
-                    timeout=30
-                )
-        elif method == 'PUT':
-            response = requests.put(
-                target_url,
-                headers=filtered_headers,
-                json=data,
-                timeout=30
-            )
-        elif method == 'DELETE':
-            response = requests.delete(
-                target_url,
-                headers=filtered_headers,
-                timeout=30
-            )
-        elif method == 'PATCH':
-            response = requests.patch(
-                target_url,
-                headers=filtered_headers,
-                json=data,
-                timeout=30
-            )
-        else:
-            return jsonify({'error': f'Method {method} not supported'}), 405
+        # Forward the request over the service's keep-alive pool
+        response, finish = send_upstream(service, path, method, **kwargs)
+        try:
+            content = response.content
+        finally:
+            finish()
         
         # Return the response
         return Response(
-            response.content,
+            content,
             status=response.status_code,
             headers=dict(response.headers)
         )
     
+    except CircuitOpenError as e:
+        return upstream_error_response(e)
     except requests.exceptions.ConnectionError:
         return jsonify({
             'error': 'Service unavailable',
@@ -207,10 +356,271 @@ def proxy_request(service_url, path, method, headers, data=None, files=None):
         }), 500
 
 
+def upstream_error_kind(error):
+    """Metrics label for an exception raised while calling a backend"""
+    if isinstance(error, requests.exceptions.Timeout):
+        return 'timeout'
+    if isinstance(error, requests.exceptions.ConnectionError):
+        return 'connection'
+    return 'other'
+
+
+def upstream_error_response(error):
+    """Map an exception raised while calling a backend to a JSON error response"""
+    if isinstance(error, CircuitOpenError):
+        return jsonify({
+            'error': 'Service unavailable',
+            'message': f'{error.service_name} is failing; requests are paused while it recovers'
+        }), 503, {'Retry-After': str(error.retry_after)}
+    if isinstance(error, requests.exceptions.ConnectionError):
+        return jsonify({
+            'error': 'Service unavailable',
+            'message': 'Could not connect to the target service'
+        }), 503
+    if isinstance(error, requests.exceptions.Timeout):
+        return jsonify({
+            'error': 'Request timeout',
+            'message': 'The service took too long to respond'
+        }), 504
+    return jsonify({
+        'error': 'Gateway error',
+        'message': str(error)
+    }), 500
+
+
+class RequestBody:
+    """
+    File-like view of the incoming request body with a known length,
+    so requests streams it upstream with a Content-Length header
+    """
+
+    def __init__(self, stream, length):
+        self.stream = stream
+        self.length = length
+
+    def read(self, size=-1):
+        return self.stream.read(size)
+
+    def __len__(self):
+        return self.length
+
+
+def request_body():
+    """Raw body of the current request in a form requests can stream (or None)"""
+    if request.content_length:
+        return RequestBody(request.stream, request.content_length)
+    if 'chunked' in request.headers.get('Transfer-Encoding', '').lower():
+        return iter(lambda: request.stream.read(STREAM_CHUNK_SIZE), b'')
+    return None
+
+
+def stream_proxy_request(service, path, method, headers, timeout=30):
+    """
+    Forward the current request without buffering either body
+
+    The raw request body (including multipart uploads) is piped upstream
+    as-is, and the upstream response is relayed chunk by chunk with its
+    original encoding, so gateway memory stays flat regardless of size.
+
+    Args:
+        service: SERVICES entry of the target service
+        path: Request path
+        method: HTTP method
+        headers: Request headers
+        timeout: Connect/read timeout in seconds
+
+    Returns:
+        Streamed response from the target service
+    """
+    try:
+        upstream, finish = send_upstream_hedged(
+            service,
+            path,
+            method,
+            timeout=timeout,
+            params=request.args,
+            # Content-Type (with the multipart boundary) and Content-Length pass through untouched
+            headers=filter_headers(headers),
+            data=request_body()
+        )
+    except Exception as e:
+        return upstream_error_response(e)
+
+    # decode_content=False keeps Content-Encoding/Content-Length valid
+    response = Response(
+        upstream.raw.stream(STREAM_CHUNK_SIZE, decode_content=False),
+        status=upstream.status_code,
+        headers=filter_headers(upstream.headers)
+    )
+    # Runs when the WSGI server closes the response - also if the client disconnects
+    # (no direct_passthrough: werkzeug would then skip close() and leak the replica)
+    response.call_on_close(finish)
+    return response
+
+
+def fetch_buffered(service, path, method, headers, timeout=30):
+    """
+    Forward the current request and read the whole upstream response
+
+    Returns:
+        (status code, list of header pairs, body bytes)
+
+    Raises:
+        requests exceptions when the backend cannot be reached
+    """
+    return fetch_upstream(
+        service, path, method, headers, request.args, request_body(), resource_prefix(request.path), timeout
+    )
+
+
+def fetch_upstream(service, path, method, headers, params, data, route, timeout=30):
+    """
+    Send a request upstream and read the whole response
+
+    The body is kept in its upstream encoding so the returned headers
+    stay valid when it is replayed (e.g. from the response cache).
+
+    Args:
+        route: Gateway resource the request belongs to (for hedging)
+
+    Returns:
+        (status code, list of header pairs, body bytes)
+
+    Raises:
+        requests exceptions when the backend cannot be reached
+    """
+    upstream, finish = send_upstream_hedged(
+        service,
+        path,
+        method,
+        timeout=timeout,
+        route=route,
+        params=params,
+        headers=filter_headers(headers),
+        data=data
+    )
+    try:
+        body = upstream.raw.read(decode_content=False)
+    except Exception:
+        finish(failed=True)
+        raise
+    finish()
+
+    # The timing and request ID belong to this request, not to later
+    # callers served the same body from the cache
+    include_timing(upstream.headers)
+    response_headers = list(filter_headers(
+        upstream.headers,
+        exclude=('content-length', 'server-timing', REQUEST_ID_HEADER.lower())
+    ).items())
+    return upstream.status_code, response_headers, body
+
+
+def cached_proxy_request(service, path, rule, timeout=30):
+    """Serve a cacheable GET from the response cache, filling it on a miss"""
+    key = response_cache.make_key(request.path, request.query_string.decode('latin-1'), request.headers, rule)
+
+    entry = response_cache.get(key)
+    if entry is not None:
+        return Response(entry.body, status=entry.status, headers=entry.headers + [('X-Cache', 'HIT')])
+
+    def fill():
+        result = fetch_buffered(service, path, 'GET', request.headers, timeout)
+        response_cache.put(key, *result, rule)
+        return result
+
+    try:
+        # The body stays in its upstream encoding, so only callers that
+        # accept the same encodings may share it
+        status, headers, body = inflight.do(key + (request.headers.get('Accept-Encoding', ''),), fill)
+    except Exception as e:
+        return upstream_error_response(e)
+
+    return Response(body, status=status, headers=headers + [('X-Cache', 'MISS')])
+
+
 @app.before_request
 def before_request():
-    """Store request start time"""
+    """Store request start time, count the request, check its token, enforce rate limits and admit it"""
     request.start_time = time.time()
+    request.metrics_route = route_label(request.path, SERVICES)
+    metrics.inc('gateway_requests_in_flight', (('route', request.metrics_route),))
+    metrics.inc('gateway_request_bytes_total', (('route', request.metrics_route),), request.content_length or 0)
+
+    if request.method != 'OPTIONS':
+        rejection = token_rejection(request.path, request.headers.get('Authorization'))
+        if rejection:
+            metrics.inc('gateway_auth_rejections_total', (('route', request.metrics_route),))
+            return jsonify({
+                'error': 'Unauthorized',
+                'message': rejection
+            }), 401, {'WWW-Authenticate': 'Bearer error="invalid_token"'}
+
+        client = client_key(request.headers.get('Authorization'), request.remote_addr)
+        retry_after = rate_limiter.check(request.path, client)
+        if retry_after:
+            return jsonify({
+                'error': 'Too many requests',
+                'message': f'Rate limit exceeded, retry in {retry_after} seconds'
+            }), 429, {'Retry-After': str(retry_after)}
+
+        # Queued requests wait here, on their server thread, until admitted
+        route_class = admission.class_for(request.path)
+        if route_class is not None:
+            try:
+                admission.acquire(route_class)
+            except BulkheadRejected as e:
+                return bulkhead_rejected_response(e)
+            request.bulkhead = route_class
+
+
+def bulkhead_rejected_response(error):
+    """503 for a request that was not admitted"""
+    metrics.inc('gateway_bulkhead_rejections_total', (('route_class', error.route_class), ('reason', error.reason)))
+    return jsonify({
+        'error': 'Service overloaded',
+        'message': str(error)
+    }), 503, {'Retry-After': str(error.retry_after)}
+
+
+@app.after_request
+def record_metrics(response):
+    """Count the finished request (registered first so it runs after compression)"""
+    if not hasattr(request, 'metrics_route'):
+        return response
+    route = (('route', request.metrics_route),)
+    metrics.inc('gateway_requests_total', route + (('method', request.method), ('status', str(response.status_code))))
+    metrics.observe('gateway_request_duration_seconds', route, time.time() - request.start_time)
+    if response.is_streamed:
+        response.response = count_stream(response.response, route)
+    else:
+        metrics.inc('gateway_response_bytes_total', route, len(response.get_data()))
+    # Streams stay in flight (and keep their bulkhead slot) until the server closes them
+    response.call_on_close(lambda: metrics.inc('gateway_requests_in_flight', route, -1))
+    route_class = getattr(request, 'bulkhead', None)
+    if route_class is not None:
+        response.call_on_close(lambda: admission.release(route_class))
+    return response
+
+
+@app.after_request
+def compress_response(response):
+    """Compress the body when the client accepts it (streams lazily)"""
+    length = None if response.is_streamed else len(response.get_data())
+    compressor = start_compression(
+        request.method,
+        response.status_code,
+        request.headers.get('Accept-Encoding'),
+        response.headers,
+        length
+    )
+    if compressor is None:
+        return response
+    if response.is_streamed:
+        response.response = compress_stream(response.response, compressor)
+    else:
+        response.set_data(compressor.compress(response.get_data()) + compressor.finish())
+    return response
 
 
 @app.after_request
@@ -218,7 +628,7 @@ def after_request(response):
     """Log response after request completion"""
     if hasattr(request, 'start_time'):
         time_taken = (time.time() - request.start_time) * 1000  # Convert to ms
-        log_response(response.status_code, time_taken)
+        log_response(response.status_code, time_taken, request.method, request.path)
     return response
 
 
@@ -228,28 +638,57 @@ def gateway_health():
     """Gateway health check endpoint"""
     log_request(request.method, request.path)
     
-    # Check all services
-    services_status = {}
-    for service_key, service in SERVICES.items():
-        try:
-            response = requests.get(f"{service['url']}/health", timeout=2)
-            services_status[service_key] = {
-                'status': 'online' if response.status_code == 200 else 'error',
-                'url': service['url']
-            }
-        except:
-            services_status[service_key] = {
-                'status': 'offline',
-                'url': service['url']
-            }
-    
     return jsonify({
         'gateway': 'OK',
         'timestamp': datetime.now().isoformat(),
-        'services': services_status
+        'services': health_monitor.snapshot(),
+        'cache': response_cache.stats(),
+        'coalescing': inflight.stats(),
+        'rate_limit': rate_limiter.stats(),
+        'auth': auth_stats(),
+        'bulkheads': admission.stats(),
+        'hedging': hedge_stats(),
+        'timeouts': timeout_stats()
     }), 200
 
 
+# Prometheus metrics
+@app.route('/metrics', methods=['GET'])
+def gateway_metrics():
+    """Prometheus metrics endpoint"""
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+
+# Service registry admin (local callers only)
+@app.route('/admin/services', methods=['GET', 'PUT'])
+def admin_services():
+    """Show the service registry, or replace it with the JSON body (until the file next changes)"""
+    denied = admin_denied(request.remote_addr, request.headers.get('Authorization'))
+    if denied:
+        return jsonify({'error': 'Forbidden', 'message': denied}), 403
+
+    if request.method == 'PUT':
+        try:
+            registry.apply(request.get_json(silent=True), source='admin')
+        except RegistryError as e:
+            return jsonify({'error': 'Invalid service registry', 'message': str(e)}), 400
+    return jsonify(registry.status()), 200
+
+
+@app.route('/admin/services/reload', methods=['POST'])
+def admin_reload_services():
+    """Re-read the service registry file"""
+    denied = admin_denied(request.remote_addr, request.headers.get('Authorization'))
+    if denied:
+        return jsonify({'error': 'Forbidden', 'message': denied}), 403
+
+    try:
+        registry.reload_file()
+    except (OSError, ValueError) as e:
+        return jsonify({'error': 'Invalid service registry', 'message': str(e)}), 400
+    return jsonify(registry.status()), 200
+
+
 # Route: /api/main/* -> Main Flask Server (port 5000)
 @app.route('/api/main/<path:subpath>', methods=['GET', 'POST', 'PUT', 'DELETE', 'PATCH'])
 def proxy_main(subpath):
@@ -258,6 +697,25 @@ def proxy_main(subpath):
     path = f"/api/{subpath}"  # Reconstruct the original path
     
     log_request(request.method, request.path, service['name'])
+
+    if request.method == 'GET':
+        rule = response_cache.rule_for(request.path)
+        if rule:
+            return cached_proxy_request(service, path, rule)
+        return forward_main_request(service, path)
+
+    try:
+        return forward_main_request(service, path)
+    finally:
+        # Writes invalidate cached reads of the same resource
+        response_cache.purge(request.path)
+
+
+def forward_main_request(service, path):
+    """Forward the current request to the Main Flask Server"""
+    # Form-encoded bodies keep the legacy path, which re-sends them as JSON
+    if STREAM_PROXY and request.mimetype != 'application/x-www-form-urlencoded':
+        return stream_proxy_request(service, path, request.method, request.headers)
     
     # Get request data
     data = None
@@ -267,29 +725,118 @@ def proxy_main(subpath):
         # Check Content-Type for multipart/form-data
         content_type = request.content_type or ''
 
-        # Debug logging
-        print(f'[GATEWAY DEBUG] Content-Type: {content_type}')
-        print(f'[GATEWAY DEBUG] request.files: {request.files}')
-        print(f'[GATEWAY DEBUG] request.form: {request.form}')
-        print(f'[GATEWAY DEBUG] request.data length: {len(request.data)}')
-
         if 'multipart/form-data' in content_type:
             # Handle file uploads - read file data properly
             files = {}
-            for key, file in request.files.items():
-                # Read file content and reset stream
-                file_content = file.read()
-                print(f'[GATEWAY DEBUG] File {key}: {len(file_content)} bytes')
-                file.stream.seek(0)  # Reset stream for potential re-reading
-                files[key] = (file.filename, file_content, file.content_type)
-            data = request.form.to_dict() if request.form else None
-            print(f'[GATEWAY DEBUG] Files to forward: {list(files.keys())}')
+            with phase('parse'):
+                for key, file in request.files.items():
+                    # Read file content and reset stream
+                    file_content = file.read()
+                    file.stream.seek(0)  # Reset stream for potential re-reading
+                    files[key] = (file.filename, file_content, file.content_type)
+                data = request.form.to_dict() if request.form else None
+            logger.debug('Forwarding upload', extra={
+                'content_type': content_type,
+                'file_sizes': {key: len(file[1]) for key, file in files.items()}
+            })
         elif request.is_json:
             data = request.get_json()
         else:
             data = request.form.to_dict() if request.form else None
 
-    return proxy_request(service['url'], path, request.method, request.headers, data, files)
+    return proxy_request(service, path, request.method, request.headers, data, files)
+
+
+# Route: /api/ws -> multiplexed WebSocket channel (asyncio engine only)
+@app.route(CHANNEL_PATH, methods=['GET'])
+def open_channel():
+    """The threaded engine cannot hold WebSockets; point clients at the async one"""
+    log_request(request.method, request.path)
+    return jsonify({
+        'error': 'Not implemented',
+        'message': f'{CHANNEL_PATH} is served by the asyncio engine; start the gateway with GATEWAY_MODE=async'
+    }), 501
+
+
+# Route: /api/batch -> several /api/main reads in one round trip
+@app.route('/api/batch', methods=['POST'])
+def batch_requests():
+    """Run a batch of GETs against the Main Flask Server concurrently"""
+    log_request(request.method, request.path, SERVICES['main']['name'])
+
+    try:
+        items = parse_batch(request.get_json(silent=True))
+    except BatchError as e:
+        return jsonify({'error': 'Invalid batch', 'message': str(e)}), 400
+
+    # Sub-requests carry the caller's headers (Authorization included) but
+    # ask for plain bodies, which are embedded in the JSON result
+    headers = filter_headers(request.headers, exclude=('content-length', 'content-type', 'accept-encoding'))
+    client = client_key(request.headers.get('Authorization'), request.remote_addr)
+    # Each sub-request runs in a copy of the context, so it keeps the trace
+    futures = [
+        batch_executor.submit(copy_context().run, run_batch_item, item, headers, client)
+        for item in items
+    ]
+    return jsonify({'responses': [future.result() for future in futures]}), 200
+
+
+def run_batch_item(item, headers, client):
+    """Result of one /api/batch sub-request, served like a direct GET"""
+    retry_after = rate_limiter.check(item.path, client)
+    if retry_after:
+        return batch_error(
+            item, 429, 'Too many requests', f'Rate limit exceeded, retry in {retry_after} seconds',
+            {'Retry-After': str(retry_after)}
+        )
+
+    service = SERVICES['main']
+    route = resource_prefix(item.path)
+
+    def fetch():
+        return fetch_upstream(service, item.upstream_path, 'GET', headers, item.query_string, None, route)
+
+    try:
+        rule = response_cache.rule_for(item.path)
+        if not rule:
+            return batch_result(item, *fetch())
+
+        # Shares cache entries (and in-flight fills) with direct calls
+        key = response_cache.make_key(item.path, item.query_string, headers, rule)
+        entry = response_cache.get(key)
+        if entry is not None:
+            return batch_result(item, entry.status, entry.headers + [('X-Cache', 'HIT')], entry.body)
+
+        def fill():
+            result = fetch()
+            response_cache.put(key, *result, rule)
+            return result
+
+        status, response_headers, body = inflight.do(key + ('',), fill)
+        return batch_result(item, status, response_headers + [('X-Cache', 'MISS')], body)
+    except Exception as e:
+        response = app.make_response(upstream_error_response(e))
+        return batch_result(item, response.status_code, response.headers.items(), response.get_data())
+
+
+def upstream_socket(response):
+    """Socket an upstream response is being read from (None once released)"""
+    connection = getattr(response.raw, '_connection', None)
+    return getattr(connection, 'sock', None)
+
+
+def shutdown_socket(sock):
+    """
+    Cut a connection mid-stream
+
+    Shutting the socket down (rather than closing it) also wakes a read
+    or write that another thread is blocked in, and tells the peer at once.
+    """
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
 
 
 # Route: /api/ai/chat/* -> AI Chatbot Service (port 5001)
@@ -305,17 +852,18 @@ def proxy_ai_chatbot(subpath=''):
     # Handle streaming endpoint differently
     if 'stream' in subpath:
         # For streaming, we need to forward the stream response
-        target_url = f"{service['url']}{path}"
         data = request.get_json() if request.is_json else None
 
         try:
-            response = requests.post(
-                target_url,
+            response, finish = send_upstream(
+                service,
+                path,
+                'POST',
+                timeout=60,
+                adaptive=False,
                 json=data,
                 headers={k: v for k, v in request.headers.items()
-                        if k.lower() not in ['host', 'connection', 'content-length']},
-                stream=True,
-                timeout=60
+                        if k.lower() not in ['host', 'connection', 'content-length']}
             )
 
             def generate():
@@ -323,8 +871,20 @@ def proxy_ai_chatbot(subpath=''):
                     if chunk:
                         yield chunk
 
-            return Response(
-                generate(),
+            if is_event_stream(response.headers.get('content-type')):
+                # Buffered per stream, with heartbeats and slow-client handling
+                # (werkzeug's server exposes the client socket so slow clients can be cut off)
+                client = request.environ.get('werkzeug.socket')
+                body = relay_events(
+                    generate(),
+                    lambda: shutdown_socket(upstream_socket(response)),
+                    lambda: shutdown_socket(client)
+                )
+            else:
+                body = generate()
+
+            stream_response = Response(
+                body,
                 status=response.status_code,
                 content_type=response.headers.get('content-type', 'text/event-stream'),
                 headers={
@@ -334,6 +894,12 @@ def proxy_ai_chatbot(subpath=''):
                     "Access-Control-Allow-Headers": "*"
                 }
             )
+            # Hand the connection back to the pool (or drop it if the
+            # client went away mid-stream) and release the replica
+            stream_response.call_on_close(finish)
+            return stream_response
+        except CircuitOpenError as e:
+            return upstream_error_response(e)
         except Exception as e:
             return jsonify({
                 'error': 'Streaming proxy error',
@@ -341,8 +907,10 @@ def proxy_ai_chatbot(subpath=''):
             }), 500
     else:
         # Regular non-streaming request
+        if STREAM_PROXY:
+            return stream_proxy_request(service, path, request.method, request.headers)
         data = request.get_json() if request.is_json else None
-        return proxy_request(service['url'], path, request.method, request.headers, data)
+        return proxy_request(service, path, request.method, request.headers, data)
 
 
 # Route: /api/ai/assessment/* -> Stroke Assessment Service (port 5002)
@@ -355,8 +923,10 @@ def proxy_ai_assessment(subpath=''):
 
     log_request(request.method, request.path, service['name'])
 
+    if STREAM_PROXY:
+        return stream_proxy_request(service, path, request.method, request.headers)
     data = request.get_json() if request.is_json else None
-    return proxy_request(service['url'], path, request.method, request.headers, data)
+    return proxy_request(service, path, request.method, request.headers, data)
 
 
 # Route: /api/ai/image/* -> Stroke Image Analysis Service (port 5003)
@@ -369,14 +939,19 @@ def proxy_ai_image(subpath=''):
 
     log_request(request.method, request.path, service['name'])
 
-    # Handle file uploads
-    target_url = f"{service['url']}{path}"
+    if STREAM_PROXY:
+        # Multipart scans are piped through without being parsed
+        timeout = 60 if request.method == 'POST' else 30
+        return stream_proxy_request(service, path, request.method, request.headers, timeout=timeout)
 
+    # Handle file uploads
     try:
         files = None
         data = None
 
-        if request.files:
+        with phase('parse'):
+            has_files = bool(request.files)
+        if has_files:
             # Forward file uploads
             files = {key: (file.filename, file.stream, file.content_type)
                     for key, file in request.files.items()}
@@ -387,8 +962,10 @@ def proxy_ai_image(subpath=''):
         # Forward the request
         if request.method == 'POST':
             if files:
-                response = requests.post(
-                    target_url,
+                response, finish = send_upstream(
+                    service,
+                    path,
+                    'POST',
                     files=files,
                     data=data,
                     headers={k: v for k, v in request.headers.items()
@@ -396,27 +973,38 @@ def proxy_ai_image(subpath=''):
                     timeout=60
                 )
             else:
-                response = requests.post(
-                    target_url,
+                response, finish = send_upstream(
+                    service,
+                    path,
+                    'POST',
                     json=data,
                     headers={k: v for k, v in request.headers.items()
                             if k.lower() not in ['host', 'connection', 'content-length']},
                     timeout=60
                 )
         else:
-            response = requests.get(
-                target_url,
+            response, finish = send_upstream(
+                service,
+                path,
+                'GET',
                 headers={k: v for k, v in request.headers.items()
                         if k.lower() not in ['host', 'connection', 'content-length']},
                 timeout=30
             )
 
+        try:
+            content = response.content
+        finally:
+            finish()
+
         return Response(
-            response.content,
+            content,
             status=response.status_code,
             headers=dict(response.headers)
         )
 
+    except CircuitOpenError as e:
+        return upstream_error_response(e)
     except Exception as e:
         return jsonify({
             'error': 'Image analysis proxy error',
@@ -434,6 +1022,7 @@ def not_found(error):
         'message': f'Gateway does not have a route for {request.path}',
         'available_routes': [
             '/api/main/*',
+            '/api/batch',
             '/api/ai/chat',
             '/api/ai/assessment'
         ]
@@ -465,45 +1054,12 @@ def handle_exception(e):
 
 
 if __name__ == '__main__':
-    import socket
-
     # Gateway configuration
     GATEWAY_PORT = int(os.environ.get('GATEWAY_PORT', 8080))
 
-    # Get local IP address for LAN access
-    local_ip = 'localhost'
-    try:
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.connect(("8.8.8.8", 80))
-        local_ip = s.getsockname()[0]
-        s.close()
-    except:
-        pass
-
-    # Print startup banner
-    print(f"\n{Colors.BOLD}{Colors.HEADER}{'=' * 60}{Colors.ENDC}")
-    print(f"{Colors.BOLD}{Colors.OKGREEN}🚀 NeuroAid API Gateway Started{Colors.ENDC}")
-    print(f"{Colors.BOLD}{Colors.HEADER}{'=' * 60}{Colors.ENDC}\n")
-
-    print(f"{Colors.BOLD}{Colors.WARNING}📱 LAN Access URLs (use on mobile devices):{Colors.ENDC}")
-    print(f"{Colors.OKCYAN}   Gateway:{Colors.ENDC} {Colors.BOLD}http://{local_ip}:{GATEWAY_PORT}{Colors.ENDC}")
-    print(f"{Colors.OKCYAN}   Health:{Colors.ENDC}  {Colors.BOLD}http://{local_ip}:{GATEWAY_PORT}/health{Colors.ENDC}\n")
-
-    print(f"{Colors.BOLD}{Colors.OKBLUE}💻 Localhost URLs (for this computer):{Colors.ENDC}")
-    print(f"{Colors.OKCYAN}   Gateway:{Colors.ENDC} {Colors.BOLD}http://localhost:{GATEWAY_PORT}{Colors.ENDC}")
-    print(f"{Colors.OKCYAN}   Health:{Colors.ENDC}  {Colors.BOLD}http://localhost:{GATEWAY_PORT}/health{Colors.ENDC}\n")
-
-    print(f"{Colors.BOLD}{Colors.OKBLUE}Service Routes:{Colors.ENDC}")
-    print(f"{Colors.OKGREEN}  ✓{Colors.ENDC} /api/main/*        → Main Flask Server (port 5000)")
-    print(f"{Colors.OKGREEN}  ✓{Colors.ENDC} /api/ai/chat       → AI Chatbot Service (port 5001)")
-    print(f"{Colors.OKGREEN}  ✓{Colors.ENDC} /api/ai/assessment → Stroke Assessment Service (port 5002)")
-    print(f"{Colors.OKGREEN}  ✓{Colors.ENDC} /api/ai/image      → Stroke Image Analysis Service (port 5003)\n")
-
-    print(f"{Colors.BOLD}{Colors.WARNING}🔧 Configuration for Flutter App:{Colors.ENDC}")
-    print(f"{Colors.OKCYAN}   Update api_constants.dart:{Colors.ENDC}")
-    print(f"{Colors.BOLD}   static const String _networkIp = '{local_ip}';{Colors.ENDC}\n")
-
-    print(f"{Colors.BOLD}{Colors.HEADER}{'=' * 60}{Colors.ENDC}\n")
+    print_banner(GATEWAY_PORT, 'sync')
 
     # Start the gateway
+    start_registry()
+    health_monitor.start()
     app.run(host='0.0.0.0', port=GATEWAY_PORT, debug=False)
@@ -0,0 +1,1271 @@
+"""
+NeuroAid API Gateway (asyncio engine)
+=====================================
+Async counterpart of gateway.py built on aiohttp.
+Serves the same SERVICES routing table and routes, but every in-flight
+upstream call is a coroutine instead of a pinned worker thread, so
+thousands of slow AI requests and SSE streams can be held open on a
+single process.
+
+Run directly (python gateway_async.py) or via GATEWAY_MODE=async python gateway.py
+"""
+
+import sys
+import os
+
+# Fix Windows encoding issues - MUST BE FIRST
+if sys.platform == 'win32':
+    import codecs
+    # Force UTF-8 for stdout and stderr
+    if sys.stdout.encoding != 'utf-8':
+        sys.stdout = codecs.getwriter('utf-8')(sys.stdout.buffer, 'strict')
+    if sys.stderr.encoding != 'utf-8':
+        sys.stderr = codecs.getwriter('utf-8')(sys.stderr.buffer, 'strict')
+    os.environ['PYTHONIOENCODING'] = 'utf-8'
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+
+import aiohttp
+from aiohttp import web
+from multidict import CIMultiDict
+
+from gateway_utils.auth import auth_stats, identity_headers, token_rejection
+from gateway_utils.balancer import get_balancer
+from gateway_utils.batch import BatchError, batch_error, batch_result, parse_batch
+from gateway_utils.breaker import CircuitOpenError, get_breaker
+from gateway_utils.bulkhead import AdmissionController, BulkheadRejected
+from gateway_utils.channel import (
+    CHANNEL_HEARTBEAT, CHANNEL_MAX_CALLS, CHANNEL_MAX_MESSAGE, CHANNEL_PATH, ChannelClosed, ChannelError, channel_error,
+    channel_response, parse_message
+)
+from gateway_utils.cache import ResponseCache, resource_prefix
+from gateway_utils.coalesce import AsyncSingleFlight
+from gateway_utils.compress import start_compression
+from gateway_utils.health import HealthMonitor
+from gateway_utils.hedge import get_hedge_policy, hedge_stats, hedging_enabled
+from gateway_utils.http import STREAM_PROXY, STREAM_CHUNK_SIZE, filter_headers
+from gateway_utils.logs import log_request, log_response, print_banner
+from gateway_utils.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, metrics, route_label
+from gateway_utils.pool import DEFAULT_POOL_SIZE, DEFAULT_IDLE_TIMEOUT, DRAIN_POLL_INTERVAL, DRAIN_TIMEOUT, retire_pool
+from gateway_utils.ratelimit import RateLimiter, client_key
+from gateway_utils.registry import RegistryError, ServiceRegistry, admin_denied
+from gateway_utils.services import SERVICES
+from gateway_utils.sse import (
+    CLIENT_GONE, COMPLETE, HEARTBEAT, SLOW_CLIENT, SSE_BUFFER_EVENTS, SSE_HEARTBEAT_INTERVAL,
+    SSE_SLOW_CLIENT_POLICY, SSE_SLOW_CLIENT_TIMEOUT, UPSTREAM_ERROR, EventSplitter, is_event_stream, record_stream
+)
+from gateway_utils.timeouts import get_timeout_policy, timeout_stats, upstream_route
+from service_utils.identity import IDENTITY_HEADER
+from service_utils.logs import setup_logging
+from service_utils.tracing import DEADLINE_HEADER, REQUEST_ID_HEADER, current_trace, end_trace, finish_trace, include_timing, start_trace, trace_headers
+
+logger = logging.getLogger('gateway')
+
+# Largest request body accepted from clients (scan uploads)
+MAX_BODY_SIZE = int(os.environ.get('MAX_FILE_SIZE', 10 * 1024 * 1024)) + 64 * 1024
+
+PROXY_METHODS = ['GET', 'POST', 'PUT', 'DELETE', 'PATCH']
+
+# CORS settings - mirrors the Flask-CORS configuration in gateway.py
+CORS_ALLOW_METHODS = 'GET, POST, PUT, DELETE, PATCH, OPTIONS'
+CORS_ALLOW_HEADERS = 'Content-Type, Authorization, Accept, X-Request-Timeout-Ms'
+CORS_EXPOSE_HEADERS = 'Content-Type, Authorization, X-Request-ID, Server-Timing'
+CORS_MAX_AGE = '3600'
+
+# Buffered bodies larger than this are compressed off the event loop
+COMPRESS_OFFLOAD_SIZE = 256 * 1024
+
+
+def error_response(status, error, message):
+    """JSON error body in the same shape as the Flask gateway"""
+    return web.json_response({'error': error, 'message': message}, status=status)
+
+
+def upstream_error_response(error):
+    """Map an exception raised while calling a backend to a JSON error response"""
+    if isinstance(error, CircuitOpenError):
+        response = error_response(
+            503, 'Service unavailable',
+            f'{error.service_name} is failing; requests are paused while it recovers'
+        )
+        response.headers['Retry-After'] = str(error.retry_after)
+        return response
+    if isinstance(error, asyncio.TimeoutError):
+        return error_response(504, 'Request timeout', 'The service took too long to respond')
+    if isinstance(error, aiohttp.ClientConnectionError):
+        return error_response(503, 'Service unavailable', 'Could not connect to the target service')
+    return error_response(500, 'Gateway error', str(error))
+
+
+# Cached, concurrently refreshed backend health for /health
+health_monitor = HealthMonitor(SERVICES)
+
+# Response cache for read-mostly GET endpoints
+response_cache = ResponseCache()
+
+# Identical concurrent cache misses share one upstream request
+inflight = AsyncSingleFlight()
+
+# Per-client token buckets for each route prefix
+rate_limiter = RateLimiter()
+
+# Per-route-class concurrency limits with priority queueing
+admission = AdmissionController()
+
+# Upstream client sessions - one keep-alive connector per backend URL
+_sessions = {}
+
+
+def get_client_session(service, url=None):
+    """Get (or lazily create) the aiohttp session for a service backend"""
+    url = url or service['url']
+    session = _sessions.get(url)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=service.get('pool_size', DEFAULT_POOL_SIZE),
+            keepalive_timeout=service.get('pool_idle_timeout', DEFAULT_IDLE_TIMEOUT)
+        )
+        # auto_decompress=False passes upstream bytes through untouched, so
+        # only the client's own Accept-Encoding may be forwarded
+        session = aiohttp.ClientSession(
+            connector=connector,
+            auto_decompress=False,
+            skip_auto_headers=('Accept-Encoding',)
+        )
+        _sessions[url] = session
+    return session
+
+
+# Sessions of retired backends, closed once their requests are done
+_draining = set()
+
+
+async def drain_client_session(session, replicas, timeout=DRAIN_TIMEOUT):
+    """Close a retired session when its replicas have nothing in flight (or after timeout)"""
+    deadline = time.monotonic() + timeout
+    try:
+        while any(replica.outstanding for replica in replicas) and time.monotonic() < deadline:
+            await asyncio.sleep(DRAIN_POLL_INTERVAL)
+    finally:
+        _draining.discard(session)
+        await session.close()
+
+
+def retire_client_session(url, replicas=()):
+    """Stop handing out a backend's session and close it once drained"""
+    # The health monitor probes through the requests pools, retire that one too
+    retire_pool(url)
+    session = _sessions.pop(url, None)
+    if session is None:
+        return
+    _draining.add(session)
+    asyncio.ensure_future(drain_client_session(session, replicas))
+
+
+async def close_client_sessions(app):
+    """Close all upstream sessions on shutdown"""
+    for session in list(_sessions.values()) + list(_draining):
+        await session.close()
+    _sessions.clear()
+    _draining.clear()
+
+
+# SERVICES follows the registry file without a restart (polled by watch_registry)
+registry = ServiceRegistry(SERVICES, retire_client_session)
+
+
+def upstream_error_kind(error):
+    """Metrics label for an exception raised while calling a backend"""
+    if isinstance(error, asyncio.TimeoutError):
+        return 'timeout'
+    if isinstance(error, aiohttp.ClientConnectionError):
+        return 'connection'
+    return 'other'
+
+
+def cap_timeout(timeout, seconds):
+    """Copy of an aiohttp.ClientTimeout with every deadline it sets cut to seconds"""
+    def cap(value):
+        return None if value is None else min(value, seconds)
+    return aiohttp.ClientTimeout(
+        total=cap(timeout.total),
+        connect=cap(timeout.connect),
+        sock_connect=cap(timeout.sock_connect),
+        sock_read=cap(timeout.sock_read)
+    )
+
+
+async def send_upstream(service, path, method, timeout, tried=None, adaptive=True, **kwargs):
+    """
+    Send a request to the least-loaded healthy replica of a service
+
+    Args:
+        service: SERVICES entry of the target service
+        path: Upstream request path
+        method: HTTP method
+        timeout: aiohttp.ClientTimeout for the call - the most it may
+            wait; shortened to the route's adaptive timeout and the
+            client's remaining budget
+        tried: Optional list of replica URLs to avoid; the chosen one is appended
+        adaptive: False for streams, whose reads may idle longer than any
+            response time seen so far
+        **kwargs: Passed through to aiohttp (headers, params, data)
+
+    Returns:
+        (response, finish) - the upstream response and a callback that
+        releases it and the replica; finish may be called more than once
+        but must be called at least once
+
+    Raises:
+        CircuitOpenError when the service's circuit breaker is open
+        aiohttp/asyncio exceptions when the backend cannot be reached or
+        the client's deadline has already passed
+    """
+    upstream = (('upstream', service['key']),)
+    trace = current_trace()
+    policy = get_timeout_policy(service)
+    route = upstream_route(method, path)
+    ceiling = timeout.total or timeout.sock_read
+    limit = policy.timeout(route, ceiling) if adaptive and ceiling else ceiling
+    remaining = trace.remaining() if trace is not None else None
+    if remaining is not None and remaining <= 0:
+        metrics.inc('gateway_upstream_errors_total', upstream + (('kind', 'deadline'),))
+        raise asyncio.TimeoutError('The request deadline has passed')
+    call_timeout = limit if remaining is None else min(limit or remaining, remaining)
+    if call_timeout:
+        timeout = cap_timeout(timeout, call_timeout)
+
+    breaker = get_breaker(service)
+    try:
+        breaker.allow()
+    except CircuitOpenError:
+        metrics.inc('gateway_upstream_errors_total', upstream + (('kind', 'circuit_open'),))
+        raise
+    # Carry the request ID, the time the gateway will wait and the verified
+    # caller identity to the backend, replacing any the client sent
+    headers = {
+        key: value for key, value in (kwargs.get('headers') or {}).items()
+        if key.lower() not in ('x-request-id', DEADLINE_HEADER.lower(), IDENTITY_HEADER.lower())
+    }
+    authorization = next((value for key, value in headers.items() if key.lower() == 'authorization'), None)
+    kwargs['headers'] = {**headers, **trace_headers(), **identity_headers(authorization)}
+    if call_timeout:
+        kwargs['headers'][DEADLINE_HEADER] = str(max(int(call_timeout * 1000), 1))
+    if tried is None:
+        lease = get_balancer(service).acquire()
+    else:
+        lease = get_balancer(service).acquire(exclude=tried)
+        tried.append(lease.url)
+    start = time.monotonic()
+    try:
+        response = await get_client_session(service, lease.url).request(
+            method,
+            f"{lease.url}{path}",
+            timeout=timeout,
+            **kwargs
+        )
+    except asyncio.CancelledError:
+        # The client went away - not the backend's fault, just free the slots
+        lease.release(ok=True)
+        breaker.cancel()
+        raise
+    except Exception as e:
+        # Connection errors and timeouts count against the replica and the service
+        lease.release(ok=False)
+        breaker.record(False, time.monotonic() - start)
+        metrics.inc('gateway_upstream_errors_total', upstream + (('kind', upstream_error_kind(e)),))
+        if trace is not None:
+            trace.add('upstream', time.monotonic() - start)
+        if adaptive and limit and isinstance(e, asyncio.TimeoutError) and call_timeout == limit:
+            # Only the route's own timeout says anything about its latency
+            policy.timed_out(route, limit)
+        raise
+
+    # Time to response headers - streamed bodies may legitimately run long
+    latency = time.monotonic() - start
+    if trace is not None:
+        trace.add('upstream', latency)
+    if adaptive:
+        policy.record(route, latency)
+    ok = response.status < 500
+    metrics.observe('gateway_upstream_duration_seconds', upstream, latency)
+    metrics.inc('gateway_upstream_requests_total', upstream + (('status', str(response.status)),))
+    recorded = False
+
+    def finish(failed=False):
+        nonlocal recorded
+        response.release()
+        lease.release(ok and not failed)
+        if not recorded:
+            recorded = True
+            breaker.record(ok and not failed, latency)
+
+    return response, finish
+
+
+async def send_upstream_hedged(route, service, path, method, timeout, **kwargs):
+    """
+    send_upstream for idempotent reads that may be hedged
+
+    When the first replica has not answered within the route's p95 and
+    the hedge budget allows, the same request goes to a second replica;
+    the first response is used and the other request is cancelled.
+    Requests that can't be hedged go straight to send_upstream. route is
+    the gateway resource the latency is tracked under.
+    """
+    if not hedging_enabled(service, method, kwargs.get('data')):
+        return await send_upstream(service, path, method, timeout, **kwargs)
+
+    policy = get_hedge_policy(service)
+    delay = policy.delay(route)
+    tried = []
+
+    async def attempt():
+        start = time.monotonic()
+        result = await send_upstream(service, path, method, timeout, tried=tried, **kwargs)
+        policy.record(route, time.monotonic() - start)
+        return result
+
+    if delay is None:
+        # Not enough samples yet to know what slow means for this route
+        return await attempt()
+
+    primary = asyncio.ensure_future(attempt())
+    try:
+        done, _ = await asyncio.wait([primary], timeout=delay)
+    except asyncio.CancelledError:
+        # asyncio.wait leaves the attempt running - it must not outlive the request
+        release_hedge_loser(primary)
+        raise
+    if done or not get_balancer(service).has_alternative(tried) or not policy.spend():
+        return await primary
+    hedge = asyncio.ensure_future(attempt())
+
+    winner = None
+    try:
+        pending = {primary, hedge}
+        while pending and winner is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            # Prefer the original request when both answered at once
+            winner = next((task for task in (primary, hedge) if task in done and task.exception() is None), None)
+    finally:
+        for task in (primary, hedge):
+            if task is not winner:
+                release_hedge_loser(task)
+
+    if winner is None:
+        # Both failed - report the original request's error
+        return primary.result()
+    if winner is hedge:
+        policy.won()
+    metrics.inc('gateway_upstream_hedges_total', (
+        ('upstream', service['key']),
+        ('winner', 'hedge' if winner is hedge else 'primary')
+    ))
+    return winner.result()
+
+
+def release_hedge_loser(task):
+    """Cancel a hedged attempt that lost the race, or release its response"""
+    if not task.done():
+        # send_upstream frees the replica and breaker slot on cancellation
+        task.cancel()
+    elif not task.cancelled() and task.exception() is None:
+        _, finish = task.result()
+        finish()
+
+
+async def proxy_request(request, service, path, timeout=30):
+    """
+    Forward request to the target service
+
+    Args:
+        request: Incoming aiohttp request
+        service: SERVICES entry of the target service
+        path: Upstream request path
+        timeout: Upstream timeout in seconds
+
+    Returns:
+        aiohttp Response mirroring the upstream response
+    """
+    if STREAM_PROXY:
+        return await stream_proxy_request(request, service, path, timeout)
+
+    try:
+        status, headers, body = await fetch_buffered(request, service, path, timeout)
+    except Exception as e:
+        return upstream_error_response(e)
+    return web.Response(body=body, status=status, headers=headers)
+
+
+async def relay_response(request, upstream, response):
+    """
+    Copy the upstream body into an already configured StreamResponse
+
+    Stops quietly when the client disconnects or the upstream breaks
+    mid-body, since the status line has already been sent by then.
+    """
+    compressor = start_compression(
+        request.method,
+        response.status,
+        request.headers.get('Accept-Encoding'),
+        response.headers
+    )
+    route = (('route', route_label(request.path, SERVICES)),)
+    await response.prepare(request)
+    try:
+        async for chunk in upstream.content.iter_chunked(STREAM_CHUNK_SIZE):
+            if compressor is not None:
+                chunk = compressor.compress(chunk)
+                if not chunk:
+                    continue
+            await response.write(chunk)
+            metrics.inc('gateway_response_bytes_total', route, len(chunk))
+    except (ConnectionResetError, aiohttp.ClientError, asyncio.TimeoutError):
+        return response
+    if compressor is not None:
+        chunk = compressor.finish()
+        await response.write(chunk)
+        metrics.inc('gateway_response_bytes_total', route, len(chunk))
+    await response.write_eof()
+    return response
+
+
+async def stream_proxy_request(request, service, path, timeout=30):
+    """
+    Forward request without buffering either body
+
+    The raw request body (including multipart uploads) is piped upstream
+    as-is and the upstream response is relayed chunk by chunk with its
+    original encoding, keeping memory flat regardless of payload size.
+    """
+    try:
+        upstream, finish = await send_upstream_hedged(
+            resource_prefix(request.path),
+            service,
+            path,
+            request.method,
+            # Deadlines apply to connecting and to each read, not the whole transfer
+            aiohttp.ClientTimeout(total=None, sock_connect=timeout, sock_read=timeout),
+            params=request.query,
+            # Content-Length is kept so the upstream sees a plain, non-chunked body
+            headers=filter_headers(request.headers),
+            data=request.content if request.body_exists else None
+        )
+    except Exception as e:
+        return upstream_error_response(e)
+
+    try:
+        response = web.StreamResponse(
+            status=upstream.status,
+            headers=filter_headers(upstream.headers)
+        )
+        return await relay_response(request, upstream, response)
+    finally:
+        finish()
+
+
+async def fetch_buffered(request, service, path, timeout=30):
+    """
+    Forward request and read the whole upstream response
+
+    Returns:
+        (status code, list of header pairs, body bytes) - body in its upstream encoding
+
+    Raises:
+        aiohttp/asyncio exceptions when the backend cannot be reached
+    """
+    body = await request.read() if request.body_exists else None
+    return await fetch_upstream(
+        service, path, request.method, request.headers, request.query, body, resource_prefix(request.path), timeout
+    )
+
+
+async def fetch_upstream(service, path, method, headers, params, data, route, timeout=30):
+    """
+    Send a request upstream and read the whole response
+
+    Args:
+        route: Gateway resource the request belongs to (for hedging)
+
+    Returns:
+        (status code, list of header pairs, body bytes) - body in its upstream encoding
+
+    Raises:
+        aiohttp/asyncio exceptions when the backend cannot be reached
+    """
+    upstream, finish = await send_upstream_hedged(
+        route,
+        service,
+        path,
+        method,
+        aiohttp.ClientTimeout(total=timeout),
+        params=params,
+        headers=filter_headers(headers, exclude=('content-length',)),
+        data=data
+    )
+    try:
+        payload = await upstream.read()
+    except Exception:
+        finish(failed=True)
+        raise
+    finish()
+
+    # The timing and request ID belong to this request, not to later
+    # callers served the same body from the cache
+    include_timing(upstream.headers)
+    headers = list(filter_headers(
+        upstream.headers,
+        exclude=('content-length', 'server-timing', REQUEST_ID_HEADER.lower())
+    ).items())
+    return upstream.status, headers, payload
+
+
+async def cached_proxy_request(request, service, path, rule, timeout=30):
+    """Serve a cacheable GET from the response cache, filling it on a miss"""
+    key = response_cache.make_key(request.path, request.query_string, request.headers, rule)
+
+    entry = response_cache.get(key)
+    if entry is not None:
+        return web.Response(body=entry.body, status=entry.status, headers=entry.headers + [('X-Cache', 'HIT')])
+
+    async def fill():
+        result = await fetch_buffered(request, service, path, timeout)
+        response_cache.put(key, *result, rule)
+        return result
+
+    try:
+        # The body stays in its upstream encoding, so only callers that
+        # accept the same encodings may share it
+        status, headers, body = await inflight.do(key + (request.headers.get('Accept-Encoding', ''),), fill)
+    except Exception as e:
+        return upstream_error_response(e)
+
+    return web.Response(body=body, status=status, headers=headers + [('X-Cache', 'MISS')])
+
+
+async def proxy_stream(request, service, path, timeout=60):
+    """Relay an upstream SSE stream chunk by chunk"""
+    body = await request.read() if request.body_exists else None
+
+    try:
+        upstream, finish = await send_upstream(
+            service,
+            path,
+            'POST',
+            # No total limit for streams - only connect and per-read deadlines
+            aiohttp.ClientTimeout(total=None, sock_connect=timeout, sock_read=timeout),
+            adaptive=False,
+            headers=filter_headers(request.headers, exclude=('content-length',)),
+            data=body
+        )
+    except CircuitOpenError as e:
+        return upstream_error_response(e)
+    except Exception as e:
+        return error_response(500, 'Streaming proxy error', str(e))
+
+    try:
+        response = web.StreamResponse(
+            status=upstream.status,
+            headers={
+                'Content-Type': upstream.headers.get('content-type', 'text/event-stream'),
+                'Cache-Control': 'no-cache',
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Headers': '*'
+            }
+        )
+        if is_event_stream(upstream.headers.get('content-type')):
+            return await relay_events(request, upstream, response)
+        return await relay_response(request, upstream, response)
+    finally:
+        finish()
+
+
+async def relay_events(request, upstream, response):
+    """
+    Relay an upstream SSE body event by event through a bounded buffer
+
+    A reader task fills the buffer while the client is written to, so
+    heartbeats go out while the upstream is quiet and a slow client is
+    noticed (and closed or dropped events, see gateway_utils.sse).
+    The upstream is aborted as soon as the stream ends early.
+    """
+    compressor = start_compression(
+        request.method,
+        response.status,
+        request.headers.get('Accept-Encoding'),
+        response.headers
+    )
+    route = (('route', route_label(request.path, SERVICES)),)
+    events = asyncio.Queue(maxsize=SSE_BUFFER_EVENTS)
+    state = {'outcome': None, 'dropped': 0}
+    end = object()
+
+    async def offer(item):
+        try:
+            await asyncio.wait_for(events.put(item), SSE_SLOW_CLIENT_TIMEOUT)
+        except asyncio.TimeoutError:
+            if item is not end and SSE_SLOW_CLIENT_POLICY == 'drop':
+                state['dropped'] += 1
+                return True
+            state['outcome'] = SLOW_CLIENT
+            # The writer may be stuck on a client that stopped reading
+            upstream.close()
+            if request.transport is not None:
+                request.transport.abort()
+            return False
+        return True
+
+    async def read():
+        splitter = EventSplitter()
+        try:
+            async for chunk in upstream.content.iter_any():
+                for event in splitter.feed(chunk):
+                    if not await offer(event):
+                        return
+            tail = splitter.flush()
+            if tail and not await offer(tail):
+                return
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            state['outcome'] = UPSTREAM_ERROR
+        await offer(end)
+
+    async def write(chunk):
+        if compressor is not None:
+            chunk = compressor.compress(chunk)
+        await send(chunk)
+
+    async def send(chunk):
+        if chunk:
+            await response.write(chunk)
+            metrics.inc('gateway_response_bytes_total', route, len(chunk))
+
+    await response.prepare(request)
+    reader = asyncio.ensure_future(read())
+    try:
+        while state['outcome'] != SLOW_CLIENT:
+            try:
+                item = await asyncio.wait_for(events.get(), SSE_HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                await write(HEARTBEAT)
+                continue
+            if item is end:
+                state['outcome'] = state['outcome'] or COMPLETE
+                break
+            await write(item)
+        if state['outcome'] != SLOW_CLIENT:
+            if compressor is not None:
+                await send(compressor.finish())
+            await response.write_eof()
+    except (ConnectionError, aiohttp.ClientError):
+        state['outcome'] = state['outcome'] or CLIENT_GONE
+    finally:
+        reader.cancel()
+        if state['outcome'] != COMPLETE:
+            # Stop the chatbot generating for a client that is no longer there
+            upstream.close()
+        record_stream(state['outcome'] or CLIENT_GONE, state['dropped'])
+    return response
+
+
+# Gateway health check
+async def gateway_health(request):
+    """Gateway health check endpoint"""
+    log_request(request.method, request.path)
+
+    if health_monitor.ready:
+        services = health_monitor.snapshot()
+    else:
+        # Only the very first calls wait (off the event loop) for the probes
+        services = await asyncio.get_running_loop().run_in_executor(None, health_monitor.snapshot)
+
+    return web.json_response({
+        'gateway': 'OK',
+        'timestamp': datetime.now().isoformat(),
+        'services': services,
+        'cache': response_cache.stats(),
+        'coalescing': inflight.stats(),
+        'rate_limit': rate_limiter.stats(),
+        'auth': auth_stats(),
+        'bulkheads': admission.stats(),
+        'hedging': hedge_stats(),
+        'timeouts': timeout_stats()
+    })
+
+
+# Route: /api/main/* -> Main Flask Server (port 5000)
+async def proxy_main(request):
+    """Proxy requests to Main Flask Server"""
+    service = SERVICES['main']
+    path = f"/api/{request.match_info['subpath']}"  # Reconstruct the original path
+
+    log_request(request.method, request.path, service['name'])
+
+    if request.method == 'GET':
+        rule = response_cache.rule_for(request.path)
+        if rule:
+            return await cached_proxy_request(request, service, path, rule)
+        return await proxy_request(request, service, path)
+
+    try:
+        return await proxy_request(request, service, path)
+    finally:
+        # Writes invalidate cached reads of the same resource
+        response_cache.purge(request.path)
+
+
+# Route: /api/batch -> several /api/main reads in one round trip
+async def batch_requests(request):
+    """Run a batch of GETs against the Main Flask Server concurrently"""
+    log_request(request.method, request.path, SERVICES['main']['name'])
+
+    try:
+        items = parse_batch(await request.json())
+    except ValueError as e:
+        # Invalid JSON (json.JSONDecodeError) or a BatchError
+        message = str(e) if isinstance(e, BatchError) else 'The body is not valid JSON'
+        return error_response(400, 'Invalid batch', message)
+
+    # Sub-requests carry the caller's headers (Authorization included) but
+    # ask for plain bodies, which are embedded in the JSON result
+    headers = filter_headers(request.headers, exclude=('content-length', 'content-type', 'accept-encoding'))
+    client = client_key(request.headers.get('Authorization'), request.remote)
+    results = await asyncio.gather(*(run_batch_item(item, headers, client) for item in items))
+    return web.json_response({'responses': results})
+
+
+async def run_batch_item(item, headers, client):
+    """Result of one /api/batch sub-request, served like a direct GET"""
+    retry_after = rate_limiter.check(item.path, client)
+    if retry_after:
+        return batch_error(
+            item, 429, 'Too many requests', f'Rate limit exceeded, retry in {retry_after} seconds',
+            {'Retry-After': str(retry_after)}
+        )
+
+    try:
+        return batch_result(item, *await fetch_main_read(item.path, item.upstream_path, item.query_string, headers))
+    except Exception as e:
+        response = upstream_error_response(e)
+        return batch_result(item, response.status, response.headers.items(), response.body)
+
+
+async def fetch_main_read(path, upstream_path, query_string, headers):
+    """
+    GET from the Main Flask Server through the response cache, for callers
+    that embed the body in JSON (headers must not ask for compression)
+
+    Shares cache entries (and in-flight fills) with direct calls.
+
+    Returns:
+        (status code, list of header pairs, body bytes)
+    """
+    service = SERVICES['main']
+    route = resource_prefix(path)
+
+    async def fetch():
+        return await fetch_upstream(service, upstream_path, 'GET', headers, query_string, None, route)
+
+    rule = response_cache.rule_for(path)
+    if not rule:
+        return await fetch()
+
+    key = response_cache.make_key(path, query_string, headers, rule)
+    entry = response_cache.get(key)
+    if entry is not None:
+        return entry.status, entry.headers + [('X-Cache', 'HIT')], entry.body
+
+    async def fill():
+        result = await fetch()
+        response_cache.put(key, *result, rule)
+        return result
+
+    status, response_headers, body = await inflight.do(key + ('',), fill)
+    return status, response_headers + [('X-Cache', 'MISS')], body
+
+
+# Route: /api/ws -> API calls and chat streams multiplexed over one WebSocket
+async def open_channel(request):
+    """Serve channel calls until the client disconnects (see gateway_utils.channel)"""
+    log_request(request.method, request.path)
+
+    ws = web.WebSocketResponse(heartbeat=CHANNEL_HEARTBEAT, max_msg_size=CHANNEL_MAX_MESSAGE)
+    if not ws.can_prepare(request).ok:
+        return error_response(426, 'Upgrade required', f'{CHANNEL_PATH} only accepts WebSocket connections')
+    await ws.prepare(request)
+    metrics.inc('gateway_ws_connections', ())
+
+    # Handshake headers apply to every call, except the ones that identify
+    # a single request. Bodies are embedded in JSON frames, so ask for them plain.
+    headers = {
+        key: value for key, value in filter_headers(
+            request.headers,
+            exclude=('content-length', 'content-type', 'accept-encoding', 'origin',
+                     REQUEST_ID_HEADER.lower(), DEADLINE_HEADER.lower())
+        ).items()
+        if not key.lower().startswith('sec-websocket-')
+    }
+    calls = {}
+    send_lock = asyncio.Lock()
+
+    async def send(frame):
+        # Frames of concurrent calls must not interleave
+        async with send_lock:
+            try:
+                await ws.send_json(frame)
+            except (ConnectionError, aiohttp.ClientError) as e:
+                raise ChannelClosed() from e
+
+    try:
+        async for message in ws:
+            if message.type == aiohttp.WSMsgType.ERROR:
+                break
+            try:
+                if message.type != aiohttp.WSMsgType.TEXT:
+                    raise ChannelError('Messages must be JSON text frames')
+                kind, call = parse_message(message.data)
+            except ChannelError as e:
+                await send(channel_error(e.call_id, 400, 'Invalid message', str(e)))
+                continue
+
+            if kind == 'cancel':
+                task = calls.get(call)
+                if task is not None:
+                    task.cancel()
+            elif call.id in calls:
+                await send(channel_error(call.id, 409, 'Duplicate call id', f'Call {call.id!r} is still in flight'))
+            elif len(calls) >= CHANNEL_MAX_CALLS:
+                await send(channel_error(
+                    call.id, 429, 'Too many requests', f'At most {CHANNEL_MAX_CALLS} calls may be in flight per channel'
+                ))
+            else:
+                task = asyncio.ensure_future(run_channel_call(call, headers, request.remote, send))
+                calls[call.id] = task
+                task.add_done_callback(lambda _, call_id=call.id: calls.pop(call_id, None))
+    except ChannelClosed:
+        pass
+    finally:
+        # Calls of a client that went away abort their upstream requests
+        pending = list(calls.values())
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        metrics.inc('gateway_ws_connections', (), -1)
+    return ws
+
+
+async def run_channel_call(call, base_headers, remote, send):
+    """Handle one channel call like the matching HTTP request and send its answer"""
+    headers = CIMultiDict(base_headers)
+    for key, value in call.headers.items():
+        headers[key] = value
+    authorization = headers.get('Authorization')
+    route = (('route', route_label(call.path, SERVICES)),)
+    start_time = time.time()
+    status = 'cancelled'
+    trace, token = start_trace('gateway', headers.pop(REQUEST_ID_HEADER, None), headers.pop(DEADLINE_HEADER, None))
+    try:
+        rejection = token_rejection(call.path, authorization)
+        retry_after = 0 if rejection else rate_limiter.check(call.path, client_key(authorization, remote))
+        if rejection:
+            metrics.inc('gateway_auth_rejections_total', route)
+            frame = channel_error(
+                call.id, 401, 'Unauthorized', rejection, {'WWW-Authenticate': 'Bearer error="invalid_token"'}
+            )
+        elif retry_after:
+            frame = channel_error(
+                call.id, 429, 'Too many requests', f'Rate limit exceeded, retry in {retry_after} seconds',
+                {'Retry-After': str(retry_after)}
+            )
+        else:
+            frame = await admit_channel_call(call, headers, send)
+        status = frame['status']
+        finish_trace(trace, frame['headers'], call.method, call.path, status)
+        await send(frame)
+    except ChannelClosed:
+        status = 'client_gone'
+    finally:
+        end_trace(token)
+        metrics.inc('gateway_ws_calls_total', route + (('method', call.method), ('status', str(status))))
+        metrics.observe('gateway_ws_call_duration_seconds', route, time.time() - start_time)
+        log_response(status if isinstance(status, int) else 499, (time.time() - start_time) * 1000,
+                     call.method, call.path)
+
+
+async def admit_channel_call(call, headers, send):
+    """Run a channel call once its route class admits it; returns the answer frame"""
+    route_class = admission.class_for(call.path)
+    if route_class is not None:
+        try:
+            await admission.acquire_async(route_class)
+        except BulkheadRejected as e:
+            metrics.inc('gateway_bulkhead_rejections_total', (('route_class', e.route_class), ('reason', e.reason)))
+            return channel_error(call.id, 503, 'Service overloaded', str(e), {'Retry-After': str(e.retry_after)})
+    try:
+        return await dispatch_channel_call(call, headers, send)
+    finally:
+        if route_class is not None:
+            admission.release(route_class)
+
+
+async def dispatch_channel_call(call, headers, send):
+    """Send a channel call to its service, as the HTTP route for its path would"""
+    service_key, path, stream = call.route
+    service = SERVICES[service_key]
+    log_request(call.method, call.path, service['name'])
+
+    try:
+        if stream:
+            return await stream_channel_call(call, service, path, headers, send)
+        if service_key == 'main' and call.method == 'GET':
+            return channel_response(call, *await fetch_main_read(call.path, path, call.query_string, headers))
+        try:
+            return channel_response(call, *await fetch_upstream(
+                service, path, call.method, headers, call.query_string, call.body, resource_prefix(call.path)
+            ))
+        finally:
+            if service_key == 'main':
+                # Writes invalidate cached reads of the same resource
+                response_cache.purge(call.path)
+    except ChannelClosed:
+        raise
+    except Exception as e:
+        response = upstream_error_response(e)
+        return channel_response(call, response.status, response.headers.items(), response.body)
+
+
+async def stream_channel_call(call, service, path, headers, send, timeout=60):
+    """
+    Relay an upstream SSE stream as event frames
+
+    Sending waits for the socket, so a slow client slows the upstream read
+    down rather than filling a buffer.
+
+    Returns:
+        The closing 'end' frame (or a response frame when the upstream
+        did not answer with an event stream)
+    """
+    upstream, finish = await send_upstream(
+        service,
+        path,
+        call.method,
+        # No total limit for streams - only connect and per-read deadlines
+        aiohttp.ClientTimeout(total=None, sock_connect=timeout, sock_read=timeout),
+        adaptive=False,
+        params=call.query_string,
+        headers=filter_headers(headers, exclude=('content-length',)),
+        data=call.body
+    )
+    try:
+        response_headers = filter_headers(upstream.headers, exclude=('content-length', 'server-timing'))
+        include_timing(upstream.headers)
+        if not is_event_stream(upstream.headers.get('content-type')):
+            return channel_response(call, upstream.status, response_headers.items(), await upstream.read())
+
+        outcome = CLIENT_GONE
+        splitter = EventSplitter()
+        try:
+            async for chunk in upstream.content.iter_any():
+                for event in splitter.feed(chunk):
+                    await send({'type': 'event', 'id': call.id, 'data': event.decode('utf-8', errors='replace')})
+            tail = splitter.flush()
+            if tail:
+                await send({'type': 'event', 'id': call.id, 'data': tail.decode('utf-8', errors='replace')})
+            outcome = COMPLETE
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            outcome = UPSTREAM_ERROR
+        finally:
+            if outcome != COMPLETE:
+                # Cancelled, or the client went away: stop the chatbot generating
+                upstream.close()
+            record_stream(outcome, 0)
+
+        frame = {'type': 'end', 'id': call.id, 'status': upstream.status, 'headers': response_headers}
+        if outcome == UPSTREAM_ERROR:
+            frame['error'] = 'The upstream stream ended early'
+        return frame
+    finally:
+        finish()
+
+
+# Route: /api/ai/chat/* -> AI Chatbot Service (port 5001)
+async def proxy_ai_chatbot(request):
+    """Proxy requests to AI Chatbot Service (with streaming support)"""
+    service = SERVICES['ai_chatbot']
+    subpath = request.match_info.get('subpath', '')
+    path = "/chat" if not subpath else f"/{subpath}"
+
+    log_request(request.method, request.path, service['name'])
+
+    if 'stream' in subpath:
+        return await proxy_stream(request, service, path)
+    return await proxy_request(request, service, path)
+
+
+# Route: /api/ai/assessment/* -> Stroke Assessment Service (port 5002)
+async def proxy_ai_assessment(request):
+    """Proxy requests to Stroke Assessment Service"""
+    service = SERVICES['ai_assessment']
+    subpath = request.match_info.get('subpath', '')
+    path = "/predict" if not subpath else f"/{subpath}"
+
+    log_request(request.method, request.path, service['name'])
+    return await proxy_request(request, service, path)
+
+
+# Route: /api/ai/image/* -> Stroke Image Analysis Service (port 5003)
+async def proxy_ai_image(request):
+    """Proxy requests to Stroke Image Analysis Service (with image upload support)"""
+    service = SERVICES['ai_image']
+    subpath = request.match_info.get('subpath', '')
+    path = "/analyze" if not subpath else f"/{subpath}"
+
+    log_request(request.method, request.path, service['name'])
+
+    # Multipart bodies are forwarded as raw bytes, so no re-encoding is needed here
+    timeout = 60 if request.method == 'POST' else 30
+    return await proxy_request(request, service, path, timeout=timeout)
+
+
+async def compress_response(request, response):
+    """Compress a buffered body when the client accepts it (streams compress in relay_response)"""
+    if not isinstance(response, web.Response) or response.prepared or not isinstance(response.body, bytes):
+        return
+    compressor = start_compression(
+        request.method,
+        response.status,
+        request.headers.get('Accept-Encoding'),
+        response.headers,
+        len(response.body)
+    )
+    if compressor is None:
+        return
+    body = response.body
+    if len(body) > COMPRESS_OFFLOAD_SIZE:
+        # Keep large bodies from stalling the event loop
+        body = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: compressor.compress(body) + compressor.finish())
+    else:
+        body = compressor.compress(body) + compressor.finish()
+    response.body = body
+
+
+@web.middleware
+async def gateway_middleware(request, handler):
+    """CORS preflight, rate limiting, compression, tracing/logging/metrics and JSON error handling"""
+    start_time = time.time()
+    route = (('route', route_label(request.path, SERVICES)),)
+    metrics.inc('gateway_requests_in_flight', route)
+    metrics.inc('gateway_request_bytes_total', route, request.content_length or 0)
+    # Headers are added by add_trace_headers once the response is prepared
+    request['trace'], token = start_trace(
+        'gateway',
+        request.headers.get(REQUEST_ID_HEADER),
+        request.headers.get(DEADLINE_HEADER)
+    )
+    try:
+        response = await handle_request(request, handler)
+    finally:
+        end_trace(token)
+        metrics.inc('gateway_requests_in_flight', route, -1)
+
+    metrics.inc('gateway_requests_total', route + (('method', request.method), ('status', str(response.status))))
+    metrics.observe('gateway_request_duration_seconds', route, time.time() - start_time)
+    # Streamed bodies are counted by relay_response as they are written
+    if not response.prepared and isinstance(response.body, bytes):
+        metrics.inc('gateway_response_bytes_total', route, len(response.body))
+    log_response(response.status, (time.time() - start_time) * 1000, request.method, request.path)
+    return response
+
+
+async def handle_request(request, handler):
+    """Everything the middleware does up to a finished response"""
+    rejection = None
+    retry_after = 0
+    if request.method != 'OPTIONS':
+        rejection = token_rejection(request.path, request.headers.get('Authorization'))
+        if not rejection:
+            client = client_key(request.headers.get('Authorization'), request.remote)
+            retry_after = rate_limiter.check(request.path, client)
+
+    if request.method == 'OPTIONS':
+        response = web.Response(status=200)
+    elif rejection:
+        metrics.inc('gateway_auth_rejections_total', (('route', route_label(request.path, SERVICES)),))
+        response = error_response(401, 'Unauthorized', rejection)
+        response.headers['WWW-Authenticate'] = 'Bearer error="invalid_token"'
+    elif retry_after:
+        response = error_response(429, 'Too many requests', f'Rate limit exceeded, retry in {retry_after} seconds')
+        response.headers['Retry-After'] = str(retry_after)
+    else:
+        response = await admit_and_handle(request, handler)
+
+    await compress_response(request, response)
+    return response
+
+
+async def admit_and_handle(request, handler):
+    """Run the handler once its route class admits it (streams hold the slot until relayed)"""
+    route_class = admission.class_for(request.path)
+    if route_class is not None:
+        try:
+            await admission.acquire_async(route_class)
+        except BulkheadRejected as e:
+            metrics.inc('gateway_bulkhead_rejections_total', (('route_class', e.route_class), ('reason', e.reason)))
+            response = error_response(503, 'Service overloaded', str(e))
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response
+    try:
+        return await handler(request)
+    except web.HTTPNotFound:
+        log_request(request.method, request.path)
+        return web.json_response({
+            'error': 'Route not found',
+            'message': f'Gateway does not have a route for {request.path}',
+            'available_routes': [
+                '/api/main/*',
+                '/api/batch',
+                '/api/ws',
+                '/api/ai/chat',
+                '/api/ai/assessment'
+            ]
+        }, status=404)
+    except web.HTTPException as e:
+        return web.json_response({'error': e.reason, 'message': e.text}, status=e.status)
+    except Exception as e:
+        return error_response(500, 'Unexpected error', str(e))
+    finally:
+        if route_class is not None:
+            admission.release(route_class)
+
+
+async def add_cors_headers(request, response):
+    """Attach CORS headers before the response (or stream) is sent"""
+    origin = request.headers.get('Origin')
+    if not origin:
+        return
+    response.headers['Access-Control-Allow-Origin'] = origin
+    response.headers['Access-Control-Allow-Credentials'] = 'true'
+    response.headers['Access-Control-Expose-Headers'] = CORS_EXPOSE_HEADERS
+    if request.method == 'OPTIONS':
+        response.headers['Access-Control-Allow-Methods'] = CORS_ALLOW_METHODS
+        response.headers['Access-Control-Allow-Headers'] = CORS_ALLOW_HEADERS
+        response.headers['Access-Control-Max-Age'] = CORS_MAX_AGE
+
+
+async def add_trace_headers(request, response):
+    """Attach the request ID and Server-Timing before the response (or stream) is sent"""
+    trace = request.get('trace')
+    if trace is not None:
+        finish_trace(trace, response.headers, request.method, request.path, response.status)
+
+
+async def gateway_metrics(request):
+    """Prometheus metrics endpoint"""
+    return web.Response(body=metrics.render().encode('utf-8'), headers={'Content-Type': METRICS_CONTENT_TYPE})
+
+
+async def admin_services(request):
+    """Show the service registry, or replace it with the JSON body (until the file next changes)"""
+    denied = admin_denied(request.remote, request.headers.get('Authorization'))
+    if denied:
+        return error_response(403, 'Forbidden', denied)
+
+    if request.method == 'PUT':
+        try:
+            overrides = await request.json()
+        except ValueError:
+            overrides = None
+        try:
+            registry.apply(overrides, source='admin')
+        except RegistryError as e:
+            return error_response(400, 'Invalid service registry', str(e))
+    return web.json_response(registry.status())
+
+
+async def admin_reload_services(request):
+    """Re-read the service registry file"""
+    denied = admin_denied(request.remote, request.headers.get('Authorization'))
+    if denied:
+        return error_response(403, 'Forbidden', denied)
+
+    try:
+        registry.reload_file()
+    except (OSError, ValueError) as e:
+        return error_response(400, 'Invalid service registry', str(e))
+    return web.json_response(registry.status())
+
+
+async def watch_registry(app):
+    """Apply the registry file at startup, then poll it for changes"""
+    registry.check_file()
+
+    async def poll():
+        while True:
+            await asyncio.sleep(registry.poll_interval)
+            registry.check_file()
+
+    app['registry_watch'] = asyncio.ensure_future(poll())
+
+
+async def stop_registry_watch(app):
+    app['registry_watch'].cancel()
+
+
+async def start_health_monitor(app):
+    """Begin background health probes as soon as the gateway starts"""
+    health_monitor.start()
+
+
+def create_app():
+    """Build the aiohttp application with all gateway routes"""
+    app = web.Application(middlewares=[gateway_middleware], client_max_size=MAX_BODY_SIZE)
+
+    app.router.add_get('/health', gateway_health)
+    app.router.add_get('/metrics', gateway_metrics)
+    app.router.add_route('GET', '/admin/services', admin_services)
+    app.router.add_route('PUT', '/admin/services', admin_services)
+    app.router.add_post('/admin/services/reload', admin_reload_services)
+
+    for method in PROXY_METHODS:
+        app.router.add_route(method, '/api/main/{subpath:.+}', proxy_main)
+
+    app.router.add_post('/api/batch', batch_requests)
+    app.router.add_get(CHANNEL_PATH, open_channel)
+    app.router.add_post('/api/ai/chat', proxy_ai_chatbot)
+    app.router.add_post('/api/ai/assessment', proxy_ai_assessment)
+    app.router.add_post('/api/ai/image', proxy_ai_image)
+    for method in ['GET', 'POST']:
+        app.router.add_route(method, '/api/ai/chat/{subpath:.+}', proxy_ai_chatbot)
+        app.router.add_route(method, '/api/ai/assessment/{subpath:.+}', proxy_ai_assessment)
+        app.router.add_route(method, '/api/ai/image/{subpath:.+}', proxy_ai_image)
+
+    app.on_startup.append(watch_registry)
+    app.on_startup.append(start_health_monitor)
+    app.on_response_prepare.append(add_cors_headers)
+    app.on_response_prepare.append(add_trace_headers)
+    app.on_cleanup.append(stop_registry_watch)
+    app.on_cleanup.append(close_client_sessions)
+    return app
+
+
+def run_gateway(host='0.0.0.0', port=8080):
+    """Start the async gateway (blocks until shutdown)"""
+    web.run_app(create_app(), host=host, port=port, print=None, access_log=None)
+
+
+def main():
+    """Entry point of python gateway_async.py (and GATEWAY_MODE=async python gateway.py)"""
+    # Configure logging
+    setup_logging('gateway')
+
+    GATEWAY_PORT = int(os.environ.get('GATEWAY_PORT', 8080))
+    print_banner(GATEWAY_PORT, 'async')
+    run_gateway(host='0.0.0.0', port=GATEWAY_PORT)
+
+
+if __name__ == '__main__':
+    main()
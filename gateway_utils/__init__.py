@@ -0,0 +1 @@
+# Gateway utils package
@@ -0,0 +1,168 @@
+"""
+JWT verification at the API Gateway.
+
+Bearer tokens are verified once and the outcome remembered in a bounded
+LRU cache: valid tokens for GATEWAY_TOKEN_CACHE_TTL seconds (never past
+their expiry), invalid ones for GATEWAY_TOKEN_NEGATIVE_TTL seconds, so a
+client retrying with a bad token costs one decode rather than one per
+request.
+
+With GATEWAY_JWT_VERIFY on, requests carrying a bad or expired bearer
+token are answered 401 by the gateway instead of being proxied. Routes
+under GATEWAY_JWT_EXEMPT (login and token refresh by default) are always
+passed through, as are requests without a bearer token - the services
+decide whether those need one.
+
+The gateway does not read flask_server/.env: tokens are verified with
+GATEWAY_JWT_SECRET, which must be set to the main server's JWT_SECRET.
+Verification and identity forwarding refuse to start without it; when it
+is unset tokens are not decoded here at all (and the rate limiter keys
+clients by IP).
+
+With GATEWAY_IDENTITY_SECRET set, every upstream call with a verified
+token also carries the token's claims in a signed identity header (see
+service_utils.identity), which the main server trusts instead of decoding
+the token again.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import jwt
+
+from service_utils.identity import IDENTITY_HEADER, IDENTITY_SECRET, sign_identity
+
+JWT_VERIFY = os.environ.get('GATEWAY_JWT_VERIFY', 'false').lower() in ('1', 'true', 'yes')
+# Gateway path prefixes whose tokens are never rejected here
+JWT_EXEMPT = tuple(
+    prefix.strip().rstrip('/') for prefix in os.environ.get('GATEWAY_JWT_EXEMPT', '/api/main/auth').split(',')
+    if prefix.strip()
+)
+# Verified tokens remembered at once; the least recently used go first
+TOKEN_CACHE_SIZE = int(os.environ.get('GATEWAY_TOKEN_CACHE_SIZE', 10000))
+# How long a verification is reused (seconds)
+TOKEN_CACHE_TTL = float(os.environ.get('GATEWAY_TOKEN_CACHE_TTL', 300))
+TOKEN_NEGATIVE_TTL = float(os.environ.get('GATEWAY_TOKEN_NEGATIVE_TTL', 30))
+
+# Same secret as the main Flask server's JWT_SECRET
+JWT_SECRET = os.environ.get('GATEWAY_JWT_SECRET', '')
+
+if not JWT_SECRET and (JWT_VERIFY or IDENTITY_SECRET):
+    raise RuntimeError(
+        'GATEWAY_JWT_SECRET must be set (to the main server\'s JWT_SECRET) '
+        'when GATEWAY_JWT_VERIFY or GATEWAY_IDENTITY_SECRET is set'
+    )
+
+
+def bearer_token(authorization):
+    """Token of a 'Bearer ...' Authorization header, or None"""
+    if authorization and authorization.startswith('Bearer '):
+        return authorization[7:]
+    return None
+
+
+class TokenVerifier:
+    """Thread-safe JWT verification with a cache of recent outcomes"""
+
+    def __init__(self, secret=JWT_SECRET, max_entries=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL,
+                 negative_ttl=TOKEN_NEGATIVE_TTL):
+        self.secret = secret
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+
+        self._entries = OrderedDict()  # token -> (claims or None, expires_at)
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'invalid': 0}
+
+    def claims(self, token):
+        """
+        Verified claims of a token
+
+        Returns:
+            The decoded payload, or None for a forged, malformed or
+            expired token
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(token)
+                self._stats['hits'] += 1
+                return entry[0]
+            self._stats['misses'] += 1
+
+        try:
+            claims = jwt.decode(token, self.secret, algorithms=['HS256'])
+        except jwt.InvalidTokenError:
+            claims = None
+            expires_at = now + self.negative_ttl
+        else:
+            expires_at = now + self.ttl
+            if isinstance(claims.get('exp'), (int, float)):
+                expires_at = min(expires_at, claims['exp'])
+
+        with self._lock:
+            if claims is None:
+                self._stats['invalid'] += 1
+            self._entries[token] = (claims, expires_at)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return claims
+
+    def stats(self):
+        """Cache counters for /health"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['cached'] = len(self._entries)
+        return stats
+
+
+token_verifier = TokenVerifier()
+
+
+def token_claims(authorization):
+    """Verified claims of a request's bearer token, or None"""
+    token = bearer_token(authorization)
+    if not token or not JWT_SECRET:
+        return None
+    return token_verifier.claims(token)
+
+
+def token_rejection(path, authorization):
+    """
+    Why the gateway should answer a request 401 itself
+
+    Returns:
+        An error message, or None when the request may be proxied
+    """
+    if not JWT_VERIFY or not path.startswith('/api/'):
+        return None
+    if any(path == prefix or path.startswith(prefix + '/') for prefix in JWT_EXEMPT):
+        return None
+    token = bearer_token(authorization)
+    if token and token_verifier.claims(token) is None:
+        return 'Invalid or expired token'
+    return None
+
+
+def identity_headers(authorization):
+    """Signed identity header for an upstream call ({} when there is nothing to vouch for)"""
+    if not IDENTITY_SECRET:
+        return {}
+    claims = token_claims(authorization)
+    if claims is None:
+        return {}
+    return {IDENTITY_HEADER: sign_identity(claims)}
+
+
+def auth_stats():
+    return {
+        'verify': JWT_VERIFY,
+        'exempt': list(JWT_EXEMPT),
+        'identity_forwarding': bool(IDENTITY_SECRET),
+        'token_cache': token_verifier.stats()
+    }
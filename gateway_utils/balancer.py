@@ -0,0 +1,148 @@
+"""
+Replica load balancing for the API Gateway.
+
+A service may list several replica URLs. Each request goes to the
+healthy replica with the fewest outstanding requests (power-of-two
+choices once there are more than two), replicas that keep failing with
+connection errors or 5xx responses are ejected, and an ejected replica
+is only re-admitted after it passes a health probe.
+"""
+
+import os
+import random
+import threading
+import time
+
+# Consecutive failures before a replica is ejected
+EJECT_AFTER_FAILURES = int(os.environ.get('GATEWAY_EJECT_AFTER_FAILURES', 3))
+
+
+def service_urls(service):
+    """Replica URLs of a SERVICES entry ('urls' if present, else 'url')"""
+    return list(service.get('urls') or [service['url']])
+
+
+class Replica:
+    """One backend instance of a service"""
+
+    def __init__(self, url):
+        self.url = url
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        self.ejected = False
+        self.ejected_at = None
+
+    def to_dict(self):
+        return {
+            'url': self.url,
+            'outstanding': self.outstanding,
+            'ejected': self.ejected,
+            'consecutive_failures': self.consecutive_failures
+        }
+
+
+class Lease:
+    """A request in flight on a replica - release it exactly once"""
+
+    def __init__(self, balancer, replica):
+        self.balancer = balancer
+        self.replica = replica
+        self.url = replica.url
+        self._released = False
+
+    def release(self, ok):
+        """Return the slot and record whether the request succeeded"""
+        if self._released:
+            return
+        self._released = True
+        self.balancer._release(self.replica, ok)
+
+
+class LoadBalancer:
+    """Least-outstanding-requests balancer with passive outlier ejection"""
+
+    def __init__(self, urls, eject_after=EJECT_AFTER_FAILURES):
+        self.replicas = [Replica(url) for url in urls]
+        self.eject_after = eject_after
+        self._lock = threading.Lock()
+
+    def acquire(self, exclude=()):
+        """
+        Pick a replica for a new request
+
+        Ejected replicas are skipped; if every replica is ejected, all of
+        them are considered again rather than failing outright.
+
+        Args:
+            exclude: URLs to avoid if any other replica is left (e.g. the
+                replica a hedged request is already waiting on)
+        """
+        with self._lock:
+            replicas = [r for r in self.replicas if r.url not in exclude] or self.replicas
+            candidates = [r for r in replicas if not r.ejected] or replicas
+            # Power of two choices: near-optimal and avoids herding on one
+            # replica; sampling also breaks ties between idle replicas randomly
+            candidates = random.sample(candidates, min(2, len(candidates)))
+            replica = min(candidates, key=lambda r: r.outstanding)
+            replica.outstanding += 1
+        return Lease(self, replica)
+
+    def _release(self, replica, ok):
+        with self._lock:
+            replica.outstanding -= 1
+            if ok:
+                replica.consecutive_failures = 0
+                return
+            replica.consecutive_failures += 1
+            if not replica.ejected and replica.consecutive_failures >= self.eject_after:
+                replica.ejected = True
+                replica.ejected_at = time.monotonic()
+
+    def has_alternative(self, exclude):
+        """Whether a healthy replica outside exclude is available"""
+        with self._lock:
+            return any(not r.ejected and r.url not in exclude for r in self.replicas)
+
+    def update(self, urls):
+        """
+        Replace the replica set, keeping the state of replicas that stay
+
+        Returns:
+            Replicas that were removed - requests already on them still
+            release into them normally
+        """
+        with self._lock:
+            current = {replica.url: replica for replica in self.replicas}
+            self.replicas = [current.get(url) or Replica(url) for url in urls]
+            return [replica for url, replica in current.items() if url not in urls]
+
+    def readmit(self, url):
+        """Put an ejected replica back in rotation after a successful probe"""
+        with self._lock:
+            for replica in self.replicas:
+                if replica.url == url and replica.ejected:
+                    replica.ejected = False
+                    replica.ejected_at = None
+                    replica.consecutive_failures = 0
+
+    def snapshot(self):
+        """Current state of every replica"""
+        with self._lock:
+            return [replica.to_dict() for replica in self.replicas]
+
+
+_balancers = {}
+_balancers_lock = threading.Lock()
+
+
+def get_balancer(service):
+    """Get (or lazily create) the balancer of a SERVICES entry"""
+    key = service['prefix']
+    balancer = _balancers.get(key)
+    if balancer is None:
+        with _balancers_lock:
+            balancer = _balancers.get(key)
+            if balancer is None:
+                balancer = LoadBalancer(service_urls(service))
+                _balancers[key] = balancer
+    return balancer
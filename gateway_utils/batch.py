@@ -0,0 +1,139 @@
+"""
+Composite (batch) requests for the API Gateway.
+
+POST /api/batch runs several reads against the main server concurrently
+and answers with all of their results at once, so the mobile app can load
+its home screen in one round trip instead of five:
+
+    POST /api/batch
+    {"requests": [
+        {"id": "me", "path": "/api/main/users/me"},
+        {"id": "doctors", "path": "/api/main/doctors?specialty=neurology"}
+    ]}
+
+    200 {"responses": [
+        {"id": "me", "status": 200, "headers": {...}, "body": {...}},
+        {"id": "doctors", "status": 503, "headers": {...},
+         "body": {"error": "Service unavailable", "message": "..."}}
+    ]}
+
+Sub-requests carry the caller's Authorization header and are handled like
+direct calls: they count against the caller's rate limits and go through
+the response cache, request coalescing and hedging. Only GETs to
+/api/main/* can be batched, so the order they run in never matters. A
+well-formed batch always answers 200; each result has its own status.
+"""
+
+import json
+import os
+from urllib.parse import urlsplit
+
+# Sub-requests allowed in one batch
+BATCH_MAX_REQUESTS = int(os.environ.get('GATEWAY_BATCH_MAX_REQUESTS', 10))
+# Threads running sub-requests in the Flask gateway
+BATCH_WORKERS = int(os.environ.get('GATEWAY_BATCH_WORKERS', 32))
+
+BATCH_PREFIX = '/api/main/'
+BATCH_METHODS = ('GET',)
+
+
+class BatchError(ValueError):
+    """Raised for a malformed batch"""
+
+
+class BatchItem:
+    """One sub-request of a batch"""
+
+    __slots__ = ('id', 'path', 'query_string')
+
+    def __init__(self, item_id, path, query_string):
+        self.id = item_id
+        self.path = path  # Gateway path, e.g. /api/main/doctors
+        self.query_string = query_string
+
+    @property
+    def upstream_path(self):
+        """Path on the main server, as proxy_main rewrites it"""
+        return '/api/' + self.path[len(BATCH_PREFIX):]
+
+
+def parse_batch(payload):
+    """
+    Validate a batch request body
+
+    Args:
+        payload: Decoded JSON body
+
+    Returns:
+        List of BatchItem in request order
+
+    Raises:
+        BatchError describing the first problem found
+    """
+    if not isinstance(payload, dict) or not isinstance(payload.get('requests'), list):
+        raise BatchError('Expected a JSON object with a "requests" list')
+    requests = payload['requests']
+    if not requests:
+        raise BatchError('The batch is empty')
+    if len(requests) > BATCH_MAX_REQUESTS:
+        raise BatchError(f'A batch may contain at most {BATCH_MAX_REQUESTS} requests')
+
+    items = []
+    seen = set()
+    for index, request in enumerate(requests):
+        if not isinstance(request, dict):
+            raise BatchError(f'requests[{index}] must be an object')
+        item_id = request.get('id', index)
+        if not isinstance(item_id, (str, int)) or isinstance(item_id, bool):
+            raise BatchError(f'requests[{index}].id must be a string or an integer')
+        if item_id in seen:
+            raise BatchError(f'Duplicate request id {item_id!r}')
+        seen.add(item_id)
+
+        method = request.get('method', 'GET')
+        if not isinstance(method, str) or method.upper() not in BATCH_METHODS:
+            raise BatchError(f"requests[{index}]: only {', '.join(BATCH_METHODS)} requests can be batched")
+
+        path = request.get('path')
+        if not isinstance(path, str):
+            raise BatchError(f'requests[{index}].path must be a string')
+        parts = urlsplit(path)
+        if (parts.scheme or parts.netloc or parts.fragment or not parts.path.startswith(BATCH_PREFIX)
+                or '..' in parts.path.split('/')):
+            raise BatchError(f'requests[{index}].path must be a {BATCH_PREFIX}* path')
+        items.append(BatchItem(item_id, parts.path, parts.query))
+    return items
+
+
+def batch_error(item, status, error, message, headers=None):
+    """Result entry of a sub-request the gateway answered itself"""
+    return {
+        'id': item.id,
+        'status': status,
+        'headers': dict(headers or {}),
+        'body': {'error': error, 'message': message}
+    }
+
+
+def batch_result(item, status, headers, body):
+    """
+    Result entry of a finished sub-request
+
+    Args:
+        item: The BatchItem
+        status: HTTP status
+        headers: Response header pairs
+        body: Response body bytes - JSON bodies are embedded decoded,
+            anything else as text
+    """
+    # The body is re-encoded into the batch response, so its length no longer applies
+    headers = {key: value for key, value in headers if key.lower() != 'content-length'}
+    content_type = next((value for key, value in headers.items() if key.lower() == 'content-type'), '')
+    if content_type.split(';')[0].strip().lower() == 'application/json':
+        try:
+            body = json.loads(body) if body else None
+        except ValueError:
+            body = body.decode('utf-8', errors='replace')
+    else:
+        body = body.decode('utf-8', errors='replace')
+    return {'id': item.id, 'status': status, 'headers': headers, 'body': body}
@@ -0,0 +1,168 @@
+"""
+Per-service circuit breakers for the API Gateway.
+
+Each service gets a breaker that watches a rolling window of recent
+calls. When too many fail, or too many are slower than the service's
+slow-call threshold, the breaker opens and requests fail fast with 503
+instead of waiting out the full upstream timeout. After a cool-down it
+lets a few probe requests through (half-open) and closes again only if
+they all succeed.
+"""
+
+import math
+import os
+import threading
+import time
+from collections import deque
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Defaults - a SERVICES entry can override any of them under 'breaker'
+BREAKER_DEFAULTS = {
+    'window': int(os.environ.get('GATEWAY_BREAKER_WINDOW', 20)),  # calls kept
+    'min_calls': int(os.environ.get('GATEWAY_BREAKER_MIN_CALLS', 10)),  # before evaluating
+    'failure_rate': float(os.environ.get('GATEWAY_BREAKER_FAILURE_RATE', 0.5)),
+    'slow_call_rate': float(os.environ.get('GATEWAY_BREAKER_SLOW_CALL_RATE', 0.8)),
+    'slow_call_seconds': float(os.environ.get('GATEWAY_BREAKER_SLOW_CALL_SECONDS', 10)),
+    'open_seconds': float(os.environ.get('GATEWAY_BREAKER_OPEN_SECONDS', 15)),
+    'half_open_probes': int(os.environ.get('GATEWAY_BREAKER_HALF_OPEN_PROBES', 3))
+}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a service whose breaker is open"""
+
+    def __init__(self, service_name, retry_after):
+        super().__init__(f'Circuit breaker open for {service_name}')
+        self.service_name = service_name
+        # Whole seconds, for the Retry-After header
+        self.retry_after = max(math.ceil(retry_after), 1)
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker over a rolling window of calls"""
+
+    def __init__(self, name, **settings):
+        self.name = name
+        config = dict(BREAKER_DEFAULTS, **settings)
+        self.window = config['window']
+        self.min_calls = config['min_calls']
+        self.failure_rate = config['failure_rate']
+        self.slow_call_rate = config['slow_call_rate']
+        self.slow_call_seconds = config['slow_call_seconds']
+        self.open_seconds = config['open_seconds']
+        self.half_open_probes = config['half_open_probes']
+
+        self.state = CLOSED
+        self._calls = deque(maxlen=self.window)  # (failed, slow) per call
+        self._opened_at = 0.0
+        self._probes_started = 0
+        self._probes_succeeded = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        Check whether a call may go through
+
+        Raises:
+            CircuitOpenError when the breaker is open (or half-open with
+            all probe slots taken)
+        """
+        with self._lock:
+            if self.state == OPEN:
+                remaining = self._opened_at + self.open_seconds - time.monotonic()
+                if remaining > 0:
+                    raise CircuitOpenError(self.name, remaining)
+                self.state = HALF_OPEN
+                self._probes_started = 0
+                self._probes_succeeded = 0
+
+            if self.state == HALF_OPEN:
+                if self._probes_started >= self.half_open_probes:
+                    raise CircuitOpenError(self.name, 1)
+                self._probes_started += 1
+
+    def record(self, ok, latency):
+        """
+        Record the outcome of a call that allow() let through
+
+        Args:
+            ok: False for connection errors, timeouts and 5xx responses
+            latency: Seconds until the upstream responded
+        """
+        slow = latency >= self.slow_call_seconds
+        with self._lock:
+            if self.state == HALF_OPEN:
+                if not ok or slow:
+                    self._trip()
+                else:
+                    self._probes_succeeded += 1
+                    if self._probes_succeeded >= self.half_open_probes:
+                        self.state = CLOSED
+                        self._calls.clear()
+                return
+
+            if self.state == OPEN:
+                # Late result of a call started before the breaker opened
+                return
+
+            self._calls.append((not ok, slow))
+            if len(self._calls) < self.min_calls:
+                return
+            failures = sum(1 for failed, _ in self._calls if failed)
+            slow_calls = sum(1 for _, was_slow in self._calls if was_slow)
+            if (failures / len(self._calls) >= self.failure_rate
+                    or slow_calls / len(self._calls) >= self.slow_call_rate):
+                self._trip()
+
+    def cancel(self):
+        """Forget a call that allow() let through but that never completed"""
+        with self._lock:
+            if self.state == HALF_OPEN and self._probes_started > self._probes_succeeded:
+                self._probes_started -= 1
+
+    def _trip(self):
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self._calls.clear()
+
+    def snapshot(self):
+        """Current breaker state for /health"""
+        with self._lock:
+            calls = len(self._calls)
+            failures = sum(1 for failed, _ in self._calls if failed)
+            slow_calls = sum(1 for _, was_slow in self._calls if was_slow)
+            snapshot = {
+                'state': self.state,
+                'calls': calls,
+                'failure_rate': round(failures / calls, 3) if calls else 0.0,
+                'slow_call_rate': round(slow_calls / calls, 3) if calls else 0.0
+            }
+            if self.state == OPEN:
+                snapshot['retry_after'] = round(max(self._opened_at + self.open_seconds - time.monotonic(), 0), 1)
+        return snapshot
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(service):
+    """Get (or lazily create) the breaker of a SERVICES entry"""
+    key = service['prefix']
+    breaker = _breakers.get(key)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(key)
+            if breaker is None:
+                breaker = CircuitBreaker(service['name'], **service.get('breaker', {}))
+                _breakers[key] = breaker
+    return breaker
+
+
+def drop_breaker(service):
+    """Forget the breaker of a SERVICES entry so the next call builds one from its current settings"""
+    with _breakers_lock:
+        _breakers.pop(service['prefix'], None)
@@ -0,0 +1,277 @@
+"""
+Bulkheads and priority admission for the API Gateway.
+
+Each route class (a route prefix) gets its own concurrency limit and a
+bounded queue, so a surge of slow chat requests can only ever occupy the
+chat bulkhead instead of every gateway worker. On top of that the gateway
+as a whole admits at most GATEWAY_MAX_CONCURRENCY requests at once and
+queues at most GATEWAY_MAX_QUEUED; queued requests are admitted highest
+priority first.
+
+When a class's own queue is full its new requests are rejected. When the
+shared queue is full, the newest waiter of the lowest priority class is
+shed to make room for a more important request - or, if nothing queued is
+less important, the new request itself is rejected. Requests that wait
+longer than GATEWAY_QUEUE_TIMEOUT are rejected as well. Rejections are
+503s with a Retry-After header.
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import threading
+
+BULKHEADS_ENABLED = os.environ.get('GATEWAY_BULKHEADS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+# Requests in flight across all classes
+MAX_CONCURRENCY = int(os.environ.get('GATEWAY_MAX_CONCURRENCY', 64))
+# Requests waiting across all classes
+MAX_QUEUED = int(os.environ.get('GATEWAY_MAX_QUEUED', 128))
+# Longest a request may wait for a slot (seconds)
+QUEUE_TIMEOUT = float(os.environ.get('GATEWAY_QUEUE_TIMEOUT', 10))
+
+# Route classes (gateway path prefixes)
+# priority: higher is admitted first and shed last
+# limit: requests of the class in flight at once
+# queue: requests of the class waiting at once
+# Override with GATEWAY_BULKHEADS='{"/api/ai/chat": {"priority": 2, "limit": 4, "queue": 8}}'
+BULKHEADS = {
+    '/api/ai/assessment': {'priority': 4, 'limit': 16, 'queue': 32},
+    '/api/main': {'priority': 3, 'limit': 40, 'queue': 64},
+    # A batch holds one slot while its sub-requests run
+    '/api/batch': {'priority': 3, 'limit': 8, 'queue': 16},
+    '/api/ai/chat': {'priority': 2, 'limit': 12, 'queue': 16},
+    '/api/ai/image': {'priority': 1, 'limit': 6, 'queue': 8}
+}
+if os.environ.get('GATEWAY_BULKHEADS'):
+    BULKHEADS = json.loads(os.environ['GATEWAY_BULKHEADS'])
+
+WAITING = 'waiting'
+ADMITTED = 'admitted'
+REJECTED = 'rejected'
+
+
+class BulkheadRejected(Exception):
+    """Raised instead of admitting a request"""
+
+    def __init__(self, route_class, reason, retry_after=1):
+        messages = {
+            'queue_full': f'Too many requests waiting for {route_class}',
+            'shed': f'Request to {route_class} shed under load',
+            'timeout': f'Timed out waiting for capacity on {route_class}'
+        }
+        super().__init__(messages.get(reason, f'Request to {route_class} rejected'))
+        self.route_class = route_class
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class RouteClass:
+    """Limits and live counters of one bulkhead"""
+
+    def __init__(self, prefix, priority, limit, queue):
+        self.prefix = prefix
+        self.priority = priority
+        self.limit = limit
+        self.max_queue = queue
+        self.active = 0
+        self.queued = 0
+        self.rejected = {'queue_full': 0, 'shed': 0, 'timeout': 0}
+
+
+class Ticket:
+    """A queued request; notify() is called once it is admitted or rejected"""
+
+    __slots__ = ('route_class', 'seq', 'state', 'reason', 'notify')
+
+    def __init__(self, route_class, seq, notify):
+        self.route_class = route_class
+        self.seq = seq
+        self.state = WAITING
+        self.reason = None
+        self.notify = notify
+
+
+class AdmissionController:
+    """Per-class bulkheads with shared, priority-ordered admission"""
+
+    def __init__(self, classes=None, max_concurrency=MAX_CONCURRENCY, max_queued=MAX_QUEUED,
+                 queue_timeout=QUEUE_TIMEOUT, enabled=BULKHEADS_ENABLED):
+        classes = BULKHEADS if classes is None else classes
+        self.classes = {
+            prefix: RouteClass(prefix, config['priority'], config['limit'], config['queue'])
+            for prefix, config in classes.items()
+        }
+        self.max_concurrency = max_concurrency
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.enabled = enabled
+
+        self.active = 0
+        self._waiting = []  # Tickets in arrival order
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def class_for(self, path):
+        """Route class of a gateway path (longest matching prefix), or None"""
+        if not self.enabled:
+            return None
+        best = None
+        for prefix, route_class in self.classes.items():
+            if path == prefix or path.startswith(prefix + '/'):
+                if best is None or len(prefix) > len(best.prefix):
+                    best = route_class
+        return best
+
+    def _enter(self, route_class, notify):
+        """Admit now (None), queue (Ticket) or raise BulkheadRejected"""
+        shed = None
+        with self._lock:
+            if (not self._waiting and route_class.active < route_class.limit
+                    and self.active < self.max_concurrency):
+                self._admit(route_class)
+                return None
+
+            if route_class.queued >= route_class.max_queue:
+                route_class.rejected['queue_full'] += 1
+                raise BulkheadRejected(route_class.prefix, 'queue_full')
+            if len(self._waiting) >= self.max_queued:
+                shed = self._lowest_waiter()
+                if shed is None or shed.route_class.priority >= route_class.priority:
+                    route_class.rejected['shed'] += 1
+                    raise BulkheadRejected(route_class.prefix, 'shed')
+                self._remove(shed)
+                shed.state = REJECTED
+                shed.reason = 'shed'
+                shed.route_class.rejected['shed'] += 1
+
+            ticket = Ticket(route_class, next(self._seq), notify)
+            self._waiting.append(ticket)
+            route_class.queued += 1
+            # A slot may be free for this class even though others are waiting
+            admitted = self._dispatch()
+        if shed is not None:
+            shed.notify()
+        for other in admitted:
+            other.notify()
+        return ticket
+
+    def _admit(self, route_class):
+        route_class.active += 1
+        self.active += 1
+
+    def _remove(self, ticket):
+        self._waiting.remove(ticket)
+        ticket.route_class.queued -= 1
+
+    def _lowest_waiter(self):
+        # Newest waiter of the least important class
+        if not self._waiting:
+            return None
+        return max(self._waiting, key=lambda t: (-t.route_class.priority, t.seq))
+
+    def _dispatch(self):
+        """Admit queued tickets, most important first, while slots are free (lock held)"""
+        admitted = []
+        for ticket in sorted(self._waiting, key=lambda t: (-t.route_class.priority, t.seq)):
+            if self.active >= self.max_concurrency:
+                break
+            if ticket.route_class.active < ticket.route_class.limit:
+                self._remove(ticket)
+                self._admit(ticket.route_class)
+                ticket.state = ADMITTED
+                admitted.append(ticket)
+        return admitted
+
+    def _give_up(self, ticket):
+        """
+        Stop waiting (timeout or cancellation)
+
+        Returns:
+            True when the ticket was admitted in the meantime - the caller
+            then holds a slot and must release it
+        """
+        with self._lock:
+            if ticket.state == WAITING:
+                self._remove(ticket)
+                ticket.state = REJECTED
+                ticket.reason = 'timeout'
+                ticket.route_class.rejected['timeout'] += 1
+                return False
+            return ticket.state == ADMITTED
+
+    def release(self, route_class):
+        """Free the slot of a finished request and admit whoever is next"""
+        with self._lock:
+            route_class.active -= 1
+            self.active -= 1
+            admitted = self._dispatch()
+        for ticket in admitted:
+            ticket.notify()
+
+    def acquire(self, route_class):
+        """
+        Wait (blocking) for a slot in the class
+
+        Raises:
+            BulkheadRejected when the request is rejected or shed
+        """
+        event = threading.Event()
+        ticket = self._enter(route_class, event.set)
+        if ticket is None:
+            return
+        if not event.wait(self.queue_timeout) and not self._give_up(ticket):
+            raise BulkheadRejected(route_class.prefix, 'timeout')
+        if ticket.state == REJECTED:
+            raise BulkheadRejected(route_class.prefix, ticket.reason)
+
+    async def acquire_async(self, route_class):
+        """
+        Wait for a slot in the class without blocking the event loop
+
+        Raises:
+            BulkheadRejected when the request is rejected or shed
+        """
+        future = asyncio.get_running_loop().create_future()
+
+        def notify():
+            if not future.done():
+                future.set_result(None)
+
+        ticket = self._enter(route_class, notify)
+        if ticket is None:
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if not self._give_up(ticket):
+                raise BulkheadRejected(route_class.prefix, 'timeout')
+        except asyncio.CancelledError:
+            # The client went away while queued
+            if self._give_up(ticket):
+                self.release(route_class)
+            raise
+        if ticket.state == REJECTED:
+            raise BulkheadRejected(route_class.prefix, ticket.reason)
+
+    def stats(self):
+        """Bulkhead state for /health"""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'active': self.active,
+                'queued': len(self._waiting),
+                'max_concurrency': self.max_concurrency,
+                'max_queued': self.max_queued,
+                'classes': {
+                    prefix: {
+                        'priority': route_class.priority,
+                        'active': route_class.active,
+                        'limit': route_class.limit,
+                        'queued': route_class.queued,
+                        'queue': route_class.max_queue,
+                        'rejected': dict(route_class.rejected)
+                    }
+                    for prefix, route_class in self.classes.items()
+                }
+            }
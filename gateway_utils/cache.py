@@ -0,0 +1,150 @@
+"""
+In-gateway HTTP response cache for read-mostly GET endpoints.
+
+Entries are kept in a size-bounded LRU with per-route TTLs. Routes whose
+responses depend on the caller are keyed by the Authorization header too,
+and any mutating request purges everything cached under the same
+resource prefix (e.g. POST /api/main/doctors drops /api/main/doctors/*).
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_ENABLED = os.environ.get('GATEWAY_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+CACHE_MAX_ENTRIES = int(os.environ.get('GATEWAY_CACHE_MAX_ENTRIES', 1000))
+CACHE_MAX_BYTES = int(os.environ.get('GATEWAY_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+# Larger responses are never cached so one entry can't flush the whole cache
+CACHE_MAX_ENTRY_BYTES = int(os.environ.get('GATEWAY_CACHE_MAX_ENTRY_BYTES', 1024 * 1024))
+
+# Cacheable route prefixes (gateway paths)
+# ttl: seconds an entry stays fresh
+# vary_auth: key entries by Authorization (per-user responses)
+# Override with GATEWAY_CACHE_RULES='{"/api/main/doctors": {"ttl": 30}}'
+CACHE_RULES = {
+    '/api/main/doctors': {'ttl': 60, 'vary_auth': False},
+    '/api/main/faqs': {'ttl': 300, 'vary_auth': False},
+    '/api/main/users/me': {'ttl': 30, 'vary_auth': True}
+}
+if os.environ.get('GATEWAY_CACHE_RULES'):
+    CACHE_RULES = json.loads(os.environ['GATEWAY_CACHE_RULES'])
+
+
+def resource_prefix(path):
+    """Resource a path belongs to, e.g. /api/main/doctors/3 -> /api/main/doctors"""
+    return '/'.join(path.rstrip('/').split('/')[:4])
+
+
+class CachedResponse:
+    """Buffered upstream response stored in the cache"""
+
+    __slots__ = ('status', 'headers', 'body', 'expires_at', 'path')
+
+    def __init__(self, status, headers, body, expires_at, path):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.expires_at = expires_at
+        self.path = path
+
+
+class ResponseCache:
+    """Thread-safe LRU response cache with per-route TTLs"""
+
+    def __init__(self, rules=None, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES,
+                 max_entry_bytes=CACHE_MAX_ENTRY_BYTES, enabled=CACHE_ENABLED):
+        self.rules = CACHE_RULES if rules is None else rules
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.enabled = enabled
+
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'purges': 0}
+
+    def rule_for(self, path):
+        """Longest matching cache rule for a gateway path (or None)"""
+        if not self.enabled:
+            return None
+        best = None
+        for prefix, rule in self.rules.items():
+            if path == prefix or path.startswith(prefix + '/'):
+                if best is None or len(prefix) > len(best[0]):
+                    best = (prefix, rule)
+        return best[1] if best else None
+
+    def make_key(self, path, query_string, headers, rule):
+        """Cache key from path, query and (optionally) the caller's token"""
+        auth = headers.get('Authorization', '') if rule.get('vary_auth') else ''
+        return (path, query_string, auth)
+
+    def get(self, key):
+        """Fresh cached response for key, or None (counts hit/miss)"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at > now:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return entry
+            if entry is not None:
+                self._remove(key)
+            self._stats['misses'] += 1
+            return None
+
+    def put(self, key, status, headers, body, rule):
+        """
+        Store a response if it is cacheable
+
+        Only 200 responses without Cache-Control no-store/private (unless
+        the rule varies on Authorization) and within the size limit are kept.
+        """
+        if status != 200 or len(body) > self.max_entry_bytes:
+            return
+        cache_control = ''
+        for name, value in headers:
+            if name.lower() == 'cache-control':
+                cache_control = value.lower()
+        if 'no-store' in cache_control or ('private' in cache_control and not rule.get('vary_auth')):
+            return
+
+        entry = CachedResponse(status, headers, body, time.monotonic() + rule.get('ttl', 60), key[0])
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._bytes += len(body)
+            self._stats['stores'] += 1
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._stats['evictions'] += 1
+
+    def purge(self, path):
+        """Drop every entry under the resource prefix of a mutated path"""
+        prefix = resource_prefix(path)
+        with self._lock:
+            stale = [key for key, entry in self._entries.items()
+                     if entry.path == prefix or entry.path.startswith(prefix + '/')]
+            for key in stale:
+                self._remove(key)
+            if stale:
+                self._stats['purges'] += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry.body)
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        return stats
@@ -0,0 +1,173 @@
+"""
+Multiplexed WebSocket channel for the API Gateway.
+
+GET /api/ws upgrades to a WebSocket that carries many API calls at once,
+so a chatty mobile session sets up one connection and sends its headers
+once instead of on every call. Messages are JSON text frames tagged with
+an id chosen by the client:
+
+    -> {"type": "request", "id": 1, "method": "GET", "path": "/api/main/doctors?page=2"}
+    -> {"type": "request", "id": 2, "method": "POST", "path": "/api/ai/chat/stream",
+        "body": {"message": "..."}}
+    <- {"type": "response", "id": 1, "status": 200, "headers": {...}, "body": {...}}
+    <- {"type": "event", "id": 2, "data": "data: {...}\\n\\n"}
+    <- {"type": "event", "id": 2, "data": "data: {...}\\n\\n"}
+    <- {"type": "end", "id": 2, "status": 200, "headers": {...}}
+    -> {"type": "cancel", "id": 2}
+
+Calls are answered as they finish, in any order. Headers sent with the
+handshake (Authorization included) apply to every call; a message's own
+"headers" are added on top, e.g. to switch to a refreshed token. Each
+call is handled like the matching HTTP request: token check, rate limits,
+bulkheads, response cache, coalescing and hedging, with its own
+X-Request-ID. Event streams (chat) are relayed event by event ("data" is
+the raw SSE event); cancelling a call or closing the socket aborts its
+upstream request, and a cancelled call gets no answer.
+
+Image uploads are not carried over the channel - they stay multipart POSTs.
+The channel is served by the asyncio engine (GATEWAY_MODE=async).
+"""
+
+import json
+import os
+from urllib.parse import urlsplit
+
+from gateway_utils.batch import batch_result
+
+CHANNEL_PATH = '/api/ws'
+# Calls in flight at once on one connection
+CHANNEL_MAX_CALLS = int(os.environ.get('GATEWAY_WS_MAX_CALLS', 32))
+# Largest message accepted from a client (bytes)
+CHANNEL_MAX_MESSAGE = int(os.environ.get('GATEWAY_WS_MAX_MESSAGE', 1024 * 1024))
+# Ping interval; a client that misses a pong is disconnected (seconds)
+CHANNEL_HEARTBEAT = float(os.environ.get('GATEWAY_WS_HEARTBEAT', 30))
+
+CHANNEL_METHODS = ('GET', 'POST', 'PUT', 'DELETE', 'PATCH')
+
+# Gateway prefix -> (SERVICES key, default upstream path), as the HTTP routes map them
+CHANNEL_ROUTES = {
+    '/api/main': ('main', None),
+    '/api/ai/chat': ('ai_chatbot', '/chat'),
+    '/api/ai/assessment': ('ai_assessment', '/predict')
+}
+
+
+class ChannelError(ValueError):
+    """Raised for a malformed channel message"""
+
+    def __init__(self, message, call_id=None):
+        super().__init__(message)
+        self.call_id = call_id
+
+
+class ChannelClosed(Exception):
+    """Raised when answering on a channel whose client has gone away"""
+
+
+class ChannelCall:
+    """One API call made over the channel"""
+
+    __slots__ = ('id', 'method', 'path', 'query_string', 'headers', 'body')
+
+    def __init__(self, call_id, method, path, query_string, headers, body):
+        self.id = call_id
+        self.method = method
+        self.path = path  # Gateway path, e.g. /api/main/doctors
+        self.query_string = query_string
+        self.headers = headers
+        self.body = body  # Encoded JSON body, or None
+
+    @property
+    def route(self):
+        """(SERVICES key, upstream path, is a stream) of the call"""
+        return channel_route(self.path)
+
+
+def channel_route(path):
+    """
+    Upstream of a gateway path reachable over the channel
+
+    Returns:
+        (SERVICES key, upstream path, is a stream), or None
+    """
+    for prefix, (service_key, default_path) in CHANNEL_ROUTES.items():
+        if path == prefix or path.startswith(prefix + '/'):
+            subpath = path[len(prefix) + 1:]
+            if default_path is None:
+                # /api/main/<subpath> -> /api/<subpath> on the main server
+                return (service_key, f'/api/{subpath}', False) if subpath else None
+            return service_key, f'/{subpath}' if subpath else default_path, 'stream' in subpath
+    return None
+
+
+def _call_id(message):
+    call_id = message.get('id')
+    if not isinstance(call_id, (str, int)) or isinstance(call_id, bool):
+        raise ChannelError('"id" must be a string or an integer')
+    return call_id
+
+
+def parse_message(text):
+    """
+    Decode a client message
+
+    Returns:
+        ('request', ChannelCall) or ('cancel', call id)
+
+    Raises:
+        ChannelError describing the problem (with the call id when known)
+    """
+    try:
+        message = json.loads(text)
+    except ValueError:
+        raise ChannelError('Messages must be JSON objects')
+    if not isinstance(message, dict):
+        raise ChannelError('Messages must be JSON objects')
+
+    kind = message.get('type', 'request')
+    call_id = _call_id(message)
+    if kind == 'cancel':
+        return 'cancel', call_id
+    if kind != 'request':
+        raise ChannelError(f'Unknown message type {kind!r}', call_id)
+
+    method = message.get('method', 'GET')
+    if not isinstance(method, str) or method.upper() not in CHANNEL_METHODS:
+        raise ChannelError(f"Only {', '.join(CHANNEL_METHODS)} calls can be made over the channel", call_id)
+
+    path = message.get('path')
+    if not isinstance(path, str):
+        raise ChannelError('"path" must be a string', call_id)
+    parts = urlsplit(path)
+    if parts.scheme or parts.netloc or parts.fragment or '..' in parts.path.split('/'):
+        raise ChannelError('"path" must be a gateway path', call_id)
+    if channel_route(parts.path) is None:
+        raise ChannelError(f'{parts.path} cannot be reached over the channel', call_id)
+
+    headers = message.get('headers') or {}
+    if not isinstance(headers, dict) or not all(
+            isinstance(key, str) and isinstance(value, str) for key, value in headers.items()):
+        raise ChannelError('"headers" must map names to strings', call_id)
+
+    body = None
+    if message.get('body') is not None:
+        body = json.dumps(message['body']).encode('utf-8')
+        headers = {key: value for key, value in headers.items() if key.lower() != 'content-type'}
+        headers['Content-Type'] = 'application/json'
+    return 'request', ChannelCall(call_id, method.upper(), parts.path, parts.query, headers, body)
+
+
+def channel_response(call, status, headers, body):
+    """Response frame of a finished call (bodies embedded as in a batch result)"""
+    return {'type': 'response', **batch_result(call, status, headers, body)}
+
+
+def channel_error(call_id, status, error, message, headers=None):
+    """Response frame of a call (or message) the gateway answered itself"""
+    return {
+        'type': 'response',
+        'id': call_id,
+        'status': status,
+        'headers': dict(headers or {}),
+        'body': {'error': error, 'message': message}
+    }
@@ -0,0 +1,109 @@
+"""
+Request coalescing (single-flight) for the API Gateway.
+
+When many clients ask for the same resource at once, only the first
+request goes upstream; the others wait for it and share its result.
+SingleFlight serves the threaded Flask gateway, AsyncSingleFlight the
+aiohttp one.
+"""
+
+import asyncio
+import threading
+
+
+class _Call:
+    """An upstream call in flight and the result its waiters will share"""
+
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into one (threads)"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._stats = {'leaders': 0, 'followers': 0}
+
+    def do(self, key, fn):
+        """
+        Run fn() unless a call with the same key is already in flight,
+        in which case wait for it and return (or raise) its outcome
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self._stats['leaders'] += 1
+            else:
+                self._stats['followers'] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def stats(self):
+        """Upstream calls made (leaders) and calls saved (followers)"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = len(self._calls)
+        return stats
+
+
+class AsyncSingleFlight:
+    """Collapses concurrent calls with the same key into one (asyncio)"""
+
+    def __init__(self):
+        self._calls = {}
+        self._stats = {'leaders': 0, 'followers': 0}
+
+    async def do(self, key, fn):
+        """
+        Await fn() unless a call with the same key is already in flight,
+        in which case await that one instead
+
+        The shared call runs as its own task, so a waiter that is cancelled
+        (its client went away) does not cancel it for everyone else.
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+            self._stats['leaders'] += 1
+        else:
+            self._stats['followers'] += 1
+        return await asyncio.shield(task)
+
+    def _done(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the exception as retrieved even if every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self):
+        """Upstream calls made (leaders) and calls saved (followers)"""
+        stats = dict(self._stats)
+        stats['in_flight'] = len(self._calls)
+        return stats
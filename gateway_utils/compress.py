@@ -0,0 +1,139 @@
+"""
+Response compression for the API Gateway.
+
+Compressible responses (JSON, text, SSE) above a size threshold are
+encoded with the best coding the client accepts: brotli when the brotli
+package is installed, otherwise gzip or deflate. Responses that already
+carry a Content-Encoding are passed through untouched. Streams are
+compressed chunk by chunk, and event streams are flushed after every
+chunk so each event still reaches the client immediately.
+"""
+
+import os
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_ENABLED = os.environ.get('GATEWAY_COMPRESS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+# Smaller bodies are not worth the CPU (and may even grow)
+COMPRESS_MIN_SIZE = int(os.environ.get('GATEWAY_COMPRESS_MIN_SIZE', 1024))
+COMPRESS_LEVEL = int(os.environ.get('GATEWAY_COMPRESS_LEVEL', 6))  # zlib 1-9
+BROTLI_QUALITY = int(os.environ.get('GATEWAY_BROTLI_QUALITY', 5))  # 0-11
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'application/xml')
+
+# Preferred first when the client gives several codings the same weight
+ENCODINGS = ('br', 'gzip', 'deflate') if brotli is not None else ('gzip', 'deflate')
+
+
+def choose_encoding(accept_encoding):
+    """Best supported coding in an Accept-Encoding header (or None)"""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.lower().split(','):
+        coding, _, params = part.strip().partition(';')
+        weight = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[coding.strip()] = weight
+    best = None
+    for coding in ENCODINGS:
+        weight = weights.get(coding, weights.get('*', 0.0))
+        if weight > 0 and (best is None or weight > best[1]):
+            best = (coding, weight)
+    return best[0] if best else None
+
+
+def compressible(method, status, headers, length=None):
+    """
+    Whether a response may be compressed at all
+
+    Args:
+        method: Request method
+        status: Response status code
+        headers: Response headers (case-insensitive mapping)
+        length: Body size in bytes; taken from Content-Length when None
+    """
+    if not COMPRESS_ENABLED or method == 'HEAD' or status < 200 or status in (204, 206, 304):
+        return False
+    if headers.get('Content-Encoding') or 'no-transform' in headers.get('Cache-Control', ''):
+        return False
+    if not headers.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES):
+        return False
+    if length is None and headers.get('Content-Length'):
+        length = int(headers['Content-Length'])
+    # Unknown length means a stream - always worth it
+    return length is None or length >= COMPRESS_MIN_SIZE
+
+
+def start_compression(method, status, accept_encoding, headers, length=None):
+    """
+    Negotiate compression and update the response headers to match
+
+    Returns:
+        Compressor for the body, or None to send it as is
+    """
+    if not compressible(method, status, headers, length):
+        return None
+    vary = headers.get('Vary', '')
+    if 'accept-encoding' not in vary.lower():
+        headers['Vary'] = f'{vary}, Accept-Encoding' if vary else 'Accept-Encoding'
+    encoding = choose_encoding(accept_encoding)
+    if encoding is None:
+        return None
+    headers['Content-Encoding'] = encoding
+    headers.pop('Content-Length', None)
+    return Compressor(encoding, flush_each=headers.get('Content-Type', '').startswith('text/event-stream'))
+
+
+class Compressor:
+    """Incremental encoder for one response body"""
+
+    def __init__(self, encoding, flush_each=False):
+        self.encoding = encoding
+        # Event streams must not sit in the compressor's buffer
+        self.flush_each = flush_each
+        if encoding == 'br':
+            self._brotli = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._brotli = None
+            wbits = 16 + zlib.MAX_WBITS if encoding == 'gzip' else zlib.MAX_WBITS
+            self._zlib = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, wbits)
+
+    def compress(self, chunk):
+        """Encode a chunk; may return b'' while the encoder buffers"""
+        if self._brotli is not None:
+            data = self._brotli.process(chunk)
+            return data + self._brotli.flush() if self.flush_each else data
+        data = self._zlib.compress(chunk)
+        return data + self._zlib.flush(zlib.Z_SYNC_FLUSH) if self.flush_each else data
+
+    def finish(self):
+        """Remaining encoded bytes, ending the stream"""
+        if self._brotli is not None:
+            return self._brotli.finish()
+        return self._zlib.flush()
+
+
+def compress_stream(chunks, compressor):
+    """Encode an iterable body lazily, closing the source when done"""
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
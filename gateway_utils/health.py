@@ -0,0 +1,119 @@
+"""
+Background health monitor for the API Gateway.
+
+Probes every backend concurrently on a fixed interval and keeps the last
+results in memory, so /health answers from cache instead of waiting on
+(possibly dead) services.
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from gateway_utils.balancer import get_balancer, service_urls
+from gateway_utils.breaker import get_breaker
+from gateway_utils.pool import get_session
+
+logger = logging.getLogger('gateway')
+
+# How long a health snapshot stays fresh (seconds) - also the refresh interval
+HEALTH_CACHE_TTL = float(os.environ.get('GATEWAY_HEALTH_TTL', 5))
+# Per-service probe timeout (seconds)
+HEALTH_PROBE_TIMEOUT = float(os.environ.get('GATEWAY_HEALTH_TIMEOUT', 2))
+
+
+class HealthMonitor:
+    """Caches concurrent /health probes of all services"""
+
+    def __init__(self, services, ttl=HEALTH_CACHE_TTL, probe_timeout=HEALTH_PROBE_TIMEOUT):
+        self.services = services
+        self.ttl = ttl
+        self.probe_timeout = probe_timeout
+
+        self._snapshot = {}
+        self._ready = threading.Event()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='health-probe')
+
+    @property
+    def ready(self):
+        """True once the first round of probes has finished"""
+        return self._ready.is_set()
+
+    def probe(self, service, url):
+        """Probe a single replica and time it"""
+        start = time.perf_counter()
+        try:
+            response = get_session(service, url).get(f"{url}/health", timeout=self.probe_timeout)
+            status = 'online' if response.status_code == 200 else 'error'
+        except Exception:
+            status = 'offline'
+        if status == 'online':
+            # A passing probe is what brings an ejected replica back
+            get_balancer(service).readmit(url)
+        return {
+            'status': status,
+            'url': url,
+            'latency_ms': round((time.perf_counter() - start) * 1000, 2),
+            'checked_at': datetime.now().isoformat()
+        }
+
+    def refresh(self):
+        """Probe all replicas of all services concurrently and swap in the new snapshot"""
+        services = dict(self.services)
+        futures = {
+            key: [self._executor.submit(self.probe, service, url) for url in service_urls(service)]
+            for key, service in services.items()
+        }
+
+        snapshot = {}
+        for key, service in services.items():
+            probes = [future.result() for future in futures[key]]
+            # A service is online while at least one replica is
+            best = next((p for p in probes if p['status'] == 'online'), probes[0])
+            snapshot[key] = dict(best, url=service['url'])
+            if len(probes) > 1:
+                states = {r['url']: r for r in get_balancer(service).snapshot()}
+                snapshot[key]['replicas'] = [dict(p, **states.get(p['url'], {})) for p in probes]
+        # Replace the whole dict at once so readers never see a partial update
+        self._snapshot = snapshot
+        self._ready.set()
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception('Health refresh failed')
+            time.sleep(self.ttl)
+
+    def start(self):
+        """Start the background refresher (idempotent)"""
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='health-monitor', daemon=True)
+                self._thread.start()
+
+    def snapshot(self):
+        """
+        Latest cached status of every service
+
+        Starts the refresher on first use and waits for the first round of
+        probes at most once; afterwards this never blocks. Circuit breaker
+        state is live rather than cached.
+        """
+        if not self._ready.is_set():
+            self.start()
+            self._ready.wait(self.probe_timeout + 1)
+        snapshot = self._snapshot or {
+            key: {'status': 'unknown', 'url': service['url']}
+            for key, service in self.services.items()
+        }
+        return {
+            key: dict(entry, breaker=get_breaker(self.services[key]).snapshot())
+            for key, entry in snapshot.items()
+        }
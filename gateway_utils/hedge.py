@@ -0,0 +1,140 @@
+"""
+Hedged reads for the API Gateway.
+
+For idempotent GETs to a service with more than one replica, the gateway
+can send a second (hedge) request to another replica when the first has
+not answered within the route's observed p95 latency. Whichever replica
+answers first is used and the other request is abandoned.
+
+Hedging is opted into per service ('hedge': True in SERVICES) and capped
+by a budget: every request earns GATEWAY_HEDGE_BUDGET hedge tokens (5%
+by default) and every hedge spends one, so hedges stay a small share of
+traffic even when a whole service slows down.
+"""
+
+import os
+import threading
+from collections import OrderedDict, deque
+
+HEDGE_ENABLED = os.environ.get('GATEWAY_HEDGE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+# Hedges allowed per request, on average
+HEDGE_BUDGET = float(os.environ.get('GATEWAY_HEDGE_BUDGET', 0.05))
+# Unused budget saved up for bursts, in hedges
+HEDGE_MAX_TOKENS = float(os.environ.get('GATEWAY_HEDGE_MAX_TOKENS', 10))
+# Latency samples kept per route, and needed before a route is hedged
+HEDGE_WINDOW = int(os.environ.get('GATEWAY_HEDGE_WINDOW', 200))
+HEDGE_MIN_SAMPLES = int(os.environ.get('GATEWAY_HEDGE_MIN_SAMPLES', 20))
+# Never hedge sooner than this (seconds), however fast the route usually is
+HEDGE_MIN_DELAY = float(os.environ.get('GATEWAY_HEDGE_MIN_DELAY', 0.01))
+HEDGE_PERCENTILE = 0.95
+# Threads racing hedged reads in the Flask gateway
+HEDGE_WORKERS = int(os.environ.get('GATEWAY_HEDGE_WORKERS', 64))
+
+# Routes tracked per service - paths come from clients, so keep this bounded
+MAX_ROUTES = 256
+
+HEDGED_METHODS = ('GET', 'HEAD')
+
+
+class HedgePolicy:
+    """Per-route latency windows and the hedge budget of one service"""
+
+    def __init__(self, budget=HEDGE_BUDGET, max_tokens=HEDGE_MAX_TOKENS, window=HEDGE_WINDOW,
+                 min_samples=HEDGE_MIN_SAMPLES, min_delay=HEDGE_MIN_DELAY):
+        self.budget = budget
+        self.max_tokens = max_tokens
+        self.window = window
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+
+        self._routes = OrderedDict()  # route -> deque of seconds
+        self._tokens = 0.0
+        self._requests = 0
+        self._hedges = 0
+        self._hedges_won = 0
+        self._lock = threading.Lock()
+
+    def record(self, route, seconds):
+        """Record how long a request on the route took to answer"""
+        with self._lock:
+            samples = self._routes.get(route)
+            if samples is None:
+                samples = self._routes[route] = deque(maxlen=self.window)
+                if len(self._routes) > MAX_ROUTES:
+                    self._routes.popitem(last=False)
+            samples.append(seconds)
+
+    def delay(self, route):
+        """
+        Seconds to wait before hedging a new request on the route
+
+        Also earns the request its share of the budget. Returns None while
+        the route has too few samples to know its p95.
+        """
+        with self._lock:
+            self._requests += 1
+            self._tokens = min(self._tokens + self.budget, self.max_tokens)
+            samples = self._routes.get(route)
+            if samples is None or len(samples) < self.min_samples:
+                return None
+            self._routes.move_to_end(route)
+            ordered = sorted(samples)
+        p95 = ordered[min(int(len(ordered) * HEDGE_PERCENTILE), len(ordered) - 1)]
+        return max(p95, self.min_delay)
+
+    def spend(self):
+        """Take one hedge from the budget; False when it is used up"""
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            self._hedges += 1
+            return True
+
+    def won(self):
+        """Count a hedge that answered before the original request"""
+        with self._lock:
+            self._hedges_won += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'requests': self._requests,
+                'hedges': self._hedges,
+                'hedges_won': self._hedges_won,
+                'tokens': round(self._tokens, 2),
+                'routes': len(self._routes)
+            }
+
+
+def hedging_enabled(service, method, body=None):
+    """Whether a request may be hedged at all (idempotent, bodiless, replicated, opted in)"""
+    return (
+        HEDGE_ENABLED
+        and service.get('hedge', False)
+        and method in HEDGED_METHODS
+        and body is None
+        and len(service.get('urls') or ()) > 1
+    )
+
+
+_policies = {}
+_policies_lock = threading.Lock()
+
+
+def get_hedge_policy(service):
+    """Get (or lazily create) the hedge policy of a SERVICES entry"""
+    key = service['prefix']
+    policy = _policies.get(key)
+    if policy is None:
+        with _policies_lock:
+            policy = _policies.get(key)
+            if policy is None:
+                policy = HedgePolicy()
+                _policies[key] = policy
+    return policy
+
+
+def hedge_stats():
+    """Hedge counters of every service that has hedged reads"""
+    return {prefix: policy.stats() for prefix, policy in list(_policies.items())}
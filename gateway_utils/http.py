@@ -0,0 +1,33 @@
+"""
+HTTP helpers shared by the sync and async gateways.
+"""
+
+import os
+
+# Streaming proxy mode: request and response bodies are relayed chunk by
+# chunk instead of being buffered (and multipart re-encoded) in the gateway
+STREAM_PROXY = os.environ.get('GATEWAY_STREAM_PROXY', 'true').lower() in ('1', 'true', 'yes')
+STREAM_CHUNK_SIZE = int(os.environ.get('GATEWAY_STREAM_CHUNK_SIZE', 64 * 1024))
+
+# Headers that describe a single hop and must not be forwarded
+HOP_BY_HOP_HEADERS = {
+    'host', 'connection', 'keep-alive', 'transfer-encoding', 'te',
+    'trailer', 'upgrade', 'proxy-authenticate', 'proxy-authorization'
+}
+
+
+def filter_headers(headers, exclude=()):
+    """
+    Drop hop-by-hop headers (plus any extra names in exclude)
+
+    Args:
+        headers: Header mapping or multidict
+        exclude: Additional lower-case header names to drop
+
+    Returns:
+        Plain dict of forwardable headers
+    """
+    return {
+        key: value for key, value in headers.items()
+        if key.lower() not in HOP_BY_HOP_HEADERS and key.lower() not in exclude
+    }
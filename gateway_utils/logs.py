@@ -0,0 +1,89 @@
+"""
+Request/response logging helpers for the API Gateway.
+
+Records go through the shared structured logging setup
+(service_utils.logs), one access log line per request.
+"""
+
+import logging
+import socket
+
+logger = logging.getLogger('gateway')
+
+
+# Color codes for terminal output
+class Colors:
+    HEADER = '\033[95m'
+    OKBLUE = '\033[94m'
+    OKCYAN = '\033[96m'
+    OKGREEN = '\033[92m'
+    WARNING = '\033[93m'
+    FAIL = '\033[91m'
+    ENDC = '\033[0m'
+    BOLD = '\033[1m'
+    UNDERLINE = '\033[4m'
+
+
+def log_request(method, path, service_name=None):
+    """Log the routing decision for an incoming request (debug only)"""
+    logger.debug('Routing request', extra={'method': method, 'path': path, 'upstream': service_name})
+
+
+def log_response(status_code, time_taken, method=None, path=None):
+    """
+    Write the access log line of a finished request
+
+    Successes are sampled; client and server errors are always logged.
+    """
+    fields = {'method': method, 'path': path, 'status': status_code, 'duration_ms': round(time_taken, 2)}
+    if status_code >= 500:
+        logger.error('Request failed', extra=fields)
+    elif status_code >= 400:
+        logger.warning('Request rejected', extra=fields)
+    else:
+        logger.info('Request completed', extra=dict(fields, sample=True))
+
+
+def local_ip():
+    """LAN address of this machine (the one mobile devices should use)"""
+    try:
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            s.connect(("8.8.8.8", 80))
+            return s.getsockname()[0]
+        finally:
+            s.close()
+    except OSError:
+        return 'localhost'
+
+
+def print_banner(port, mode='sync'):
+    """Print the startup banner with the URLs to reach the gateway"""
+    ip = local_ip()
+
+    print(f"\n{Colors.BOLD}{Colors.HEADER}{'=' * 60}{Colors.ENDC}")
+    print(f"{Colors.BOLD}{Colors.OKGREEN}🚀 NeuroAid API Gateway Started ({mode} mode){Colors.ENDC}")
+    print(f"{Colors.BOLD}{Colors.HEADER}{'=' * 60}{Colors.ENDC}\n")
+
+    print(f"{Colors.BOLD}{Colors.WARNING}📱 LAN Access URLs (use on mobile devices):{Colors.ENDC}")
+    print(f"{Colors.OKCYAN}   Gateway:{Colors.ENDC} {Colors.BOLD}http://{ip}:{port}{Colors.ENDC}")
+    print(f"{Colors.OKCYAN}   Health:{Colors.ENDC}  {Colors.BOLD}http://{ip}:{port}/health{Colors.ENDC}\n")
+
+    print(f"{Colors.BOLD}{Colors.OKBLUE}💻 Localhost URLs (for this computer):{Colors.ENDC}")
+    print(f"{Colors.OKCYAN}   Gateway:{Colors.ENDC} {Colors.BOLD}http://localhost:{port}{Colors.ENDC}")
+    print(f"{Colors.OKCYAN}   Health:{Colors.ENDC}  {Colors.BOLD}http://localhost:{port}/health{Colors.ENDC}\n")
+
+    print(f"{Colors.BOLD}{Colors.OKBLUE}Service Routes:{Colors.ENDC}")
+    print(f"{Colors.OKGREEN}  ✓{Colors.ENDC} /api/main/*        → Main Flask Server (port 5000)")
+    print(f"{Colors.OKGREEN}  ✓{Colors.ENDC} /api/batch         → Batched Main Flask Server reads")
+    if mode == 'async':
+        print(f"{Colors.OKGREEN}  ✓{Colors.ENDC} /api/ws            → Multiplexed WebSocket channel")
+    print(f"{Colors.OKGREEN}  ✓{Colors.ENDC} /api/ai/chat       → AI Chatbot Service (port 5001)")
+    print(f"{Colors.OKGREEN}  ✓{Colors.ENDC} /api/ai/assessment → Stroke Assessment Service (port 5002)")
+    print(f"{Colors.OKGREEN}  ✓{Colors.ENDC} /api/ai/image      → Stroke Image Analysis Service (port 5003)\n")
+
+    print(f"{Colors.BOLD}{Colors.WARNING}🔧 Configuration for Flutter App:{Colors.ENDC}")
+    print(f"{Colors.OKCYAN}   Update api_constants.dart:{Colors.ENDC}")
+    print(f"{Colors.BOLD}   static const String _networkIp = '{ip}';{Colors.ENDC}\n")
+
+    print(f"{Colors.BOLD}{Colors.HEADER}{'=' * 60}{Colors.ENDC}\n")
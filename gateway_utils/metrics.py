@@ -0,0 +1,194 @@
+"""
+Prometheus-style metrics for the API Gateway.
+
+Recording is lock-free: every thread updates its own shard (plain dicts),
+and a scrape of /metrics sums the shards. Shards of threads that have
+exited are folded into a shared total so per-request server threads do
+not accumulate. Rendered in the Prometheus text exposition format
+(version 0.0.4) without depending on prometheus_client.
+"""
+
+import threading
+import weakref
+from bisect import bisect_left
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Latency buckets (seconds) - upper bounds, +Inf is implied
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# name -> (type, help)
+METRICS = {
+    'gateway_requests_total': ('counter', 'Requests handled by the gateway'),
+    'gateway_request_duration_seconds': ('histogram', 'Time spent handling requests'),
+    'gateway_requests_in_flight': ('gauge', 'Requests currently being handled'),
+    'gateway_request_bytes_total': ('counter', 'Request body bytes received from clients'),
+    'gateway_response_bytes_total': ('counter', 'Response body bytes sent to clients'),
+    'gateway_upstream_requests_total': ('counter', 'Responses received from upstream services'),
+    'gateway_upstream_duration_seconds': ('histogram', 'Time until an upstream service responded'),
+    'gateway_upstream_errors_total': ('counter', 'Upstream calls that failed without a response'),
+    'gateway_upstream_hedges_total': ('counter', 'Hedged reads, by which request answered first'),
+    'gateway_bulkhead_rejections_total': ('counter', 'Requests refused admission, by route class and reason'),
+    'gateway_sse_streams_total': ('counter', 'Relayed event streams, by how they ended'),
+    'gateway_sse_events_dropped_total': ('counter', 'Events dropped for clients that could not keep up'),
+    'gateway_auth_rejections_total': ('counter', 'Requests refused at the gateway for a bad bearer token'),
+    'gateway_ws_connections': ('gauge', 'WebSocket channels currently open'),
+    'gateway_ws_calls_total': ('counter', 'Calls made over WebSocket channels'),
+    'gateway_ws_call_duration_seconds': ('histogram', 'Time spent handling WebSocket channel calls')
+}
+
+# Exited threads are also folded in every this many new shards, so memory
+# stays bounded even if nobody scrapes
+_RETIRE_EVERY = 64
+
+
+def _empty_shard():
+    return {'values': {}, 'histograms': {}}
+
+
+class Metrics:
+    """Counters, gauges and histograms with per-thread aggregation"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._local = threading.local()
+        self._shards = []  # (weakref to thread, shard)
+        self._retired = _empty_shard()
+        self._lock = threading.Lock()
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = _empty_shard()
+            with self._lock:
+                self._shards.append((weakref.ref(threading.current_thread()), shard))
+                if len(self._shards) % _RETIRE_EVERY == 0:
+                    self._retire()
+            return shard
+
+    def inc(self, name, labels=(), value=1):
+        """Add to a counter or gauge; labels is a tuple of (name, value) pairs"""
+        values = self._shard()['values']
+        key = (name, labels)
+        values[key] = values.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        """Record one histogram observation"""
+        histograms = self._shard()['histograms']
+        key = (name, labels)
+        histogram = histograms.get(key)
+        if histogram is None:
+            # Bucket counts (non-cumulative, last is +Inf), sum, count
+            histogram = histograms[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        histogram[0][bisect_left(self.buckets, value)] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+    def _retire(self):
+        # Fold shards of exited threads into the shared total (lock held)
+        alive = []
+        for thread_ref, shard in self._shards:
+            thread = thread_ref()
+            if thread is not None and thread.is_alive():
+                alive.append((thread_ref, shard))
+            else:
+                self._merge(self._retired, shard)
+        self._shards = alive
+
+    @staticmethod
+    def _merge(total, shard):
+        # dict() copies are atomic under the GIL, so writers never break a scrape
+        for key, value in dict(shard['values']).items():
+            total['values'][key] = total['values'].get(key, 0) + value
+        for key, (counts, sum_, count) in dict(shard['histograms']).items():
+            counts = list(counts)
+            merged = total['histograms'].get(key)
+            if merged is None:
+                total['histograms'][key] = [counts, sum_, count]
+            else:
+                merged[0] = [a + b for a, b in zip(merged[0], counts)]
+                merged[1] += sum_
+                merged[2] += count
+
+    def collect(self):
+        """Sum of all shards: {'values': {...}, 'histograms': {...}}"""
+        with self._lock:
+            self._retire()
+            total = _empty_shard()
+            self._merge(total, self._retired)
+            for _, shard in self._shards:
+                self._merge(total, shard)
+        return total
+
+    def render(self):
+        """All metrics in the Prometheus text format"""
+        total = self.collect()
+        by_name = {}
+        for (name, labels), value in total['values'].items():
+            by_name.setdefault(name, []).append(('value', labels, value))
+        for (name, labels), histogram in total['histograms'].items():
+            by_name.setdefault(name, []).append(('histogram', labels, histogram))
+
+        lines = []
+        for name in sorted(by_name):
+            kind, help_text = METRICS.get(name, ('untyped', name))
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for sample_kind, labels, value in sorted(by_name[name], key=lambda sample: sample[1]):
+                if sample_kind == 'value':
+                    lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+                    continue
+                counts, sum_, count = value
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                    cumulative += bucket_count
+                    lines.append(f'{name}_bucket{_format_labels(labels + (("le", str(bound)),))} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(sum_)}')
+                lines.append(f'{name}_count{_format_labels(labels)} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels
+    )
+    return '{' + pairs + '}'
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+def route_label(path, services):
+    """Low-cardinality route name: the matching service prefix, or the path of a gateway endpoint"""
+    best = None
+    for service in services.values():
+        prefix = service['prefix']
+        if path == prefix or path.startswith(prefix + '/'):
+            if best is None or len(prefix) > len(best):
+                best = prefix
+    if best:
+        return best
+    return path if path in ('/health', '/metrics', '/api/batch', '/api/ws') else 'other'
+
+
+def count_stream(chunks, labels):
+    """Pass an iterable body through, counting the bytes sent"""
+    try:
+        for chunk in chunks:
+            metrics.inc('gateway_response_bytes_total', labels, len(chunk))
+            yield chunk
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+# Shared by the proxy code and both engines
+metrics = Metrics()
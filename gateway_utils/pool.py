@@ -0,0 +1,134 @@
+"""
+Upstream connection pools for the API Gateway.
+
+Each backend URL gets one keep-alive requests.Session with a bounded
+connection pool, so proxied calls reuse TCP connections instead of
+paying a fresh handshake (and an ephemeral port) per request.
+"""
+
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Defaults used when a SERVICES entry does not override them
+DEFAULT_POOL_SIZE = 20
+DEFAULT_IDLE_TIMEOUT = 60  # seconds
+
+# How long a retired backend's requests (and streams) may keep running
+# before its pool is closed anyway
+DRAIN_TIMEOUT = float(os.environ.get('GATEWAY_DRAIN_TIMEOUT', 300))
+DRAIN_POLL_INTERVAL = 0.5
+
+
+class UpstreamPool:
+    """Keep-alive session for a single backend URL"""
+
+    def __init__(self, base_url, pool_size=DEFAULT_POOL_SIZE, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+
+        # pool_block=True caps the number of open sockets at pool_size;
+        # extra callers wait for a free connection instead of opening more
+        self.adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            pool_block=True,
+            max_retries=0
+        )
+        self.session = requests.Session()
+        # Backends are on the local network - skip proxy/.netrc lookups per request
+        self.session.trust_env = False
+        # Only forward the client's own Accept-Encoding - bodies are relayed
+        # without decoding, so the client must understand the encoding
+        del self.session.headers['Accept-Encoding']
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+
+        self._lock = threading.Lock()
+        self._last_used = time.monotonic()
+
+    def get_session(self):
+        """
+        Return the pooled session, dropping idle sockets first if the pool
+        has not been used for longer than idle_timeout (the backend has
+        most likely closed them on its side by then).
+        """
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_used > self.idle_timeout:
+                self.adapter.close()
+            self._last_used = now
+        return self.session
+
+    def close(self):
+        """Close every connection held by this pool"""
+        self.session.close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(service, url=None):
+    """
+    Get (or lazily create) the pool for a service backend
+
+    Args:
+        service: SERVICES entry (may define 'pool_size' and 'pool_idle_timeout')
+        url: Backend URL, defaults to the service's 'url'
+
+    Returns:
+        UpstreamPool for that backend
+    """
+    url = url or service['url']
+    pool = _pools.get(url)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(url)
+            if pool is None:
+                pool = UpstreamPool(
+                    url,
+                    pool_size=service.get('pool_size', DEFAULT_POOL_SIZE),
+                    idle_timeout=service.get('pool_idle_timeout', DEFAULT_IDLE_TIMEOUT)
+                )
+                _pools[url] = pool
+    return pool
+
+
+def get_session(service, url=None):
+    """Shortcut for get_pool(service, url).get_session()"""
+    return get_pool(service, url).get_session()
+
+
+def retire_pool(url, replicas=(), timeout=DRAIN_TIMEOUT):
+    """
+    Stop handing out a backend's pool and close it once drained
+
+    New requests get a fresh pool; the old one is closed in the background
+    when the given replicas have no requests left in flight (or after
+    timeout seconds).
+    """
+    with _pools_lock:
+        pool = _pools.pop(url, None)
+    if pool is None:
+        return
+
+    def drain():
+        deadline = time.monotonic() + timeout
+        while any(replica.outstanding for replica in replicas) and time.monotonic() < deadline:
+            time.sleep(DRAIN_POLL_INTERVAL)
+        pool.close()
+
+    threading.Thread(target=drain, name='pool-drain', daemon=True).start()
+
+
+def close_all():
+    """Close every upstream pool"""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
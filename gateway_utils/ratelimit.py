@@ -0,0 +1,136 @@
+"""
+Token-bucket rate limiting for the API Gateway.
+
+Every client gets one bucket per limited route prefix. Clients are
+identified by the user id in their (signature-checked) JWT, falling back
+to their IP address. Buckets that have been idle long enough to refill
+completely are dropped, so memory only grows with recently active clients.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from gateway_utils.auth import token_claims
+
+RATE_LIMIT_ENABLED = os.environ.get('GATEWAY_RATE_LIMIT_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+# Hard cap on tracked buckets; the least recently used go first
+RATE_LIMIT_MAX_KEYS = int(os.environ.get('GATEWAY_RATE_LIMIT_MAX_KEYS', 100000))
+# How often idle buckets are swept (seconds)
+RATE_LIMIT_SWEEP_INTERVAL = float(os.environ.get('GATEWAY_RATE_LIMIT_SWEEP_INTERVAL', 60))
+
+# Limited route prefixes (gateway paths)
+# rate: tokens added per second
+# burst: bucket size (requests allowed back to back)
+# Override with GATEWAY_RATE_LIMITS='{"/api/ai/chat": {"rate": 1, "burst": 20}}'
+RATE_LIMITS = {
+    '/api/main': {'rate': 20, 'burst': 100},
+    '/api/ai/chat': {'rate': 0.5, 'burst': 10},
+    '/api/ai/assessment': {'rate': 1, 'burst': 20},
+    '/api/ai/image': {'rate': 0.1, 'burst': 5}
+}
+if os.environ.get('GATEWAY_RATE_LIMITS'):
+    RATE_LIMITS = json.loads(os.environ['GATEWAY_RATE_LIMITS'])
+
+
+def client_key(authorization, remote_addr):
+    """
+    Identity a request is limited under
+
+    Args:
+        authorization: Authorization header value (may be None)
+        remote_addr: Client IP address
+
+    Returns:
+        'user:<id>' for a valid, unexpired bearer token, else 'ip:<address>'
+    """
+    claims = token_claims(authorization)
+    if claims is not None and claims.get('id') is not None:
+        return f"user:{claims['id']}"
+    return f'ip:{remote_addr}'
+
+
+class RateLimiter:
+    """Thread-safe per-client, per-route token buckets"""
+
+    def __init__(self, rules=None, max_keys=RATE_LIMIT_MAX_KEYS,
+                 sweep_interval=RATE_LIMIT_SWEEP_INTERVAL, enabled=RATE_LIMIT_ENABLED):
+        self.rules = RATE_LIMITS if rules is None else rules
+        self.max_keys = max_keys
+        self.sweep_interval = sweep_interval
+        self.enabled = enabled
+
+        self._buckets = OrderedDict()  # (prefix, client) -> [tokens, updated_at]
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+        self._stats = {'allowed': 0, 'limited': 0}
+
+    def rule_for(self, path):
+        """Longest matching (prefix, rule) for a gateway path (or None)"""
+        if not self.enabled:
+            return None
+        best = None
+        for prefix, rule in self.rules.items():
+            if path == prefix or path.startswith(prefix + '/'):
+                if best is None or len(prefix) > len(best[0]):
+                    best = (prefix, rule)
+        return best
+
+    def check(self, path, client):
+        """
+        Take a token for a request
+
+        Returns:
+            0 if the request may proceed, otherwise the whole number of
+            seconds until a token is available (for Retry-After)
+        """
+        match = self.rule_for(path)
+        if match is None:
+            return 0
+        prefix, rule = match
+        rate, burst = rule['rate'], rule['burst']
+        key = (prefix, client)
+        now = time.monotonic()
+
+        with self._lock:
+            if now - self._last_sweep > self.sweep_interval:
+                self._sweep(now)
+
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = [burst, now]
+                self._buckets[key] = bucket
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+                self._buckets.move_to_end(key)
+
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                self._stats['allowed'] += 1
+                return 0
+            self._stats['limited'] += 1
+            return max(math.ceil((1 - bucket[0]) / rate), 1)
+
+    def _sweep(self, now):
+        # A bucket idle long enough to refill is the same as a new one
+        idle = []
+        for key, (tokens, updated_at) in self._buckets.items():
+            rule = self.rules.get(key[0])
+            if rule is None or tokens + (now - updated_at) * rule['rate'] >= rule['burst']:
+                idle.append(key)
+        for key in idle:
+            del self._buckets[key]
+        self._last_sweep = now
+
+    def stats(self):
+        """Allowed/limited counters and tracked bucket count"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['buckets'] = len(self._buckets)
+        return stats
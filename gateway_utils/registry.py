@@ -0,0 +1,327 @@
+"""
+Hot-reloadable service registry for the API Gateway.
+
+SERVICES starts out with the built-in entries of gateway_utils/services.py.
+When the registry file (GATEWAY_SERVICES_FILE, default gateway_services.json
+in the repository root) exists, its entries are laid over them, e.g.
+
+    {
+        "ai_image": {"urls": ["http://127.0.0.1:5003", "http://127.0.0.1:5013"]},
+        "main": {"pool_size": 80, "breaker": {"slow_call_seconds": 8}}
+    }
+
+The file is polled for changes, and can also be reloaded or replaced at
+runtime through the local admin endpoints (/admin/services). A new
+registry is validated as a whole before anything changes; invalid files
+are rejected and the running registry is kept. Each service entry is
+then swapped with a single assignment, so a request sees either the old
+or the new entry, never a mix.
+
+Removed replicas stop receiving new requests at once. Their connection
+pools (and pools whose settings changed) are closed only when the
+requests already running on them - streams included - have finished,
+or after GATEWAY_DRAIN_TIMEOUT seconds. Changed breaker settings start
+the service's breaker afresh.
+"""
+
+import copy
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlsplit
+
+from gateway_utils.balancer import get_balancer, service_urls
+from gateway_utils.breaker import BREAKER_DEFAULTS, drop_breaker
+
+logger = logging.getLogger('gateway')
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVICES_FILE = os.environ.get('GATEWAY_SERVICES_FILE', os.path.join(ROOT_DIR, 'gateway_services.json'))
+# Seconds between checks of the registry file's modification time
+SERVICES_POLL_INTERVAL = float(os.environ.get('GATEWAY_SERVICES_POLL_INTERVAL', 2))
+
+# Admin endpoints only answer local callers, and also require this bearer token when set
+ADMIN_ENABLED = os.environ.get('GATEWAY_ADMIN_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+ADMIN_TOKEN = os.environ.get('GATEWAY_ADMIN_TOKEN', '')
+LOCAL_ADDRESSES = ('127.0.0.1', '::1', '::ffff:127.0.0.1')
+
+SERVICE_FIELDS = ('name', 'url', 'urls', 'prefix', 'pool_size', 'pool_idle_timeout', 'breaker', 'hedge')
+# Settings that live in the connection pool - changing them replaces the pools
+POOL_FIELDS = ('pool_size', 'pool_idle_timeout')
+
+
+class RegistryError(ValueError):
+    """Raised for a registry that fails validation"""
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _url_problem(url):
+    if not isinstance(url, str):
+        return f'{url!r} is not a string'
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.netloc:
+        return f'{url!r} is not an http(s) URL'
+    if parts.path not in ('', '/') or parts.query or parts.fragment:
+        return f'{url!r} must not have a path, query or fragment'
+    return None
+
+
+def _entry_problems(key, entry, default):
+    problems = []
+    if not isinstance(entry.get('name'), str) or not entry['name']:
+        problems.append(f'{key}.name must be a non-empty string')
+    if entry.get('prefix') != default['prefix']:
+        # Routes are registered once at startup, so prefixes are fixed
+        problems.append(f"{key}.prefix cannot be changed from {default['prefix']}")
+
+    urls = entry.get('urls') if 'urls' in entry else [entry.get('url')]
+    if not isinstance(urls, list) or not urls:
+        problems.append(f'{key}.urls must be a non-empty list')
+    else:
+        problems.extend(f'{key}: {problem}' for problem in map(_url_problem, urls) if problem)
+        if len(set(map(str, urls))) != len(urls):
+            problems.append(f'{key}.urls contains duplicates')
+
+    pool_size = entry.get('pool_size', 1)
+    if not isinstance(pool_size, int) or isinstance(pool_size, bool) or pool_size < 1:
+        problems.append(f'{key}.pool_size must be a positive integer')
+    idle_timeout = entry.get('pool_idle_timeout', 1)
+    if not _is_number(idle_timeout) or idle_timeout <= 0:
+        problems.append(f'{key}.pool_idle_timeout must be a positive number')
+
+    if not isinstance(entry.get('hedge', False), bool):
+        problems.append(f'{key}.hedge must be true or false')
+
+    breaker = entry.get('breaker', {})
+    if not isinstance(breaker, dict):
+        problems.append(f'{key}.breaker must be an object')
+    else:
+        for name, value in breaker.items():
+            if name not in BREAKER_DEFAULTS:
+                problems.append(f'{key}.breaker.{name} is not a breaker setting')
+            elif not _is_number(value) or value <= 0:
+                problems.append(f'{key}.breaker.{name} must be a positive number')
+            elif name.endswith('_rate') and value > 1:
+                problems.append(f'{key}.breaker.{name} must be at most 1')
+            elif name in ('window', 'min_calls', 'half_open_probes') and not isinstance(value, int):
+                problems.append(f'{key}.breaker.{name} must be an integer')
+    return problems
+
+
+def build_services(defaults, overrides):
+    """
+    Lay registry overrides over the default entries and validate the result
+
+    Args:
+        defaults: Built-in SERVICES entries
+        overrides: {service key: partial entry} as read from the registry
+
+    Returns:
+        Complete SERVICES dict
+
+    Raises:
+        RegistryError listing every problem found
+    """
+    if not isinstance(overrides, dict):
+        raise RegistryError('The service registry must be a JSON object keyed by service')
+
+    problems = [
+        f"{key}: unknown service (known: {', '.join(defaults)})"
+        for key in overrides if key not in defaults
+    ]
+    services = {}
+    for key, default in defaults.items():
+        override = overrides.get(key, {})
+        if not isinstance(override, dict):
+            problems.append(f'{key} must be an object')
+            continue
+        problems.extend(f'{key}.{field} is not a service setting' for field in override if field not in SERVICE_FIELDS)
+
+        entry = copy.deepcopy(default)
+        if 'url' in override or 'urls' in override:
+            # A new url replaces the replica list and vice versa
+            entry.pop('url', None)
+            entry.pop('urls', None)
+        override = copy.deepcopy(override)
+        if isinstance(override.get('breaker'), dict):
+            override['breaker'] = dict(entry.get('breaker', {}), **override['breaker'])
+        entry.update(override)
+
+        entry_problems = _entry_problems(key, entry, default)
+        if entry_problems:
+            problems.extend(entry_problems)
+            continue
+        if 'urls' in entry:
+            entry['urls'] = [url.rstrip('/') for url in entry['urls']]
+            entry['url'] = entry['urls'][0]
+        else:
+            entry['url'] = entry['url'].rstrip('/')
+        entry['key'] = key
+        services[key] = entry
+
+    if problems:
+        raise RegistryError('; '.join(problems))
+    return services
+
+
+def admin_denied(remote_addr, authorization):
+    """Reason to refuse an admin request, or None when it is allowed"""
+    if not ADMIN_ENABLED:
+        return 'The admin endpoints are disabled'
+    if remote_addr not in LOCAL_ADDRESSES:
+        return 'The admin endpoints only accept local requests'
+    if ADMIN_TOKEN and not hmac.compare_digest(authorization or '', f'Bearer {ADMIN_TOKEN}'):
+        return 'A valid admin token is required'
+    return None
+
+
+class ServiceRegistry:
+    """Keeps a SERVICES dict in sync with the registry file"""
+
+    def __init__(self, services, retire, path=SERVICES_FILE, poll_interval=SERVICES_POLL_INTERVAL):
+        """
+        Args:
+            services: The shared SERVICES dict - updated in place
+            retire: retire(url, replicas) closes a backend's connection
+                pool once the given replicas have drained
+            path: Registry file
+            poll_interval: Seconds between checks of the file
+        """
+        self.services = services
+        self.defaults = copy.deepcopy(services)
+        self.retire = retire
+        self.path = path
+        self.poll_interval = poll_interval
+
+        self.version = 0
+        self.source = 'defaults'
+        self.last_reload = None
+        self.last_error = None
+        self._mtime = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def apply(self, overrides, source):
+        """
+        Validate a registry and switch to it
+
+        Returns:
+            Keys of the services that changed
+
+        Raises:
+            RegistryError when the registry is invalid (nothing changes)
+        """
+        try:
+            services = build_services(self.defaults, overrides)
+        except RegistryError as e:
+            self.last_error = str(e)
+            raise
+
+        with self._lock:
+            changed = [key for key, entry in services.items() if entry != self.services[key]]
+            for key in changed:
+                self._swap(self.services[key], services[key])
+            self.version += 1
+            self.source = source
+            self.last_reload = datetime.now().isoformat()
+            self.last_error = None
+
+        logger.info('Service registry reloaded', extra={
+            'source': source,
+            'version': self.version,
+            'changed': changed
+        })
+        return changed
+
+    def _swap(self, old, new):
+        # Stop routing to removed replicas first, then publish the new entry
+        removed = get_balancer(old).update(service_urls(new))
+        if new.get('breaker') != old.get('breaker'):
+            drop_breaker(old)
+        self.services[new['key']] = new
+
+        for replica in removed:
+            self.retire(replica.url, [replica])
+        if any(new.get(field) != old.get(field) for field in POOL_FIELDS):
+            # Kept replicas get fresh pools with the new settings
+            balancer = get_balancer(new)
+            for replica in list(balancer.replicas):
+                self.retire(replica.url, [replica])
+
+    def read_file(self):
+        """Overrides from the registry file ({} when there is none)"""
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def reload_file(self):
+        """
+        Re-read the registry file and apply it
+
+        Raises:
+            OSError or ValueError (including RegistryError) when the file
+            cannot be read or is invalid - the current registry stays
+        """
+        try:
+            overrides = self.read_file()
+        except (OSError, ValueError) as e:
+            self.last_error = f'{self.path}: {e}'
+            raise
+        return self.apply(overrides, source=self.path if os.path.exists(self.path) else 'defaults')
+
+    def check_file(self):
+        """Reload if the registry file appeared, changed or went away since the last check"""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        self._mtime = mtime
+        try:
+            self.reload_file()
+        except (OSError, ValueError) as e:
+            logger.error('Service registry not reloaded', extra={'error': str(e)})
+
+    def _run(self):
+        while True:
+            time.sleep(self.poll_interval)
+            self.check_file()
+
+    def watch(self):
+        """Poll the registry file in a background thread (idempotent)"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='service-registry', daemon=True)
+                self._thread.start()
+
+    def status(self):
+        """Current registry for the admin endpoint"""
+        return {
+            'version': self.version,
+            'source': self.source,
+            'file': self.path,
+            'last_reload': self.last_reload,
+            'last_error': self.last_error,
+            'services': {
+                key: {
+                    'name': service['name'],
+                    'prefix': service['prefix'],
+                    'urls': service_urls(service),
+                    'pool_size': service.get('pool_size'),
+                    'pool_idle_timeout': service.get('pool_idle_timeout'),
+                    'breaker': service.get('breaker', {}),
+                    'hedge': service.get('hedge', False),
+                    'replicas': get_balancer(service).snapshot()
+                }
+                for key, service in self.services.items()
+            }
+        }
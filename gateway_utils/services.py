@@ -0,0 +1,59 @@
+"""
+Service registry shared by the sync (Flask) and async gateways.
+"""
+
+import os
+
+# Service configuration
+# Using localhost since all services run on the same machine as the gateway
+# The gateway itself listens on 0.0.0.0 for LAN access
+# pool_size / pool_idle_timeout tune the keep-alive connection pool per service
+# breaker overrides the circuit breaker defaults (see gateway_utils/breaker.py);
+# slow_call_seconds is how long a response may take before it counts as slow
+# A service may run several replicas: list them under 'urls' (load balanced),
+# or set GATEWAY_<KEY>_URLS=http://host:port,http://host:port (e.g. GATEWAY_AI_IMAGE_URLS)
+# hedge lets slow GETs be retried on a second replica (see gateway_utils/hedge.py)
+# These are the defaults: the registry file (see gateway_utils/registry.py) can
+# override any entry at runtime, without restarting the gateway
+SERVICES = {
+    'main': {
+        'name': 'Main Flask Server',
+        'url': 'http://127.0.0.1:5000',
+        'prefix': '/api/main',
+        'pool_size': 50,
+        'pool_idle_timeout': 60,
+        'breaker': {'slow_call_seconds': 5},
+        'hedge': True
+    },
+    'ai_chatbot': {
+        'name': 'AI Chatbot Service',
+        'url': 'http://127.0.0.1:5001',
+        'prefix': '/api/ai/chat',
+        'pool_size': 20,
+        'pool_idle_timeout': 60,
+        'breaker': {'slow_call_seconds': 30}
+    },
+    'ai_assessment': {
+        'name': 'Stroke Assessment Service',
+        'url': 'http://127.0.0.1:5002',
+        'prefix': '/api/ai/assessment',
+        'pool_size': 20,
+        'pool_idle_timeout': 60,
+        'breaker': {'slow_call_seconds': 5}
+    },
+    'ai_image': {
+        'name': 'Stroke Image Analysis Service',
+        'url': 'http://127.0.0.1:5003',
+        'prefix': '/api/ai/image',
+        'pool_size': 10,
+        'pool_idle_timeout': 60,
+        'breaker': {'slow_call_seconds': 20}
+    }
+}
+
+for _key, _service in SERVICES.items():
+    _service['key'] = _key
+    _urls = os.environ.get(f'GATEWAY_{_key.upper()}_URLS')
+    if _urls:
+        _service['urls'] = [url.strip() for url in _urls.split(',') if url.strip()]
+        _service['url'] = _service['urls'][0]
@@ -0,0 +1,168 @@
+"""
+Server-Sent Events relaying for the API Gateway.
+
+Chat streams are relayed event by event through a small per-stream
+buffer instead of straight from the upstream socket:
+
+- The upstream is read into a buffer of at most GATEWAY_SSE_BUFFER_EVENTS
+  events. When a slow client lets it fill up, reading pauses for up to
+  GATEWAY_SSE_SLOW_CLIENT_TIMEOUT seconds; after that the slow-client
+  policy applies: 'close' ends the stream, 'drop' discards events that
+  do not fit until the client catches up.
+- A comment frame (": keep-alive") is sent whenever the upstream has been
+  quiet for GATEWAY_SSE_HEARTBEAT_INTERVAL seconds. It keeps proxies from
+  timing the stream out and, since only a write notices a closed socket,
+  is what detects clients that have gone away.
+- When the client goes away or is cut off, the upstream request is
+  aborted at once, so the chatbot stops generating for nobody. A client
+  cut off as too slow has its connection shut down as well, since its
+  writer may be stuck waiting on it.
+
+Events are only ever dropped whole, and heartbeats only sent between
+events, so the client always sees well-formed SSE.
+"""
+
+import os
+import queue
+import threading
+import time
+
+from gateway_utils.metrics import metrics
+
+SSE_BUFFER_EVENTS = int(os.environ.get('GATEWAY_SSE_BUFFER_EVENTS', 64))
+SSE_HEARTBEAT_INTERVAL = float(os.environ.get('GATEWAY_SSE_HEARTBEAT_INTERVAL', 15))
+SSE_SLOW_CLIENT_TIMEOUT = float(os.environ.get('GATEWAY_SSE_SLOW_CLIENT_TIMEOUT', 10))
+# 'close' or 'drop'
+SSE_SLOW_CLIENT_POLICY = os.environ.get('GATEWAY_SSE_SLOW_CLIENT_POLICY', 'close').lower()
+
+HEARTBEAT = b': keep-alive\n\n'
+
+# Stream outcomes for gateway_sse_streams_total
+COMPLETE = 'complete'
+CLIENT_GONE = 'client_gone'
+SLOW_CLIENT = 'slow_client'
+UPSTREAM_ERROR = 'upstream_error'
+
+_END = object()
+
+
+def is_event_stream(content_type):
+    return (content_type or '').split(';')[0].strip().lower() == 'text/event-stream'
+
+
+class EventSplitter:
+    """Cuts a byte stream into complete SSE events (each ending in a blank line)"""
+
+    def __init__(self):
+        self._buffer = b''
+
+    def feed(self, chunk):
+        """Add upstream bytes; returns the events they complete"""
+        self._buffer += chunk
+        events = []
+        while True:
+            # Events end with a blank line in any of the three SSE line endings
+            ends = [
+                (index, len(separator)) for separator in (b'\n\n', b'\r\n\r\n', b'\r\r')
+                for index in (self._buffer.find(separator),) if index != -1
+            ]
+            if not ends:
+                return events
+            index, length = min(ends)
+            events.append(self._buffer[:index + length])
+            self._buffer = self._buffer[index + length:]
+
+    def flush(self):
+        """Whatever is left when the upstream ends (an unterminated last event)"""
+        tail, self._buffer = self._buffer, b''
+        return tail
+
+
+def record_stream(outcome, dropped):
+    metrics.inc('gateway_sse_streams_total', (('outcome', outcome),))
+    if dropped:
+        metrics.inc('gateway_sse_events_dropped_total', (), dropped)
+
+
+def relay_events(chunks, abort, cut_off=None, buffer_events=SSE_BUFFER_EVENTS,
+                 heartbeat_interval=SSE_HEARTBEAT_INTERVAL, slow_client_timeout=SSE_SLOW_CLIENT_TIMEOUT,
+                 policy=SSE_SLOW_CLIENT_POLICY):
+    """
+    Relay an upstream SSE body to a WSGI client through a bounded buffer
+
+    A reader thread pulls the upstream while this generator feeds the
+    client, so heartbeats can go out while the upstream is quiet.
+
+    Args:
+        chunks: Iterator over the upstream body
+        abort: Callable that cuts the upstream connection - must also
+            unblock a read in progress on another thread
+        cut_off: Optional callable that shuts the client connection,
+            unblocking a write to a client that stopped reading
+
+    Yields:
+        Complete events and heartbeat frames
+    """
+    events = queue.Queue(maxsize=buffer_events)
+    stopped = threading.Event()
+    state = {'outcome': None, 'dropped': 0}
+
+    def offer(item):
+        # False when the stream is over (client gone, or cut off as too slow)
+        deadline = time.monotonic() + slow_client_timeout
+        while not stopped.is_set():
+            try:
+                events.put(item, timeout=min(max(deadline - time.monotonic(), 0), heartbeat_interval))
+                return True
+            except queue.Full:
+                if item is not _END and policy == 'drop':
+                    state['dropped'] += 1
+                    return True
+                if time.monotonic() >= deadline:
+                    state['outcome'] = state['outcome'] or SLOW_CLIENT
+                    stopped.set()
+                    abort()
+                    if cut_off is not None:
+                        cut_off()
+                    return False
+        return False
+
+    def read():
+        splitter = EventSplitter()
+        try:
+            for chunk in chunks:
+                for event in splitter.feed(chunk):
+                    if not offer(event):
+                        return
+            tail = splitter.flush()
+            if tail and not offer(tail):
+                return
+        except Exception:
+            if stopped.is_set():
+                # Aborted because the client went away
+                return
+            state['outcome'] = UPSTREAM_ERROR
+        offer(_END)
+
+    reader = threading.Thread(target=read, name='sse-relay', daemon=True)
+    reader.start()
+    try:
+        while not stopped.is_set():
+            try:
+                item = events.get(timeout=heartbeat_interval)
+            except queue.Empty:
+                yield HEARTBEAT
+                continue
+            if item is _END:
+                state['outcome'] = state['outcome'] or COMPLETE
+                break
+            yield item
+    except GeneratorExit:
+        # The server closed the response: the client went away
+        state['outcome'] = state['outcome'] or CLIENT_GONE
+        raise
+    finally:
+        stopped.set()
+        if state['outcome'] != COMPLETE:
+            abort()
+        record_stream(state['outcome'] or CLIENT_GONE, state['dropped'])
@@ -0,0 +1,134 @@
+"""
+Adaptive upstream timeouts for the API Gateway.
+
+Each call site passes its usual fixed timeout (30 s, or 60 s for AI
+inference), which stays the ceiling. Once a route has enough latency
+samples, the gateway instead gives up after the route's observed p99
+times GATEWAY_TIMEOUT_FACTOR, so a stuck backend call frees its worker
+and connection in seconds rather than after the full ceiling. The
+timeout never drops below GATEWAY_TIMEOUT_MIN.
+
+Calls that time out are recorded at the timeout they hit, so when a
+backend slows down for real its timeouts widen again (up to the ceiling)
+instead of failing every request.
+
+A caller's own budget (X-Request-Timeout-Ms, see service_utils.tracing)
+cuts the timeout further, and the gateway forwards the timeout it chose
+so the backend knows when the gateway stops waiting.
+"""
+
+import os
+import threading
+from collections import OrderedDict, deque
+
+ADAPTIVE_TIMEOUTS = os.environ.get('GATEWAY_ADAPTIVE_TIMEOUTS', 'true').lower() in ('1', 'true', 'yes')
+# Timeout = p99 latency of the route x this factor
+TIMEOUT_FACTOR = float(os.environ.get('GATEWAY_TIMEOUT_FACTOR', 3))
+# Never time out sooner than this (seconds)
+TIMEOUT_MIN = float(os.environ.get('GATEWAY_TIMEOUT_MIN', 2))
+# Latency samples kept per route, and needed before its timeout adapts
+TIMEOUT_WINDOW = int(os.environ.get('GATEWAY_TIMEOUT_WINDOW', 500))
+TIMEOUT_MIN_SAMPLES = int(os.environ.get('GATEWAY_TIMEOUT_MIN_SAMPLES', 50))
+TIMEOUT_PERCENTILE = 0.99
+
+# Routes tracked per service - paths come from clients, so keep this bounded
+MAX_ROUTES = 256
+
+
+def upstream_route(method, path):
+    """Route a latency sample belongs to, e.g. GET /api/doctors/3 -> GET /api/doctors"""
+    return f"{method} {'/'.join(path.rstrip('/').split('/')[:3]) or '/'}"
+
+
+class TimeoutPolicy:
+    """Per-route latency windows and the timeouts derived from them for one service"""
+
+    def __init__(self, factor=TIMEOUT_FACTOR, minimum=TIMEOUT_MIN, window=TIMEOUT_WINDOW,
+                 min_samples=TIMEOUT_MIN_SAMPLES):
+        self.factor = factor
+        self.minimum = minimum
+        self.window = window
+        self.min_samples = min_samples
+
+        self._routes = OrderedDict()  # route -> deque of seconds
+        self._timeouts = 0
+        self._lock = threading.Lock()
+
+    def record(self, route, seconds):
+        """Record how long a call on the route took to answer (or the timeout it hit)"""
+        with self._lock:
+            samples = self._routes.get(route)
+            if samples is None:
+                samples = self._routes[route] = deque(maxlen=self.window)
+                if len(self._routes) > MAX_ROUTES:
+                    self._routes.popitem(last=False)
+            samples.append(seconds)
+
+    def timed_out(self, route, seconds):
+        """Record a call that hit its adaptive timeout"""
+        with self._lock:
+            self._timeouts += 1
+        self.record(route, seconds)
+
+    def _p99(self, samples):
+        ordered = sorted(samples)
+        return ordered[min(int(len(ordered) * TIMEOUT_PERCENTILE), len(ordered) - 1)]
+
+    def timeout(self, route, ceiling):
+        """
+        Seconds to wait for a call on the route
+
+        Args:
+            route: upstream_route() of the call
+            ceiling: The call's fixed timeout - returned as is until the
+                route has enough samples, and never exceeded
+        """
+        if not ADAPTIVE_TIMEOUTS:
+            return ceiling
+        with self._lock:
+            samples = self._routes.get(route)
+            if samples is None or len(samples) < self.min_samples:
+                return ceiling
+            self._routes.move_to_end(route)
+            samples = list(samples)
+        return min(max(self._p99(samples) * self.factor, self.minimum), ceiling)
+
+    def stats(self):
+        with self._lock:
+            routes = {route: list(samples) for route, samples in self._routes.items()}
+            timeouts = self._timeouts
+        return {
+            'timeouts': timeouts,
+            'routes': {
+                route: {
+                    'samples': len(samples),
+                    'p99': round(self._p99(samples), 3),
+                    # Before each call's own ceiling is applied
+                    'timeout': round(max(self._p99(samples) * self.factor, self.minimum), 3)
+                    if len(samples) >= self.min_samples else None
+                }
+                for route, samples in routes.items()
+            }
+        }
+
+
+_policies = {}
+_policies_lock = threading.Lock()
+
+
+def get_timeout_policy(service):
+    """Get (or lazily create) the timeout policy of a SERVICES entry"""
+    key = service['prefix']
+    policy = _policies.get(key)
+    if policy is None:
+        with _policies_lock:
+            policy = _policies.get(key)
+            if policy is None:
+                policy = TimeoutPolicy()
+                _policies[key] = policy
+    return policy
+
+
+def timeout_stats():
+    """Adaptive timeout state of every service that has been called"""
+    return {prefix: policy.stats() for prefix, policy in list(_policies.items())}
@@ -0,0 +1,86 @@
+"""
+Verified caller identity passed from the gateway to the services behind it.
+
+Once the gateway has verified a request's JWT it forwards the token's
+claims in an X-Gateway-Identity header, signed with a secret shared by
+the gateway and the services (GATEWAY_IDENTITY_SECRET). A service that
+finds a valid signature can use the claims as they are instead of
+decoding the JWT again.
+
+The header is only trusted when the secret is set, and only for
+GATEWAY_IDENTITY_TTL seconds after it was signed (never past the token's
+own expiry). The gateway drops any copy of the header sent by a client.
+
+    X-Gateway-Identity: <base64url(JSON claims)>.<base64url(HMAC-SHA256)>
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+
+IDENTITY_HEADER = 'X-Gateway-Identity'
+# Unset: no identity is forwarded, and none is trusted
+IDENTITY_SECRET = os.getenv('GATEWAY_IDENTITY_SECRET', '')
+IDENTITY_TTL = int(os.getenv('GATEWAY_IDENTITY_TTL', 60))
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def _signature(payload, secret):
+    return _b64encode(hmac.new(secret.encode('utf-8'), payload.encode('ascii'), hashlib.sha256).digest())
+
+
+def sign_identity(claims, secret=IDENTITY_SECRET):
+    """
+    Header value carrying verified token claims
+
+    Args:
+        claims: Decoded JWT payload (id, email, role, exp)
+        secret: Shared identity secret
+
+    Returns:
+        Signed header value, or None when no secret is configured
+    """
+    if not secret:
+        return None
+    payload = _b64encode(json.dumps(dict(claims, iat=int(time.time())), separators=(',', ':')).encode('utf-8'))
+    return f'{payload}.{_signature(payload, secret)}'
+
+
+def verify_identity(value, secret=IDENTITY_SECRET, ttl=IDENTITY_TTL):
+    """
+    Claims from a signed identity header
+
+    Returns:
+        The claims (without the signing time), or None when the header is
+        missing, forged, stale or no secret is configured
+    """
+    if not secret or not value or '.' not in value:
+        return None
+    payload, signature = value.rsplit('.', 1)
+    if not hmac.compare_digest(signature, _signature(payload, secret)):
+        return None
+    try:
+        claims = json.loads(_b64decode(payload))
+    except ValueError:
+        return None
+    if not isinstance(claims, dict):
+        return None
+
+    now = time.time()
+    issued_at = claims.pop('iat', None)
+    if not isinstance(issued_at, (int, float)) or not issued_at - 5 <= now <= issued_at + ttl:
+        return None
+    expires = claims.get('exp')
+    if isinstance(expires, (int, float)) and expires <= now:
+        return None
+    return claims
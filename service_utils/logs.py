@@ -0,0 +1,173 @@
+"""
+Structured, non-blocking logging shared by every NeuroAid service.
+
+Loggers only put records on an in-memory queue; a background listener
+thread formats them (JSON lines by default) and writes them to stdout,
+so log I/O never runs on a request thread. If the queue fills up, new
+records are dropped rather than blocking the caller.
+
+Records logged while a request is being traced (see service_utils.tracing)
+carry its request_id.
+
+Routine success logs can be sampled: records logged with
+extra={'sample': True}, and the access logs of the dev servers, are kept
+with probability LOG_SAMPLE_RATE. Warnings and errors are always kept.
+
+Environment:
+    LOG_LEVEL        Root level (default INFO)
+    LOG_LEVELS       Per-logger levels, e.g. 'werkzeug=WARNING,routes.scans=DEBUG'
+    LOG_FORMAT       'json' (default) or 'text'
+    LOG_SAMPLE_RATE  Share of sampled records kept, 0.0-1.0 (default 1.0)
+    LOG_QUEUE_SIZE   Records buffered before dropping (default 10000)
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from service_utils.tracing import current_trace
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_LEVELS = os.environ.get('LOG_LEVELS', '')
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json').lower()
+LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', 1.0))
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+
+TEXT_FORMAT = '%(asctime)s %(levelname)s [%(name)s] %(message)s'
+
+# Loggers whose records are all treated as sampled success logs (access logs)
+SAMPLED_LOGGERS = ('werkzeug', 'aiohttp.access')
+
+# Attributes every LogRecord has - anything else came in through extra=
+_RESERVED = set(logging.LogRecord('', 0, '', 0, '', (), None).__dict__) | {'message', 'asctime', 'sample'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including any extra= fields"""
+
+    def __init__(self, service):
+        super().__init__()
+        self.service = service
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'service': self.service,
+            'logger': record.name,
+            'msg': record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED:
+                entry[key] = value
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        elif record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a random share of sampled records below WARNING"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if self.rate >= 1 or record.levelno >= logging.WARNING:
+            return True
+        sampled = getattr(record, 'sample', False) or record.name.startswith(SAMPLED_LOGGERS)
+        return not sampled or random.random() < self.rate
+
+
+class RequestIdFilter(logging.Filter):
+    """Tags records with the ID of the request being handled"""
+
+    def filter(self, record):
+        trace = current_trace()
+        if trace is not None and not hasattr(record, 'request_id'):
+            record.request_id = trace.request_id
+        return True
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Resolve the message and traceback here - args and traceback objects
+        # must not outlive the call - but leave formatting to the listener
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def parse_levels(spec):
+    """'a=INFO,b.c=DEBUG' -> [('a', 'INFO'), ('b.c', 'DEBUG')]"""
+    levels = []
+    for part in spec.split(','):
+        name, _, level = part.partition('=')
+        if name.strip() and level.strip():
+            levels.append((name.strip(), level.strip().upper()))
+    return levels
+
+
+_listener = None
+
+
+def setup_logging(service, levels=None):
+    """
+    Route all logging of this process through the background queue
+
+    Safe to call more than once; only the first call configures logging.
+
+    Args:
+        service: Name written into every JSON record (e.g. 'gateway')
+        levels: Default per-logger levels; LOG_LEVELS overrides them
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == 'text':
+        stream_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    else:
+        stream_handler.setFormatter(JsonFormatter(service))
+
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(LOG_SAMPLE_RATE))
+    # Handler filters run in the caller's thread, inside the request's context
+    queue_handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(LOG_LEVEL)
+    for name, level in list((levels or {}).items()) + parse_levels(LOG_LEVELS):
+        logging.getLogger(name).setLevel(level)
+
+    _listener = QueueListener(log_queue, stream_handler)
+    _listener.start()
+    # Flush whatever is still queued on shutdown
+    atexit.register(_listener.stop)
@@ -0,0 +1,216 @@
+"""
+Request IDs and per-hop timing breakdowns shared by every NeuroAid service.
+
+The gateway gives each request an ID (keeping a well-formed X-Request-ID
+sent by the client) and every hop forwards it on the calls it makes, so
+the gateway, the main server and the AI services all log the same ID.
+
+Each hop times its own phases and reports them in a Server-Timing
+response header, after the entries of the hops behind it, e.g.
+
+    Server-Timing: ai_image-predict;dur=812.4, ai_image-total;dur=815.0,
+                   main-file-save;dur=3.1, main-ai;dur=821.7,
+                   main-db-write;dur=6.2, main-total;dur=833.9,
+                   gateway-upstream;dur=836.5, gateway-total;dur=837.2
+
+The same timings are written to the structured log when the response
+goes out.
+
+A caller can also give a request a time budget in X-Request-Timeout-Ms.
+The budget left is forwarded with the request ID, so a hop never keeps
+waiting on a backend after the caller in front of it has given up.
+"""
+
+import logging
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+SERVER_TIMING_HEADER = 'Server-Timing'
+DEADLINE_HEADER = 'X-Request-Timeout-Ms'
+
+# Shortest timeout handed to a blocking call once the budget is spent (seconds)
+MIN_CALL_TIMEOUT = 0.001
+
+# Client supplied IDs are only kept when they are short and log-safe
+_VALID_ID = re.compile(r'^[A-Za-z0-9._:-]{1,128}$')
+
+_current = ContextVar('trace', default=None)
+
+logger = logging.getLogger(__name__)
+
+
+class Trace:
+    """Request ID and phase timings of one request on one hop"""
+
+    def __init__(self, service, request_id=None, timeout_ms=None):
+        self.service = service
+        if request_id and _VALID_ID.match(request_id):
+            self.request_id = request_id
+        else:
+            self.request_id = uuid.uuid4().hex
+        self.start = time.perf_counter()
+        self.deadline = None
+        budget = _parse_budget(timeout_ms)
+        if budget is not None:
+            self.deadline = self.start + budget
+        self.phases = []  # (name, milliseconds)
+        self.downstream = []  # Server-Timing values of the hops behind this one
+
+    def add(self, name, seconds):
+        """Record a phase that has already been timed"""
+        self.phases.append((name, seconds * 1000))
+
+    @contextmanager
+    def phase(self, name):
+        """Time the enclosed block as a phase"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def include(self, server_timing):
+        """Keep the Server-Timing entries reported by a downstream hop"""
+        if server_timing and server_timing not in self.downstream:
+            self.downstream.append(server_timing)
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.start) * 1000
+
+    def remaining(self):
+        """Seconds left of the caller's budget (None when it set none)"""
+        if self.deadline is None:
+            return None
+        return self.deadline - time.perf_counter()
+
+    def server_timing(self):
+        """Server-Timing value: downstream entries, then this hop's phases and total"""
+        entries = [f'{self.service}-{name};dur={ms:.1f}' for name, ms in self.phases]
+        entries.append(f'{self.service}-total;dur={self.elapsed_ms():.1f}')
+        return ', '.join(self.downstream + entries)
+
+    def timings(self):
+        """Phase durations in ms for the log (repeated phases are summed)"""
+        totals = {}
+        for name, ms in self.phases:
+            totals[name] = round(totals.get(name, 0) + ms, 1)
+        totals['total'] = round(self.elapsed_ms(), 1)
+        return totals
+
+
+def _parse_budget(timeout_ms):
+    # Malformed or non-positive budgets are ignored rather than failing the request
+    try:
+        budget = float(timeout_ms) / 1000
+    except (TypeError, ValueError):
+        return None
+    return budget if budget > 0 and budget != float('inf') else None
+
+
+def start_trace(service, request_id=None, timeout_ms=None):
+    """
+    Begin tracing the current request
+
+    Args:
+        service: Prefix for this hop's Server-Timing entries (e.g. 'main')
+        request_id: Incoming X-Request-ID, if any
+        timeout_ms: Incoming X-Request-Timeout-Ms, if any
+
+    Returns:
+        (trace, token) - pass the token to end_trace
+    """
+    trace = Trace(service, request_id, timeout_ms)
+    return trace, _current.set(trace)
+
+
+def end_trace(token):
+    _current.reset(token)
+
+
+def current_trace():
+    """Trace of the request being handled, or None outside a request"""
+    return _current.get()
+
+
+@contextmanager
+def phase(name):
+    """Time the enclosed block as a phase of the current request (no-op outside one)"""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    with trace.phase(name):
+        yield
+
+
+def trace_headers():
+    """Headers that carry the request ID (and the budget left) to the next hop"""
+    trace = _current.get()
+    if trace is None:
+        return {}
+    headers = {REQUEST_ID_HEADER: trace.request_id}
+    remaining = trace.remaining()
+    if remaining is not None:
+        headers[DEADLINE_HEADER] = str(max(int(remaining * 1000), 1))
+    return headers
+
+
+def call_timeout(timeout):
+    """Timeout for a call made by the current request, cut to the budget left"""
+    trace = _current.get()
+    remaining = trace.remaining() if trace is not None else None
+    if remaining is None:
+        return timeout
+    return max(min(timeout, remaining), MIN_CALL_TIMEOUT)
+
+
+def include_timing(headers):
+    """Fold the Server-Timing header of a downstream response into the current trace"""
+    trace = _current.get()
+    if trace is not None:
+        trace.include(headers.get(SERVER_TIMING_HEADER))
+
+
+def finish_trace(trace, headers, method, path, status):
+    """Add the trace headers to a response and log the timing breakdown"""
+    trace.include(headers.get(SERVER_TIMING_HEADER))
+    headers[REQUEST_ID_HEADER] = trace.request_id
+    headers[SERVER_TIMING_HEADER] = trace.server_timing()
+    logger.info('Request timing', extra={
+        'request_id': trace.request_id,
+        'method': method,
+        'path': path,
+        'status': status,
+        'timings': trace.timings(),
+        'sample': True
+    })
+
+
+def init_app(app, service):
+    """Trace every request of a Flask app"""
+    from flask import g, request
+
+    @app.before_request
+    def begin_request_trace():
+        g.trace, g.trace_token = start_trace(
+            service,
+            request.headers.get(REQUEST_ID_HEADER),
+            request.headers.get(DEADLINE_HEADER)
+        )
+
+    @app.after_request
+    def add_trace_headers(response):
+        trace = g.get('trace')
+        if trace is not None:
+            finish_trace(trace, response.headers, request.method, request.path, response.status_code)
+        return response
+
+    @app.teardown_request
+    def end_request_trace(error=None):
+        token = g.pop('trace_token', None)
+        if token is not None:
+            end_trace(token)
@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pytest
+
+# Tests import the gateway's packages the way gateway.py does (from the repository root)
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+
+class Clock:
+    """Stands in for the time module of the module under test (time() and monotonic())"""
+
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    monotonic = time
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return Clock()
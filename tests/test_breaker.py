@@ -0,0 +1,105 @@
+import pytest
+
+from gateway_utils import breaker as breaker_module
+from gateway_utils.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+@pytest.fixture
+def breaker(monkeypatch, clock):
+    monkeypatch.setattr(breaker_module, 'time', clock)
+    return CircuitBreaker(
+        'Test Service', window=4, min_calls=4, failure_rate=0.5, slow_call_rate=0.75,
+        slow_call_seconds=1, open_seconds=10, half_open_probes=2
+    )
+
+
+def call(breaker, ok=True, latency=0.1):
+    breaker.allow()
+    breaker.record(ok, latency)
+
+
+def trip(breaker):
+    for ok in (True, True, False, False):
+        call(breaker, ok)
+    assert breaker.state == OPEN
+
+
+def test_stays_closed_until_enough_calls(breaker):
+    for _ in range(3):
+        call(breaker, ok=False)
+    assert breaker.state == CLOSED
+    call(breaker, ok=False)
+    assert breaker.state == OPEN
+
+
+def test_opens_on_failure_rate_over_the_window(breaker):
+    for ok in (False, True, True, True, True, False):
+        call(breaker, ok)
+    # The window holds the last four calls: one failure in four
+    assert breaker.state == CLOSED
+    call(breaker, ok=False)
+    assert breaker.state == OPEN
+
+
+def test_opens_on_slow_calls(breaker):
+    for latency in (1, 2, 0.1, 5):
+        call(breaker, latency=latency)
+    assert breaker.state == OPEN
+
+
+def test_open_fails_fast_until_the_cool_down_ends(breaker, clock):
+    trip(breaker)
+    clock.advance(7.5)
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.allow()
+    assert error.value.retry_after == 3
+    assert breaker.snapshot()['retry_after'] == 2.5
+
+    clock.advance(2.5)
+    breaker.allow()
+    assert breaker.state == HALF_OPEN
+
+
+def test_half_open_closes_after_every_probe_succeeds(breaker, clock):
+    trip(breaker)
+    clock.advance(10)
+    breaker.allow()
+    breaker.allow()
+    # Only half_open_probes calls get through
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+
+    breaker.record(True, 0.1)
+    assert breaker.state == HALF_OPEN
+    breaker.record(True, 0.1)
+    assert breaker.state == CLOSED
+    assert breaker.snapshot()['calls'] == 0
+
+
+@pytest.mark.parametrize('ok, latency', [(False, 0.1), (True, 3)], ids=['failed', 'slow'])
+def test_half_open_probe_failure_reopens(breaker, clock, ok, latency):
+    trip(breaker)
+    clock.advance(10)
+    breaker.allow()
+    breaker.record(ok, latency)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+
+
+def test_cancelled_probe_frees_its_slot(breaker, clock):
+    trip(breaker)
+    clock.advance(10)
+    breaker.allow()
+    breaker.allow()
+    breaker.cancel()
+    breaker.allow()
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+
+
+def test_late_results_are_ignored_while_open(breaker):
+    trip(breaker)
+    breaker.record(True, 0.1)
+    assert breaker.state == OPEN
+    assert breaker.snapshot()['calls'] == 0
@@ -0,0 +1,98 @@
+import asyncio
+import threading
+import time
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+
+import gateway_async
+from gateway_utils.balancer import get_balancer
+from gateway_utils import pool
+from gateway_utils.hedge import get_hedge_policy
+from gateway_utils.pool import get_pool
+
+ROUTE = '/api/test/slow'
+
+
+async def start_replica(delay):
+    async def slow(request):
+        await asyncio.sleep(delay)
+        return web.json_response({'ok': True})
+
+    app = web.Application()
+    app.router.add_get('/slow', slow)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, f'http://127.0.0.1:{port}'
+
+
+def test_cancelled_during_hedge_delay_releases_the_replica():
+    async def scenario():
+        replicas = [await start_replica(0.5) for _ in range(2)]
+        service = {
+            'key': 'test_hedge', 'name': 'Hedge test', 'prefix': '/api/test',
+            'url': replicas[0][1], 'urls': [url for _, url in replicas], 'hedge': True
+        }
+        policy = get_hedge_policy(service)
+        for _ in range(policy.min_samples):
+            policy.record(ROUTE, 0.3)
+        try:
+            call = asyncio.ensure_future(gateway_async.send_upstream_hedged(
+                ROUTE, service, '/slow', 'GET', aiohttp.ClientTimeout(total=5)
+            ))
+            # Still waiting for the first replica, well before the hedge would be sent
+            await asyncio.sleep(0.1)
+            call.cancel()
+            await asyncio.gather(call, return_exceptions=True)
+            # Long enough for an abandoned attempt to have been answered
+            await asyncio.sleep(0.7)
+            return [replica['outstanding'] for replica in get_balancer(service).snapshot()]
+        finally:
+            await gateway_async.close_client_sessions(None)
+            for runner, _ in replicas:
+                await runner.cleanup()
+
+    assert asyncio.run(scenario()) == [0, 0]
+
+
+def test_registry_change_retires_health_probe_pools(tmp_path):
+    urls = ['http://127.0.0.1:5901', 'http://127.0.0.1:5902']
+    services = {'registry_test': {
+        'key': 'registry_test', 'name': 'Registry test', 'prefix': '/api/registry-test',
+        'url': urls[0], 'urls': list(urls)
+    }}
+    registry = gateway_async.ServiceRegistry(
+        services, gateway_async.retire_client_session, path=str(tmp_path / 'services.json')
+    )
+    # What HealthMonitor.probe creates for each replica
+    for url in urls:
+        get_pool(services['registry_test'], url)
+
+    registry.apply({'registry_test': {'urls': urls[:1]}}, source='test')
+    assert urls[0] in pool._pools
+    assert urls[1] not in pool._pools
+
+
+def test_health_never_waits_for_probes_on_the_event_loop(monkeypatch):
+    monitor = gateway_async.health_monitor
+    loop_thread = []
+
+    def slow_snapshot():
+        loop_thread.append(threading.current_thread() is threading.main_thread())
+        time.sleep(0.2)
+        return {}
+
+    monkeypatch.setattr(type(monitor), 'ready', property(lambda self: False))
+    monkeypatch.setattr(monitor, 'snapshot', slow_snapshot)
+
+    async def scenario():
+        request = make_mocked_request('GET', '/health')
+        response = await gateway_async.gateway_health(request)
+        return response.status
+
+    assert asyncio.run(scenario()) == 200
+    assert loop_thread == [False]
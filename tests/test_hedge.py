@@ -0,0 +1,74 @@
+import pytest
+
+from gateway_utils import hedge
+from gateway_utils.hedge import HedgePolicy, hedging_enabled
+
+SERVICE = {'hedge': True, 'url': 'http://a', 'urls': ['http://a', 'http://b']}
+
+
+@pytest.fixture
+def policy():
+    return HedgePolicy(budget=0.25, max_tokens=2, window=100, min_samples=10, min_delay=0.01)
+
+
+def test_no_delay_until_enough_samples(policy):
+    for _ in range(9):
+        policy.record('/api/main/doctors', 0.1)
+    assert policy.delay('/api/main/doctors') is None
+    policy.record('/api/main/doctors', 0.1)
+    assert policy.delay('/api/main/doctors') == 0.1
+    assert policy.delay('/api/main/other') is None
+
+
+def test_delay_is_the_p95_with_a_floor(policy):
+    for ms in range(1, 101):
+        policy.record('/api/main/doctors', ms / 1000)
+    assert policy.delay('/api/main/doctors') == 0.096
+
+    for _ in range(10):
+        policy.record('/api/main/fast', 0.001)
+    assert policy.delay('/api/main/fast') == 0.01
+
+
+def test_window_keeps_recent_samples(policy):
+    for _ in range(100):
+        policy.record('/api/main/doctors', 1.0)
+    for _ in range(100):
+        policy.record('/api/main/doctors', 0.2)
+    assert policy.delay('/api/main/doctors') == 0.2
+
+
+def test_budget_is_earned_per_request(policy):
+    assert policy.spend() is False
+    for _ in range(4):
+        policy.delay('/api/main/doctors')
+    assert policy.spend() is True
+    assert policy.spend() is False
+
+
+def test_budget_saves_up_to_max_tokens(policy):
+    for _ in range(100):
+        policy.delay('/api/main/doctors')
+    assert [policy.spend() for _ in range(3)] == [True, True, False]
+
+    policy.won()
+    assert policy.stats() == {'requests': 100, 'hedges': 2, 'hedges_won': 1, 'tokens': 0.0, 'routes': 0}
+
+
+def test_routes_are_bounded(policy, monkeypatch):
+    monkeypatch.setattr(hedge, 'MAX_ROUTES', 3)
+    for route in ('/a', '/b', '/c', '/d'):
+        policy.record(route, 0.1)
+    assert list(policy._routes) == ['/b', '/c', '/d']
+
+
+@pytest.mark.parametrize('service, method, body, expected', [
+    (SERVICE, 'GET', None, True),
+    (SERVICE, 'HEAD', None, True),
+    (SERVICE, 'POST', None, False),
+    (SERVICE, 'GET', b'{}', False),
+    ({**SERVICE, 'hedge': False}, 'GET', None, False),
+    ({'hedge': True, 'url': 'http://a'}, 'GET', None, False)
+])
+def test_hedging_enabled(service, method, body, expected):
+    assert bool(hedging_enabled(service, method, body)) is expected
@@ -0,0 +1,58 @@
+import pytest
+
+from service_utils import identity
+from service_utils.identity import sign_identity, verify_identity
+
+SECRET = 'identity-test-secret'
+CLAIMS = {'id': 7, 'email': 'sara@example.com', 'role': 'user'}
+
+
+@pytest.fixture(autouse=True)
+def frozen_time(monkeypatch, clock):
+    monkeypatch.setattr(identity, 'time', clock)
+
+
+def test_round_trip():
+    value = sign_identity(CLAIMS, secret=SECRET)
+    assert verify_identity(value, secret=SECRET) == CLAIMS
+
+
+def test_tampered_payload_or_signature():
+    payload, signature = sign_identity(CLAIMS, secret=SECRET).split('.')
+    forged = sign_identity(dict(CLAIMS, role='admin'), secret=SECRET).split('.')[0]
+
+    assert verify_identity(f'{forged}.{signature}', secret=SECRET) is None
+    assert verify_identity(f'{payload}.{signature[:-2]}AA', secret=SECRET) is None
+    assert verify_identity(f'{payload}.', secret=SECRET) is None
+    assert verify_identity(payload, secret=SECRET) is None
+
+
+def test_other_secret():
+    assert verify_identity(sign_identity(CLAIMS, secret='other'), secret=SECRET) is None
+
+
+def test_stale_signing_time(clock):
+    value = sign_identity(CLAIMS, secret=SECRET)
+    clock.advance(60)
+    assert verify_identity(value, secret=SECRET, ttl=60) == CLAIMS
+    clock.advance(1)
+    assert verify_identity(value, secret=SECRET, ttl=60) is None
+
+
+def test_signed_in_the_future(clock):
+    value = sign_identity(CLAIMS, secret=SECRET)
+    clock.advance(-6)
+    assert verify_identity(value, secret=SECRET) is None
+
+
+def test_expired_token_claims(clock):
+    value = sign_identity(dict(CLAIMS, exp=clock.now + 10), secret=SECRET)
+    assert verify_identity(value, secret=SECRET)['exp'] == clock.now + 10
+    clock.advance(10)
+    assert verify_identity(value, secret=SECRET) is None
+
+
+def test_no_secret_signs_and_trusts_nothing():
+    assert sign_identity(CLAIMS, secret='') is None
+    assert verify_identity(sign_identity(CLAIMS, secret=SECRET), secret='') is None
+    assert verify_identity(None, secret=SECRET) is None
@@ -0,0 +1,95 @@
+import jwt
+import pytest
+
+from gateway_utils import auth, ratelimit
+from gateway_utils.ratelimit import RateLimiter, client_key
+
+RULES = {
+    '/api/main': {'rate': 2, 'burst': 3},
+    '/api/main/slow': {'rate': 0.5, 'burst': 1}
+}
+
+
+@pytest.fixture
+def limiter(monkeypatch, clock):
+    monkeypatch.setattr(ratelimit, 'time', clock)
+    return RateLimiter(rules=RULES, max_keys=100, sweep_interval=60, enabled=True)
+
+
+def test_burst_then_limited(limiter):
+    assert [limiter.check('/api/main/doctors', 'ip:1') for _ in range(3)] == [0, 0, 0]
+    # Empty bucket: one token comes back after 1 / rate seconds
+    assert limiter.check('/api/main/doctors', 'ip:1') == 1
+    assert limiter.stats() == {'allowed': 3, 'limited': 1, 'buckets': 1}
+
+
+def test_refills_at_the_rate_up_to_the_burst(limiter, clock):
+    for _ in range(3):
+        limiter.check('/api/main', 'ip:1')
+    clock.advance(0.5)
+    assert limiter.check('/api/main', 'ip:1') == 0
+    assert limiter.check('/api/main', 'ip:1') == 1
+
+    clock.advance(3600)
+    assert [limiter.check('/api/main', 'ip:1') for _ in range(4)] == [0, 0, 0, 1]
+
+
+def test_retry_after_rounds_up(limiter):
+    limiter.check('/api/main/slow/report', 'ip:1')
+    assert limiter.check('/api/main/slow/report', 'ip:1') == 2
+
+
+def test_buckets_are_per_client_and_longest_prefix(limiter):
+    for _ in range(3):
+        limiter.check('/api/main/doctors', 'ip:1')
+    assert limiter.check('/api/main/doctors', 'ip:2') == 0
+    assert limiter.check('/api/main/doctors', 'user:1') == 0
+    # /api/main/slow has its own, smaller bucket
+    assert limiter.check('/api/main/slow', 'ip:1') == 0
+    assert limiter.check('/api/main/slow', 'ip:1') == 2
+
+
+def test_unlimited_paths_and_disabled_limiter(limiter):
+    assert limiter.rule_for('/api/mainframe') is None
+    assert limiter.rule_for('/health') is None
+    assert limiter.check('/health', 'ip:1') == 0
+    assert RateLimiter(rules=RULES, enabled=False).check('/api/main', 'ip:1') == 0
+
+
+def test_idle_buckets_are_swept(limiter, clock):
+    limiter.check('/api/main', 'ip:1')
+    clock.advance(59.5)
+    limiter.check('/api/main/slow', 'ip:2')
+
+    # Past the sweep interval: ip:1 has refilled, ip:2 has not
+    clock.advance(1)
+    limiter.check('/api/main', 'ip:3')
+    assert set(limiter._buckets) == {('/api/main/slow', 'ip:2'), ('/api/main', 'ip:3')}
+
+
+def test_least_recently_used_bucket_is_evicted(monkeypatch, clock):
+    monkeypatch.setattr(ratelimit, 'time', clock)
+    limiter = RateLimiter(rules=RULES, max_keys=2, sweep_interval=60, enabled=True)
+    for client in ('ip:1', 'ip:2'):
+        for _ in range(3):
+            limiter.check('/api/main', client)
+    limiter.check('/api/main', 'ip:3')
+    assert limiter.check('/api/main', 'ip:2') == 1
+    # ip:1 was evicted and starts over with a full bucket
+    assert [limiter.check('/api/main', 'ip:1') for _ in range(3)] == [0, 0, 0]
+
+
+def test_client_key(monkeypatch):
+    secret = 'gateway-test-secret'
+    monkeypatch.setattr(auth, 'JWT_SECRET', secret)
+    monkeypatch.setattr(auth, 'token_verifier', auth.TokenVerifier(secret=secret))
+    token = jwt.encode({'id': 7}, secret, algorithm='HS256')
+    forged = jwt.encode({'id': 7}, 'other', algorithm='HS256')
+
+    assert client_key(f'Bearer {token}', '10.0.0.5') == 'user:7'
+    assert client_key(f'Bearer {forged}', '10.0.0.5') == 'ip:10.0.0.5'
+    assert client_key(None, '10.0.0.5') == 'ip:10.0.0.5'
+
+    # Without GATEWAY_JWT_SECRET tokens are not decoded at all
+    monkeypatch.setattr(auth, 'JWT_SECRET', '')
+    assert client_key(f'Bearer {token}', '10.0.0.5') == 'ip:10.0.0.5'